@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Enterprise Accounts
+Plan changes, activation, API key rotation and the admin key, keeping the API key cache coherent
+"""
+
+import argparse
+import os
+import secrets
+import sqlite3
+from typing import Optional
+
+from api_key_cache import api_key_cache
+from database import DEFAULT_DB_PATH, get_pool
+
+# Requests allowed by each plan; other plans get DEFAULT_REQUESTS_LIMIT
+PLAN_LIMITS = {
+    "free": 100,
+    "basic": 1000,
+    "premium": 10000,
+    "enterprise": 100000,
+    "enterprise_plus": 1000000
+}
+DEFAULT_REQUESTS_LIMIT = 100
+
+def generate_api_key() -> str:
+    """Generate a secure API key"""
+    return f"sk_live_{secrets.token_urlsafe(32)}"
+
+def is_admin_key(api_key: str) -> bool:
+    """Whether a key is ADMIN_API_KEY, which unlocks the admin endpoints (no key does while it is unset)"""
+    
+    admin_key = os.environ.get('ADMIN_API_KEY', '')
+    return bool(admin_key) and secrets.compare_digest(api_key.encode('utf-8'), admin_key.encode('utf-8'))
+
+def rotate_api_key(user_id: int, conn: Optional[sqlite3.Connection] = None) -> Optional[str]:
+    """Give an active user a new API key, retiring the old one at once; None if there is no such user"""
+    
+    api_key = generate_api_key()
+    with get_pool().connection(conn) as conn:
+        cursor = conn.execute("UPDATE users SET api_key = ? WHERE id = ? AND is_active = 1", (api_key, user_id))
+        conn.commit()
+    api_key_cache.invalidate_user(user_id)
+    return api_key if cursor.rowcount else None
+
+def change_plan(user_id: int, plan: str, conn: Optional[sqlite3.Connection] = None) -> bool:
+    """
+    Move a user to a plan and its request limit; False if there is no such user
+    
+    Raises:
+        ValueError: For a plan not in PLAN_LIMITS
+    """
+    
+    if plan not in PLAN_LIMITS:
+        raise ValueError(f"Unknown plan: {plan}. Use one of: {', '.join(PLAN_LIMITS)}")
+    with get_pool().connection(conn) as conn:
+        cursor = conn.execute("UPDATE users SET plan = ?, requests_limit = ? WHERE id = ?",
+                              (plan, PLAN_LIMITS[plan], user_id))
+        conn.commit()
+    api_key_cache.invalidate_user(user_id)
+    return cursor.rowcount > 0
+
+def set_active(user_id: int, active: bool, conn: Optional[sqlite3.Connection] = None) -> bool:
+    """Activate or deactivate a user (whose key is then rejected); False if there is no such user"""
+    
+    with get_pool().connection(conn) as conn:
+        row = conn.execute("SELECT api_key FROM users WHERE id = ?", (user_id,)).fetchone()
+        if row is None:
+            return False
+        conn.execute("UPDATE users SET is_active = ? WHERE id = ?", (active, user_id))
+        conn.commit()
+    api_key_cache.invalidate_user(user_id)
+    api_key_cache.invalidate_key(row[0])    # Cached as invalid while deactivated
+    return True
+
+def main():
+    """Command-line entry point"""
+    
+    parser = argparse.ArgumentParser(
+        description="Change a user's plan, status or API key "
+                    "(running servers see it within API_KEY_CACHE_SYNC_MS)"
+    )
+    parser.add_argument('--db', default=DEFAULT_DB_PATH)
+    parser.add_argument('--email', required=True, help="User to change")
+    parser.add_argument('--plan', choices=list(PLAN_LIMITS))
+    status = parser.add_mutually_exclusive_group()
+    status.add_argument('--deactivate', action='store_true')
+    status.add_argument('--activate', action='store_true')
+    parser.add_argument('--rotate-key', action='store_true', help="Issue a new API key and print it")
+    args = parser.parse_args()
+    
+    with get_pool(args.db).connection() as conn:
+        row = conn.execute("SELECT id FROM users WHERE email = ?", (args.email,)).fetchone()
+        if row is None:
+            parser.error(f"No user with email {args.email}")
+        user_id = row[0]
+        
+        if args.plan:
+            change_plan(user_id, args.plan, conn)
+            print(f"📋 {args.email} moved to the {args.plan} plan ({PLAN_LIMITS[args.plan]:,} requests)")
+        if args.deactivate or args.activate:
+            set_active(user_id, args.activate, conn)
+            print(f"{'✅' if args.activate else '⛔'} {args.email} {'activated' if args.activate else 'deactivated'}")
+        if args.rotate_key:
+            api_key = rotate_api_key(user_id, conn)
+            if api_key is None:
+                parser.error(f"{args.email} is deactivated")
+            print(f"🔑 New API key for {args.email}: {api_key}")
+
+if __name__ == "__main__":
+    main()
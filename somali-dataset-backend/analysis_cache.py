@@ -0,0 +1,133 @@
+"""
+Enterprise Analysis Cache
+Content-addressed, size-bounded LRU cache for SomaliNLPEngine results
+"""
+
+import hashlib
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+class AnalysisCache:
+    """In-process LRU cache of analysis results keyed by text and engine version"""
+    
+    def __init__(self, max_entries: int = 50000, max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: Optional[float] = 3600):
+        """
+        Args:
+            max_entries: Maximum number of cached analyses
+            max_bytes: Memory cap for the serialized analyses
+            ttl_seconds: Entry lifetime; None keeps entries until evicted
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        
+        self._entries = OrderedDict()  # key -> (expires_at, payload)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    @classmethod
+    def from_env(cls) -> 'AnalysisCache':
+        """Build a cache configured by NLP_CACHE_MAX_ENTRIES, NLP_CACHE_MAX_MB and NLP_CACHE_TTL_SECONDS"""
+        
+        ttl = float(os.environ.get('NLP_CACHE_TTL_SECONDS', 3600))
+        return cls(
+            max_entries=int(os.environ.get('NLP_CACHE_MAX_ENTRIES', 50000)),
+            max_bytes=int(float(os.environ.get('NLP_CACHE_MAX_MB', 64)) * 1024 * 1024),
+            ttl_seconds=ttl if ttl > 0 else None
+        )
+    
+    @staticmethod
+    def make_key(text: str, version: str) -> str:
+        """
+        Content address of a text for a given engine/lexicon version.
+        
+        The text is hashed exactly as given: every analysis field (text length,
+        citations, casing-sensitive checks) depends on the raw text, so any
+        lossy normalization would let different texts share a result.
+        """
+        digest = hashlib.sha256(version.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(text.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict]:
+        """Return a fresh copy of the cached analysis, or None on a miss"""
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            expires_at, payload = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+        
+        return pickle.loads(payload)
+    
+    def put(self, key: str, analysis: Dict):
+        """Store an analysis (without volatile fields such as the timestamp)"""
+        
+        payload = pickle.dumps(analysis, protocol=pickle.HIGHEST_PROTOCOL)
+        size = sys.getsizeof(payload)
+        if size > self.max_bytes:
+            return
+        
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, payload)
+            self._bytes += size
+            
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+    
+    def _remove(self, key: str):
+        _, payload = self._entries.pop(key)
+        self._bytes -= sys.getsizeof(payload)
+    
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def stats(self) -> Dict:
+        """Hit/miss/eviction counters and current size"""
+        
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,243 @@
+"""
+Enterprise Analysis Process Pool
+Parallel bulk analysis on pre-warmed SomaliNLPEngine worker processes
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Default worker count: the CPUs this process may run on, at most this many. Each
+# worker holds its own engine (30-40 MB), and every uvicorn process has its own pool
+DEFAULT_MAX_WORKERS = 4
+
+# Engine owned by each worker process, built once by the pool initializer
+_worker_engine = None
+
+def _init_worker():
+    """Build the worker's engine (lexicons, automaton, cache) before any job arrives"""
+    global _worker_engine
+    
+    from enterprise_nlp import SomaliNLPEngine
+    from analysis_cache import AnalysisCache
+    
+    _worker_engine = SomaliNLPEngine(cache=AnalysisCache.from_env())
+    _worker_engine.lexicon_matcher.compile()
+
+def default_workers() -> int:
+    """Usable CPUs (CPU affinity, not the host's count), capped at DEFAULT_MAX_WORKERS"""
+    
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS or Windows
+        cpus = os.cpu_count() or 1
+    return max(1, min(cpus, DEFAULT_MAX_WORKERS))
+
+def _warm_up() -> int:
+    """No-op job that forces a worker process to start"""
+    return os.getpid()
+
+def _analyze_chunk(texts: List[str], return_exceptions: bool, components: Optional[List[str]],
+                   fields: Optional[List[str]], collect_metrics: bool = False) -> Tuple[List, Optional[Dict]]:
+    """
+    Analyze one chunk of texts inside a worker process
+    
+    Returns:
+        The analyses, and with collect_metrics the worker's samples since its
+        last chunk: analyzer timings and its analysis cache counters, which
+        the API process records (see AnalysisPool._record)
+    """
+    
+    from metrics import metrics, ANALYZER_SECONDS
+    
+    metrics.enabled = collect_metrics
+    results = _worker_engine.analyze_batch(texts, return_exceptions=return_exceptions,
+                                           components=components, fields=fields)
+    if not collect_metrics:
+        return results, None
+    cache = _worker_engine.cache.stats() if _worker_engine.cache is not None else None
+    return results, {'pid': os.getpid(), 'analyzer_seconds': ANALYZER_SECONDS.drain(), 'cache': cache}
+
+class AnalysisPool:
+    """Managed process pool for CPU-bound bulk analysis"""
+    
+    def __init__(self, max_workers: Optional[int] = None, chunk_size: int = 250,
+                 inline_threshold: int = 64):
+        """
+        Args:
+            max_workers: Worker processes (default default_workers()); 0 disables the pool (analysis runs inline)
+            chunk_size: Texts per job sent to a worker
+            inline_threshold: Batches smaller than this skip the pool entirely
+        """
+        self.max_workers = default_workers() if max_workers is None else max_workers
+        self.chunk_size = max(1, chunk_size)
+        self.inline_threshold = inline_threshold
+        
+        self._executor = None
+        self._lock = threading.Lock()
+        self._worker_cache: Dict[int, Dict] = {}    # worker pid -> its latest analysis cache counters
+    
+    @classmethod
+    def from_env(cls) -> 'AnalysisPool':
+        """Build a pool configured by NLP_POOL_WORKERS, NLP_POOL_CHUNK_SIZE and NLP_POOL_INLINE_THRESHOLD"""
+        
+        workers = os.environ.get('NLP_POOL_WORKERS')
+        return cls(
+            max_workers=int(workers) if workers is not None else None,
+            chunk_size=int(os.environ.get('NLP_POOL_CHUNK_SIZE', 250)),
+            inline_threshold=int(os.environ.get('NLP_POOL_INLINE_THRESHOLD', 64))
+        )
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_workers > 0
+    
+    def start(self) -> Optional[ProcessPoolExecutor]:
+        """Start the worker processes and pre-warm their engines"""
+        
+        if not self.enabled:
+            return None
+        
+        with self._lock:
+            if self._executor is None:
+                # Spawn rather than fork: the API process runs threads (event loop, threadpool)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker
+                )
+                for _ in range(self.max_workers):
+                    self._executor.submit(_warm_up)
+                logger.info(f"Started analysis pool with {self.max_workers} workers")
+            return self._executor
+    
+    def shutdown(self, wait: bool = True):
+        """Stop the worker processes"""
+        
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._forget_worker_caches()
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+    
+    def _restart(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Replace an executor left broken by a dead worker (OOM kill, native crash) with a fresh one"""
+        
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+                self._forget_worker_caches()
+        broken.shutdown(wait=False, cancel_futures=True)
+        logger.warning("Analysis worker died; restarting the analysis pool")
+        # Another thread may already have restarted it; start() then returns that executor
+        return self.start()
+    
+    def _forget_worker_caches(self):
+        """The workers (and their caches) are gone: keep their counters, drop their entries; hold _lock"""
+        for stats in self._worker_cache.values():
+            stats['entries'] = 0
+    
+    def _record(self, chunk_results: Tuple[List, Optional[Dict]]) -> List:
+        """Record a worker's metric samples in this process's registry; the chunk's analyses"""
+        
+        results, samples = chunk_results
+        if samples is not None:
+            from metrics import ANALYZER_SECONDS
+            
+            ANALYZER_SECONDS.merge(samples['analyzer_seconds'])
+            if samples['cache'] is not None:
+                with self._lock:
+                    self._worker_cache[samples['pid']] = samples['cache']
+        return results
+    
+    def worker_cache_stats(self) -> Dict[str, int]:
+        """Analysis cache hits, misses, evictions and entries summed over every worker process"""
+        
+        with self._lock:
+            return {
+                field: sum(stats[field] for stats in self._worker_cache.values())
+                for field in ('hits', 'misses', 'evictions', 'entries')
+            }
+    
+    def _chunks(self, texts: List[str]) -> List[List[str]]:
+        return [texts[start:start + self.chunk_size] for start in range(0, len(texts), self.chunk_size)]
+    
+    def _runs_inline(self, texts: List[str]) -> bool:
+        return not self.enabled or len(texts) < self.inline_threshold
+    
+    def analyze_batch(self, texts: List[str], return_exceptions: bool = False,
+                      components: Optional[List[str]] = None, fields: Optional[List[str]] = None) -> List:
+        """
+        Blocking bulk analysis spread over the worker processes
+        
+        Same contract as SomaliNLPEngine.analyze_batch; results come back in
+        input order. Call from a worker thread, not the event loop. If a
+        worker process dies the pool is rebuilt and the batch retried once.
+        """
+        
+        if self._runs_inline(texts):
+            from enterprise_nlp import get_nlp_engine
+            return get_nlp_engine().analyze_batch(texts, return_exceptions=return_exceptions,
+                                                  components=components, fields=fields)
+        
+        from metrics import metrics
+        
+        def run(executor: ProcessPoolExecutor) -> List:
+            futures = [
+                executor.submit(_analyze_chunk, chunk, return_exceptions, components, fields, metrics.enabled)
+                for chunk in self._chunks(texts)
+            ]
+            results = []
+            for future in futures:
+                results.extend(self._record(future.result()))
+            return results
+        
+        executor = self.start()
+        try:
+            return run(executor)
+        except BrokenProcessPool:
+            return run(self._restart(executor))
+    
+    async def analyze_batch_async(self, texts: List[str], return_exceptions: bool = False,
+                                  components: Optional[List[str]] = None,
+                                  fields: Optional[List[str]] = None) -> List:
+        """Awaitable bulk analysis that keeps the event loop free while workers run"""
+        
+        loop = asyncio.get_running_loop()
+        
+        if self._runs_inline(texts):
+            from enterprise_nlp import get_nlp_engine
+            return await loop.run_in_executor(None, lambda: get_nlp_engine().analyze_batch(
+                texts, return_exceptions=return_exceptions, components=components, fields=fields
+            ))
+        
+        from metrics import metrics
+        
+        async def run(executor: ProcessPoolExecutor) -> List:
+            futures = [
+                loop.run_in_executor(executor, _analyze_chunk, chunk, return_exceptions, components, fields,
+                                     metrics.enabled)
+                for chunk in self._chunks(texts)
+            ]
+            results = []
+            for chunk_results in await asyncio.gather(*futures):
+                results.extend(self._record(chunk_results))
+            return results
+        
+        executor = self.start()
+        try:
+            return await run(executor)
+        except BrokenProcessPool:
+            # Restarting shuts the broken executor down, which joins its threads: not on the loop
+            executor = await loop.run_in_executor(None, self._restart, executor)
+            return await run(executor)
+
+# Initialize global analysis pool (workers start on first use or at app startup)
+analysis_pool = AnalysisPool.from_env()
@@ -0,0 +1,129 @@
+"""
+Enterprise Analyzer Registry
+Named analysis components with declared dependencies and optional batch forms
+"""
+
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+class Analyzer:
+    """One analysis component of SomaliNLPEngine output"""
+    
+    __slots__ = ('name', 'func', 'depends', 'batch', 'collect', 'position')
+    
+    def __init__(self, name: str, func: Callable, depends: tuple, batch: Optional[Callable],
+                 collect: Optional[Callable], position: int):
+        self.name = name
+        self.func = func            # func(doc, analysis) -> component result
+        self.depends = depends      # components that must be in analysis before func runs
+        self.batch = batch          # batch(analyses, rows) -> one result per analysis
+        self.collect = collect      # collect(doc) -> the per-document row handed to batch
+        self.position = position    # place of the component in the output
+
+class AnalyzerRegistry:
+    """
+    Ordered registry of analysis components.
+    
+    Dependencies must already be registered when a component is added;
+    execution plans list every dependency before the components reading it.
+    """
+    
+    def __init__(self):
+        self._analyzers: Dict[str, Analyzer] = {}
+        self._plans = {}
+    
+    def register(self, name: str, func: Callable, depends: Iterable[str] = (),
+                 batch: Optional[Callable] = None, collect: Optional[Callable] = None,
+                 position: Optional[int] = None):
+        """
+        Register (or replace) an analysis component
+        
+        Args:
+            name: Output key of the component
+            func: func(doc, analysis) computing the component for one document
+            depends: Components read from analysis by func / batch
+            batch: Optional batch(analyses, rows) computing the component for a whole batch
+            collect: Optional collect(doc) extracting the row batch needs from a document
+            position: Output position; defaults to registration order
+        """
+        
+        depends = tuple(depends)
+        for dependency in depends:
+            if dependency not in self._analyzers or dependency == name:
+                raise ValueError(f"Analyzer {name} depends on unregistered analyzer {dependency}")
+        
+        if position is None:
+            position = self._analyzers[name].position if name in self._analyzers else len(self._analyzers)
+        
+        self._analyzers[name] = Analyzer(name, func, depends, batch, collect, position)
+        self._plans = {}
+    
+    def __contains__(self, name: str) -> bool:
+        return name in self._analyzers
+    
+    def __getitem__(self, name: str) -> Analyzer:
+        return self._analyzers[name]
+    
+    def names(self) -> List[str]:
+        """Component names in output order"""
+        return sorted(self._analyzers, key=lambda name: self._analyzers[name].position)
+    
+    def resolve(self, components: Iterable[str]) -> List[str]:
+        """Requested components plus their dependencies, dependencies first"""
+        
+        order: List[str] = []
+        visiting: Set[str] = set()
+        
+        def visit(name: str):
+            if name in order:
+                return
+            if name in visiting:
+                raise ValueError(f"Analyzer dependency cycle through {name}")
+            visiting.add(name)
+            for dependency in self._analyzers[name].depends:
+                visit(dependency)
+            visiting.discard(name)
+            order.append(name)
+        
+        requested = set(components)
+        unknown = sorted(requested - set(self._analyzers))
+        if unknown:
+            raise ValueError(f"Unknown analysis component: {', '.join(unknown)}")
+        
+        # Visit in registration order so the plan does not depend on request order
+        for name in self._analyzers:
+            if name in requested:
+                visit(name)
+        return order
+    
+    def batched(self, order: List[str]) -> Set[str]:
+        """
+        Components of an execution order that can use their batch form.
+        
+        A component runs batched only if every component depending on it in
+        the same order is batched too, so per-document analyzers never wait on
+        a batch result.
+        """
+        
+        batched = {name for name in order if self._analyzers[name].batch is not None}
+        for name in reversed(order):
+            if name in batched:
+                continue
+            # Per-document component: its dependencies must be per-document as well
+            stack = list(self._analyzers[name].depends)
+            while stack:
+                dependency = stack.pop()
+                if dependency in batched:
+                    batched.discard(dependency)
+                    stack.extend(self._analyzers[dependency].depends)
+        return batched
+    
+    def plan(self, components: Iterable[str]) -> tuple:
+        """Memoized (execution order, batched components) for a component set"""
+        
+        key = frozenset(components)
+        plan = self._plans.get(key)
+        if plan is None:
+            order = self.resolve(key)
+            plan = (order, self.batched(order))
+            self._plans[key] = plan
+        return plan
@@ -0,0 +1,309 @@
+"""
+Enterprise API Key Cache
+Bounded in-process cache of API key -> user record, with negative entries, cached quota counters
+and invalidations shared between processes
+"""
+
+import copy
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+import queries
+from database import DEFAULT_DB_PATH, get_pool
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_RETENTION = 3600   # Seconds invalidation rows are kept; far longer than any cache TTL
+
+class ApiKeyCache:
+    """
+    LRU cache of the user record behind each API key, so authenticated requests skip the users lookup.
+    
+    Keys are held as SHA-256 digests, never as the key itself. Unknown or
+    deactivated keys are cached as well (for a shorter negative_ttl_seconds,
+    in their own LRU so a flood of made-up keys cannot evict real users),
+    making a client that retries a bad key cost no database reads.
+    
+    A cached record's requests_used is the database count when it was
+    loaded plus the usage this process has recorded since (add_usage), so
+    quota checks stay exact within the process; loading the record again
+    at ttl_seconds reconciles it with the usage of other processes.
+    Changes to a user (plan, deactivation, key rotation) must call
+    invalidate_user; those made by another process reach this one through
+    KeyInvalidations, within its poll interval.
+    """
+    
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 30.0,
+                 negative_max_entries: int = 10000, negative_ttl_seconds: float = 10.0):
+        """
+        Args:
+            max_entries: Maximum number of cached users
+            ttl_seconds: Lifetime of a cached user; 0 disables the cache
+            negative_max_entries: Maximum number of cached invalid keys
+            negative_ttl_seconds: Lifetime of a cached invalid key; 0 disables negative caching
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_max_entries = negative_max_entries
+        self.negative_ttl_seconds = negative_ttl_seconds
+        
+        self._users = OrderedDict()     # key digest -> (expires_at, user)
+        self._invalid = OrderedDict()   # key digest -> expires_at
+        self._digests: Dict[int, Set[bytes]] = {}   # user id -> digests of its cached keys
+        self._lock = threading.Lock()
+        self.generation = 0     # Bumped by every invalidation
+        
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    @classmethod
+    def from_env(cls) -> 'ApiKeyCache':
+        """Build a cache configured by API_KEY_CACHE_MAX_ENTRIES, _TTL_SECONDS and _NEGATIVE_TTL_SECONDS"""
+        
+        max_entries = int(os.environ.get('API_KEY_CACHE_MAX_ENTRIES', 10000))
+        return cls(
+            max_entries=max_entries,
+            ttl_seconds=float(os.environ.get('API_KEY_CACHE_TTL_SECONDS', 30)),
+            negative_max_entries=max_entries,
+            negative_ttl_seconds=float(os.environ.get('API_KEY_CACHE_NEGATIVE_TTL_SECONDS', 10))
+        )
+    
+    @staticmethod
+    def _digest(api_key: str) -> bytes:
+        return hashlib.sha256(api_key.encode('utf-8', 'surrogatepass')).digest()
+    
+    def get(self, api_key: str) -> Tuple[bool, Optional[Dict]]:
+        """
+        (hit, user) for a key: on a hit, a copy of the cached user record, or
+        None for a key cached as invalid; (False, None) on a miss
+        """
+        
+        digest = self._digest(api_key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(digest)
+            if entry is not None:
+                expires_at, user = entry
+                if expires_at > now:
+                    self._users.move_to_end(digest)
+                    self.hits += 1
+                    return True, copy.copy(user)
+                self._remove_user_entry(digest)
+            
+            expires_at = self._invalid.get(digest)
+            if expires_at is not None:
+                if expires_at > now:
+                    self.negative_hits += 1
+                    return True, None
+                del self._invalid[digest]
+            
+            self.misses += 1
+            return False, None
+    
+    def put(self, api_key: str, user: Optional[Dict], generation: Optional[int] = None):
+        """
+        Cache the user record loaded for a key, or None if the key is invalid
+        
+        generation is self.generation as read before the load: after an
+        invalidation since then the record may predate the change, and is
+        not cached.
+        """
+        
+        digest = self._digest(api_key)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if user is None:
+                if not self.negative_ttl_seconds:
+                    return
+                self._invalid[digest] = time.monotonic() + self.negative_ttl_seconds
+                self._invalid.move_to_end(digest)
+                while len(self._invalid) > self.negative_max_entries:
+                    self._invalid.popitem(last=False)
+                    self.evictions += 1
+                return
+            
+            if not self.ttl_seconds:
+                return
+            if digest in self._users:
+                self._remove_user_entry(digest)
+            self._invalid.pop(digest, None)
+            self._users[digest] = (time.monotonic() + self.ttl_seconds, copy.copy(user))
+            self._digests.setdefault(user['user_id'], set()).add(digest)
+            while len(self._users) > self.max_entries:
+                self._remove_user_entry(next(iter(self._users)))
+                self.evictions += 1
+    
+    def _remove_user_entry(self, digest: bytes):
+        _, user = self._users.pop(digest)
+        digests = self._digests.get(user['user_id'])
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._digests[user['user_id']]
+    
+    def add_usage(self, user_id: int, requests: int = 1):
+        """Count requests the process has recorded for a user in its cached records"""
+        
+        with self._lock:
+            for digest in self._digests.get(user_id, ()):
+                self._users[digest][1]['requests_used'] += requests
+    
+    def consume(self, user_id: int, requests: int, limit: int) -> Optional[bool]:
+        """
+        Count requests in a user's cached records if they stay within limit, as one atomic step
+        
+        Returns:
+            Whether they were counted; None if the user has no cached record
+        """
+        
+        with self._lock:
+            records = [self._users[digest][1] for digest in self._digests.get(user_id, ())]
+            if not records:
+                return None
+            if max(record['requests_used'] for record in records) + requests > limit:
+                return False
+            for record in records:
+                record['requests_used'] += requests
+            return True
+    
+    def invalidate_user(self, user_id: int):
+        """Drop a user's cached records, after a change to its plan, status or key"""
+        
+        with self._lock:
+            for digest in list(self._digests.get(user_id, ())):
+                self._remove_user_entry(digest)
+            self.generation += 1
+            self.invalidations += 1
+    
+    def invalidate_key(self, api_key: str):
+        """Drop whatever is cached for one key"""
+        
+        digest = self._digest(api_key)
+        with self._lock:
+            if digest in self._users:
+                self._remove_user_entry(digest)
+            self._invalid.pop(digest, None)
+            self.generation += 1
+            self.invalidations += 1
+    
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        
+        with self._lock:
+            self._users.clear()
+            self._invalid.clear()
+            self._digests.clear()
+    
+    def stats(self) -> Dict:
+        """Hit/miss/eviction counters and current size"""
+        
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                'entries': len(self._users),
+                'invalid_entries': len(self._invalid),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'negative_ttl_seconds': self.negative_ttl_seconds,
+                'hits': self.hits,
+                'negative_hits': self.negative_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0
+            }
+
+class KeyInvalidations:
+    """
+    Applies to a cache the user changes made by every process sharing the database.
+    
+    Triggers append the id of every user whose key, status, plan or limit
+    changes to api_key_invalidations (schema version 13), whichever process
+    or tool made the change. A background thread reads the rows past the
+    last one it has seen every interval seconds, one primary key range
+    read, and invalidates those users, so a rotated or deactivated key stops
+    working in every server process within the interval rather than the
+    cache TTL.
+    """
+    
+    def __init__(self, cache: ApiKeyCache, db_path: str = DEFAULT_DB_PATH, interval: float = 0.5):
+        """
+        Args:
+            cache: Cache to invalidate
+            db_path: SQLite database file
+            interval: Seconds between polls; 0 disables the background thread
+        """
+        self.cache = cache
+        self.db_path = db_path
+        self.interval = interval
+        self.last_id: Optional[int] = None
+        self._pruned_at = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    @classmethod
+    def from_env(cls, cache: ApiKeyCache, db_path: str = DEFAULT_DB_PATH) -> 'KeyInvalidations':
+        """Build a poller configured by API_KEY_CACHE_SYNC_MS (default 500)"""
+        return cls(cache, db_path, interval=float(os.environ.get('API_KEY_CACHE_SYNC_MS', 500)) / 1000)
+    
+    def poll(self) -> int:
+        """
+        Invalidate the users changed since the last poll (the first poll only finds where to start)
+        
+        Returns:
+            Users invalidated
+        """
+        
+        with get_pool(self.db_path).connection() as conn:
+            if self.last_id is None:
+                self.last_id = conn.execute("SELECT IFNULL(MAX(id), 0) FROM api_key_invalidations").fetchone()[0]
+                return 0
+            rows = conn.execute(queries.KEY_INVALIDATIONS, (self.last_id,)).fetchall()
+            
+            if time.monotonic() - self._pruned_at >= INVALIDATION_RETENTION:
+                self._pruned_at = time.monotonic()
+                conn.execute("DELETE FROM api_key_invalidations WHERE created_at < datetime('now', ?)",
+                             (f'-{INVALIDATION_RETENTION} seconds',))
+                conn.commit()
+        
+        for user_id in {user_id for _, user_id in rows}:
+            self.cache.invalidate_user(user_id)
+        if rows:
+            self.last_id = rows[-1][0]
+        return len(rows)
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("API key invalidation poll failed, retrying")
+    
+    def start(self):
+        """Find the current position and start polling in the background"""
+        
+        self.poll()
+        if self.interval and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='api-key-invalidations', daemon=True)
+            self._thread.start()
+    
+    def close(self):
+        """Stop the background thread"""
+        
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+# Shared by the API's request handlers and the account functions
+api_key_cache = ApiKeyCache.from_env()
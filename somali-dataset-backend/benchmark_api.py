@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Somali API Load Test
+Concurrent /analyze latency as the number of clients grows
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import closing
+from typing import Dict, List, Optional
+
+import httpx
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark_nlp import DEFAULT_SEED, load_sentence_pool, percentile
+
+DEFAULT_CLIENTS = [1, 2, 4, 8, 16]
+
+async def run_client(client: httpx.AsyncClient, headers: Dict, texts: List[str], requests: int,
+                     think: float, rng: random.Random, latencies: List[float]):
+    """One closed-loop client: request, wait for the response, think, repeat"""
+    
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = await client.post('/analyze', json={'text': rng.choice(texts)}, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+        if think:
+            await asyncio.sleep(think * rng.uniform(0.5, 1.5))  # Jitter keeps clients out of lockstep
+
+async def watch_loop_lag(stop: asyncio.Event, lags: List[float], interval: float = 0.005):
+    """How late a short sleep wakes up: time the event loop spent blocked"""
+    
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+def hold_write_lock(db_path: str, hold: float, stop: threading.Event):
+    """Background bulk writer: takes the write lock for hold seconds, then lets writers in for as long"""
+    
+    from database import connect
+    with closing(connect(db_path)) as conn:
+        while not stop.is_set():
+            conn.execute("BEGIN IMMEDIATE")
+            time.sleep(hold)
+            conn.rollback()
+            time.sleep(hold)
+
+async def run_level(client: httpx.AsyncClient, headers: Dict, texts: List[str], clients: int,
+                    requests: int, think: float, seed: int) -> Dict:
+    """Latency percentiles and throughput of one concurrency level"""
+    
+    latencies, lags = [], []
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(watch_loop_lag(stop, lags))
+    
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        run_client(client, headers, texts, requests, think, random.Random(f"{seed}:{clients}:{i}"), latencies)
+        for i in range(clients)
+    ])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await watcher
+    
+    latencies.sort()
+    return {
+        'clients': clients,
+        'requests': len(latencies),
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_loop_lag_ms': max(lags, default=0) * 1000
+    }
+
+async def run_load_test(client_counts: List[int], requests: int, think: float, url: Optional[str] = None,
+                        seed: int = DEFAULT_SEED, writer_hold: float = 0) -> List[Dict]:
+    """
+    Run every concurrency level against a fresh user
+    
+    Without url the app is served in-process on this event loop, so any
+    handler that blocks the loop shows up directly as latency and loop lag.
+    With writer_hold, a background writer keeps taking the write lock, as a
+    scraper or bulk import does, so API writes have to wait for it.
+    """
+    
+    if url:
+        transport, base_url = None, url
+    else:
+        import main
+        main.init_db()
+        transport, base_url = httpx.ASGITransport(app=main.app), 'http://testserver'
+    
+    limits = httpx.Limits(max_connections=max(client_counts))
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits, timeout=60) as client:
+        signup = await client.post('/signup', json={
+            'email': f"loadtest-{uuid.uuid4().hex[:8]}@example.com",
+            'password': uuid.uuid4().hex,
+            'plan': 'enterprise_plus'
+        })
+        signup.raise_for_status()
+        headers = {'Authorization': f"Bearer {signup.json()['api_key']}"}
+        texts = load_sentence_pool(seed)
+        
+        # Warm up lazy engines and the connection pool outside the measurements
+        await run_level(client, headers, texts, 1, 20, 0, seed)
+        
+        stop_writer = threading.Event()
+        if writer_hold:
+            from database import DEFAULT_DB_PATH
+            threading.Thread(target=hold_write_lock, args=(DEFAULT_DB_PATH, writer_hold, stop_writer), daemon=True).start()
+        
+        results = []
+        try:
+            for clients in client_counts:
+                result = await run_level(client, headers, texts, clients, requests, think, seed)
+                print(f"   {clients:>4} clients: {result['requests_per_second']:8.1f} req/s  "
+                      f"p50 {result['p50_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms  "
+                      f"p99 {result['p99_ms']:7.2f} ms  loop lag {result['max_loop_lag_ms']:6.2f} ms")
+                results.append(result)
+        finally:
+            stop_writer.set()
+        return results
+
+def main():
+    """Command-line entry point"""
+    
+    parser = argparse.ArgumentParser(description="Load test concurrent /analyze requests")
+    parser.add_argument('--clients', default=','.join(str(clients) for clients in DEFAULT_CLIENTS),
+                        help="Comma-separated concurrent client counts")
+    parser.add_argument('--requests', type=int, default=50, help="Requests per client per level")
+    parser.add_argument('--think', type=float, default=0.05,
+                        help="Mean seconds a client waits between requests")
+    parser.add_argument('--url', help="Running API to test (default: the app in-process on a temporary database)")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--writer-hold', type=float, default=0,
+                        help="In-process only: seconds a background writer holds the write lock at a time")
+    parser.add_argument('--max-growth', type=float, default=2.0,
+                        help="Allowed p50 latency at the most clients, as a multiple of the p50 at the fewest")
+    parser.add_argument('--output', help="Where to write the JSON results")
+    args = parser.parse_args()
+    
+    client_counts = sorted(int(clients) for clients in args.clients.split(',') if clients.strip())
+    
+    output = os.path.abspath(args.output) if args.output else None    # Before moving to the temporary directory
+    
+    print(f"🚀 Load testing /analyze with {', '.join(map(str, client_counts))} clients...")
+    if args.url:
+        results = asyncio.run(run_load_test(client_counts, args.requests, args.think, args.url, args.seed))
+    else:
+        # The in-process app creates somali_dataset.db in the working directory
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            try:
+                results = asyncio.run(run_load_test(client_counts, args.requests, args.think, seed=args.seed,
+                                                    writer_hold=args.writer_hold))
+            finally:
+                from database import close_pools
+                close_pools()
+                os.chdir(cwd)
+    
+    if args.output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump({'think_seconds': args.think, 'writer_hold_seconds': args.writer_hold, 'results': results},
+                      f, indent=2)
+        print(f"💾 Results saved to {args.output}")
+    
+    growth = results[-1]['p50_ms'] / results[0]['p50_ms']
+    if growth > args.max_growth:
+        print(f"❌ p50 latency grew {growth:.1f}x from {results[0]['clients']} to {results[-1]['clients']} clients")
+        sys.exit(1)
+    print(f"✅ p50 latency grew {growth:.1f}x from {results[0]['clients']} to {results[-1]['clients']} clients")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Somali Ingestion Benchmark
+Bulk-write throughput as the corpus grows, in one database file and in a segment store
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from contextlib import closing
+from typing import Dict
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark_nlp import DEFAULT_SEED, generate_corpus, load_sentence_pool, parse_size
+
+DEFAULT_ROUNDS = 10
+DEFAULT_ROUND_SIZE = 100000
+DEFAULT_SEGMENT_SIZE = 200000
+
+SOURCES = ['imam_approved_pdf', 'somalitalk_religious', 'text_input']
+MODES = ('single', 'segmented')
+
+def run_mode(workdir: str, mode: str, rounds: int, round_size: int, segment_size: int,
+             seed: int = DEFAULT_SEED) -> Dict:
+    """
+    Write rounds × round_size generated texts through open_sentence_writer, timing every round
+    
+    Texts are the NLP benchmark's 'medium' corpus; near-duplicate detection
+    is off, as its cost does not depend on the storage mode.
+    """
+    
+    from database import connect
+    from schema import init_database
+    from segment_store import get_segment_store, open_sentence_writer
+    
+    db_path = os.path.join(workdir, f'{mode}.db')
+    init_database(db_path)
+    if mode == 'segmented':
+        get_segment_store(db_path, create=True).max_sentences = segment_size
+    
+    rng = random.Random(f"{seed}:metadata")
+    texts = generate_corpus(load_sentence_pool(seed), rounds * round_size, 'medium', seed)
+    columns = ('text', 'quality_score', 'source', 'validated')
+    
+    results, stored = [], 0
+    with closing(connect(db_path)) as conn:
+        for number in range(1, rounds + 1):
+            started = time.perf_counter()
+            with open_sentence_writer(conn, columns, chunk_size=20000, near_duplicate_threshold=0) as writer:
+                for _ in range(round_size):
+                    writer.add((next(texts), round(rng.uniform(40, 100), 1), rng.choice(SOURCES), rng.random() < 0.5))
+            elapsed = time.perf_counter() - started
+            stored += writer.inserted
+            results.append({'round': number, 'stored': stored, 'seconds': elapsed,
+                            'rows_per_second': round_size / elapsed})
+            print(f"   {mode:<9} round {number:>3}: {stored:>11,} stored  {round_size / elapsed:>10,.0f} rows/s")
+    
+    first, last = results[0]['rows_per_second'], results[-1]['rows_per_second']
+    return {'mode': mode, 'rounds': results, 'slowdown': first / last}
+
+def main():
+    """Command-line entry point"""
+    
+    parser = argparse.ArgumentParser(description="Benchmark ingestion throughput as the corpus grows")
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS)
+    parser.add_argument('--round-size', default=str(DEFAULT_ROUND_SIZE), help="Texts per round, e.g. 100k")
+    parser.add_argument('--segment-size', default=str(DEFAULT_SEGMENT_SIZE), help="Sentences per segment")
+    parser.add_argument('--mode', choices=MODES, action='append', help="Storage mode to run (default: both)")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--max-slowdown', type=float, default=1.5,
+                        help="Allowed first-round / last-round throughput of the segmented mode")
+    parser.add_argument('--output', help="Where to write the JSON results")
+    args = parser.parse_args()
+    
+    round_size, segment_size = parse_size(args.round_size), parse_size(args.segment_size)
+    modes = args.mode or list(MODES)
+    
+    reports = []
+    for mode in modes:
+        print(f"📥 Ingesting {args.rounds} × {round_size:,} texts ({mode})...")
+        with tempfile.TemporaryDirectory() as workdir:
+            reports.append(run_mode(workdir, mode, args.rounds, round_size, segment_size, args.seed))
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'round_size': round_size, 'segment_size': segment_size, 'results': reports}, f, indent=2)
+        print(f"💾 Results saved to {args.output}")
+    
+    for report in reports:
+        print(f"   {report['mode']:<9} last round {report['slowdown']:.2f}× slower than the first")
+    segmented = next((report for report in reports if report['mode'] == 'segmented'), None)
+    if segmented is not None and segmented['slowdown'] > args.max_slowdown:
+        print(f"❌ Segmented ingestion slowed down {segmented['slowdown']:.2f}× > {args.max_slowdown}×")
+        sys.exit(1)
+    print("✅ Ingestion throughput within bounds")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Somali NLP Benchmark Suite
+Reproducible throughput and latency benchmarks over synthetic Somali corpora
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from array import array
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Sentences per text for each length profile (inclusive range)
+LENGTH_PROFILES = {
+    'short': (1, 1),
+    'medium': (2, 4),
+    'paragraph': (5, 12)
+}
+
+DEFAULT_SIZES = [1000, 10000]
+DEFAULT_LENGTHS = ['short', 'medium', 'paragraph']
+DEFAULT_SEED = 20240101
+
+def load_sentence_pool(seed: int = DEFAULT_SEED) -> List[str]:
+    """Template sentences from both dataset builders, generated with a seeded rng"""
+    
+    import build_dataset
+    import quick_dataset_builder
+    
+    # The builders narrate their progress; keep benchmark output clean
+    with contextlib.redirect_stdout(io.StringIO()):
+        generated = build_dataset.generate_comprehensive_dataset(rng=random.Random(seed))
+        enterprise = quick_dataset_builder.build_enterprise_dataset()
+    
+    return [sentence['text'] for sentence in generated + enterprise]
+
+def generate_corpus(pool: List[str], size: int, length: str, seed: int = DEFAULT_SEED) -> Iterator[str]:
+    """
+    Deterministic stream of texts built from the sentence pool
+    
+    The same (pool, size, length, seed) always yields the same texts, on any
+    machine; texts are produced lazily so million-text corpora fit in memory.
+    """
+    
+    low, high = LENGTH_PROFILES[length]
+    rng = random.Random(f"{seed}:{size}:{length}")
+    
+    for _ in range(size):
+        sentences = [rng.choice(pool) for _ in range(rng.randint(low, high))]
+        yield sentences[0] if len(sentences) == 1 else '. '.join(sentences)
+
+def corpus_fingerprint(pool: List[str], size: int, length: str, seed: int = DEFAULT_SEED) -> str:
+    """SHA-256 of a corpus, so results are only compared over identical inputs"""
+    
+    digest = hashlib.sha256()
+    for text in generate_corpus(pool, size, length, seed):
+        digest.update(text.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def build_targets(workdir: str, use_cache: bool = False) -> Dict[str, Callable]:
+    """
+    Benchmark targets by name; each takes one text
+    
+    Ingestion scorers that need a database get a throwaway one in workdir.
+    Targets whose optional dependencies are missing are left out.
+    """
+    
+    from enterprise_nlp import SomaliNLPEngine
+    from analysis_cache import AnalysisCache
+    from data_collection_system import SomaliDataCollector
+    from pdf_processor import SomaliPDFProcessor
+    import extract_religious_content
+    import main
+    
+    # Corpora repeat template sentences; the cache would mostly measure lookups
+    engine = SomaliNLPEngine(cache=AnalysisCache.from_env() if use_cache else None)
+    db_path = os.path.join(workdir, 'benchmark.db')
+    collector = SomaliDataCollector(db_path=db_path)
+    pdf_processor = SomaliPDFProcessor(db_path=db_path)
+    
+    targets = {
+        'analyze_text_enterprise': engine.analyze_text_enterprise,
+        'analyze_batch': engine,  # Measured per batch, see run_benchmark
+        'calculate_quality_score': main.calculate_quality_score,
+        'detect_dialect': main.detect_dialect,
+        'collector.is_valid_somali_sentence': collector._is_valid_somali_sentence,
+        'pdf.calculate_religious_quality': pdf_processor.calculate_religious_quality,
+        'pdf.is_likely_somali': pdf_processor.is_likely_somali,
+        'extract.calculate_quality': extract_religious_content.calculate_quality,
+        'extract.is_somali_religious': extract_religious_content.is_somali_religious
+    }
+    
+    try:
+        from web_scraper import SomaliWebScraper
+        web_scraper = SomaliWebScraper(db_path=db_path)
+        targets['web.calculate_religious_quality'] = web_scraper.calculate_religious_quality
+        targets['web.is_likely_somali_religious'] = web_scraper.is_likely_somali_religious
+    except ImportError as e:
+        print(f"⚠️  Skipping web scraper targets: {e}")
+    
+    return targets
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def run_benchmark(name: str, target, texts: Iterator[str], batch_size: int = 1000) -> Dict:
+    """
+    Time a target over a corpus
+    
+    Returns:
+        Throughput, error count and latency percentiles in microseconds. For
+        analyze_batch the latency samples are per batch, divided by batch size.
+    """
+    
+    latencies = array('d')
+    errors = 0
+    count = 0
+    clock = time.perf_counter
+    
+    started = clock()
+    if name == 'analyze_batch':
+        batch = []
+        for text in texts:
+            batch.append(text)
+            if len(batch) == batch_size:
+                start = clock()
+                errors += sum(isinstance(result, Exception) for result in target.analyze_batch(batch, return_exceptions=True))
+                latencies.append((clock() - start) / len(batch))
+                count += len(batch)
+                batch = []
+        if batch:
+            start = clock()
+            errors += sum(isinstance(result, Exception) for result in target.analyze_batch(batch, return_exceptions=True))
+            latencies.append((clock() - start) / len(batch))
+            count += len(batch)
+    else:
+        for text in texts:
+            start = clock()
+            try:
+                target(text)
+            except Exception:
+                errors += 1
+            latencies.append(clock() - start)
+            count += 1
+    elapsed = clock() - started
+    
+    ordered = sorted(latencies)
+    return {
+        'texts': count,
+        'errors': errors,
+        'seconds': round(elapsed, 4),
+        'texts_per_sec': round(count / elapsed, 1) if elapsed > 0 else 0.0,
+        'latency_us': {
+            'mean': round(sum(ordered) / len(ordered) * 1e6, 2) if ordered else 0.0,
+            'p50': round(percentile(ordered, 0.50) * 1e6, 2),
+            'p95': round(percentile(ordered, 0.95) * 1e6, 2),
+            'p99': round(percentile(ordered, 0.99) * 1e6, 2),
+            'max': round(ordered[-1] * 1e6, 2) if ordered else 0.0
+        }
+    }
+
+def compare_with_baseline(results: List[Dict], baseline: Dict, tolerance: float) -> List[str]:
+    """
+    Regressions against a previous results file
+    
+    A run regresses when its throughput drops, or its p99 latency grows, by
+    more than tolerance (a fraction). Runs over different corpora are skipped.
+    """
+    
+    previous = {
+        (run['target'], run['size'], run['length']): run
+        for run in baseline.get('results', [])
+    }
+    
+    regressions = []
+    for run in results:
+        key = (run['target'], run['size'], run['length'])
+        old = previous.get(key)
+        if old is None or old.get('corpus_sha256') != run['corpus_sha256']:
+            continue
+        
+        if run['texts_per_sec'] < old['texts_per_sec'] * (1 - tolerance):
+            regressions.append(
+                f"{key}: throughput {run['texts_per_sec']:.0f}/s vs baseline {old['texts_per_sec']:.0f}/s"
+            )
+        if run['latency_us']['p99'] > old['latency_us']['p99'] * (1 + tolerance):
+            regressions.append(
+                f"{key}: p99 {run['latency_us']['p99']:.1f}us vs baseline {old['latency_us']['p99']:.1f}us"
+            )
+    return regressions
+
+def parse_size(value: str) -> int:
+    """Parse sizes such as 1000, 10k or 1m"""
+    
+    value = value.strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(value[-1:], 1)
+    return int(float(value.rstrip('km')) * multiplier)
+
+def run_suite(sizes: List[int], lengths: List[str], target_names: Optional[List[str]] = None,
+              seed: int = DEFAULT_SEED, batch_size: int = 1000, use_cache: bool = False,
+              warmup: int = 200) -> Dict:
+    """Run every selected target over every (size, length) corpus"""
+    
+    pool = load_sentence_pool(seed)
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        targets = build_targets(workdir, use_cache=use_cache)
+        engine_version = targets['analyze_batch'].version
+        if target_names:
+            unknown = [name for name in target_names if name not in targets]
+            if unknown:
+                raise ValueError(f"Unknown benchmark targets: {', '.join(unknown)}")
+            targets = {name: targets[name] for name in target_names}
+        
+        results = []
+        for size in sizes:
+            for length in lengths:
+                fingerprint = corpus_fingerprint(pool, size, length, seed)
+                for name, target in targets.items():
+                    # Untimed pass so lazy compilation and allocator growth stay out of the numbers
+                    if warmup:
+                        run_benchmark(name, target, generate_corpus(pool, warmup, length, seed + 1), batch_size)
+                    
+                    run = run_benchmark(name, target, generate_corpus(pool, size, length, seed), batch_size)
+                    run.update({'target': name, 'size': size, 'length': length, 'corpus_sha256': fingerprint})
+                    results.append(run)
+                    print(f"   {name:<38} {size:>8} {length:<10} {run['texts_per_sec']:>12.1f}/s  "
+                          f"p50 {run['latency_us']['p50']:>9.1f}us  p99 {run['latency_us']['p99']:>9.1f}us")
+    
+    from lexicon_matcher import AHOCORASICK_AVAILABLE
+    
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': seed,
+            'batch_size': batch_size,
+            'warmup': warmup,
+            'analysis_cache': use_cache,
+            'engine_version': engine_version,
+            'ahocorasick': AHOCORASICK_AVAILABLE,
+            'sentence_pool': len(pool)
+        },
+        'results': results
+    }
+
+def main():
+    """Command-line entry point"""
+    
+    parser = argparse.ArgumentParser(description="Benchmark the Somali NLP engine and ingestion scorers")
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help="Comma-separated corpus sizes, e.g. 1k,10k,100k,1m")
+    parser.add_argument('--lengths', default=','.join(DEFAULT_LENGTHS),
+                        help=f"Comma-separated length profiles: {', '.join(LENGTH_PROFILES)}")
+    parser.add_argument('--targets', default='', help="Comma-separated targets (default: all)")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--batch-size', type=int, default=1000, help="Texts per analyze_batch call")
+    parser.add_argument('--warmup', type=int, default=200, help="Untimed texts before each measurement")
+    parser.add_argument('--cache', action='store_true', help="Enable the analysis cache")
+    parser.add_argument('--output', default='benchmark_results.json', help="Where to write the JSON results")
+    parser.add_argument('--baseline', help="Previous results file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help="Allowed throughput drop / p99 growth versus the baseline (fraction)")
+    args = parser.parse_args()
+    
+    sizes = [parse_size(size) for size in args.sizes.split(',') if size.strip()]
+    lengths = [length.strip() for length in args.lengths.split(',') if length.strip()]
+    for length in lengths:
+        if length not in LENGTH_PROFILES:
+            parser.error(f"Unknown length profile: {length}")
+    target_names = [name.strip() for name in args.targets.split(',') if name.strip()]
+    
+    # Read before the run: --output may name the same file and overwrite it
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    
+    print("🚀 Running Somali NLP benchmarks...")
+    report = run_suite(sizes, lengths, target_names, args.seed, args.batch_size, args.cache, args.warmup)
+    
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Results saved to {args.output}")
+    
+    if baseline is not None:
+        regressions = compare_with_baseline(report['results'], baseline, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) against {args.baseline}:")
+            for regression in regressions:
+                print(f"   {regression}")
+            sys.exit(1)
+        print(f"✅ No regressions against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Somali Search Benchmark
+Full-text query latency over a multi-million-sentence corpus
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from contextlib import closing
+from typing import Dict, List, Optional, Tuple
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark_nlp import DEFAULT_SEED, generate_corpus, load_sentence_pool, parse_size, percentile
+
+DEFAULT_SENTENCES = 3000000
+DEFAULT_QUERIES = 50
+
+DIALECTS = ['Standard Somali', 'Northern Somali', 'Maay', 'Benaadir']
+CATEGORIES = ['news', 'religious', 'education', 'business', 'culture']
+
+def build_corpus(db_path: str, size: int, pool: List[str], seed: int = DEFAULT_SEED) -> int:
+    """
+    Load size generated texts through the bulk writer, unless the database already has sentences
+    
+    Texts are 2-4 pool sentences joined, as in the NLP benchmark's 'medium'
+    corpora; the few generated twice are skipped as duplicates. Many share
+    most of their sentences, so near-duplicate detection is off.
+    """
+    
+    from bulk_writer import SentenceWriter
+    from database import connect
+    from schema import init_database
+    from sentence_search import optimize_index
+    
+    init_database(db_path)
+    with closing(connect(db_path)) as conn:
+        stored = conn.execute("SELECT COUNT(*) FROM somali_sentences").fetchone()[0]
+        if stored:
+            print(f"   Reusing the {stored:,} sentences already stored")
+            return stored
+        
+        rng = random.Random(f"{seed}:metadata")
+        columns = ('text', 'dialect', 'quality_score', 'source', 'category', 'validated')
+        started = time.perf_counter()
+        with SentenceWriter(conn, columns, chunk_size=20000, near_duplicate_threshold=0) as writer:
+            for count, text in enumerate(generate_corpus(pool, size, 'medium', seed), 1):
+                writer.add((text, rng.choice(DIALECTS), round(rng.uniform(40, 100), 1), 'benchmark',
+                            rng.choice(CATEGORIES), rng.random() < 0.5))
+                if count % 500000 == 0:
+                    print(f"   {count:,} sentences written...")
+        print(f"   Loaded {writer.inserted:,} sentences in {time.perf_counter() - started:.1f}s "
+              f"({writer.duplicates:,} duplicate texts skipped)")
+        
+        # As after any large import
+        started = time.perf_counter()
+        optimize_index(conn)
+        print(f"   Optimized the search index in {time.perf_counter() - started:.1f}s")
+        
+        return conn.execute("SELECT COUNT(*) FROM somali_sentences").fetchone()[0]
+
+def build_queries(pool: List[str], count: int, seed: int = DEFAULT_SEED) -> Dict[str, List[Tuple[str, Dict]]]:
+    """
+    Query mix by kind, each a list of (FTS5 query, filters)
+    
+    Terms are drawn uniformly from the pool's vocabulary, so most are the
+    content words a user would look for; 'common term' queries use the most
+    frequent words, which match a large share of the corpus.
+    """
+    
+    rng = random.Random(f"{seed}:queries")
+    sentences = [re.findall(r"\w+", text.lower()) for text in pool]
+    frequency = {}
+    for words in sentences:
+        for word in words:
+            frequency[word] = frequency.get(word, 0) + 1
+    vocabulary = sorted(word for word in frequency if len(word) > 2 and not word.isdigit())
+    common = sorted(vocabulary, key=lambda word: -frequency[word])[:20]
+    
+    def phrase():
+        words = rng.choice([words for words in sentences if len(words) >= 3])
+        start = rng.randrange(len(words) - 2)
+        return '"' + ' '.join(words[start:start + rng.choice((2, 3))]) + '"'
+    
+    def term():
+        return rng.choice(vocabulary)
+    
+    return {
+        'term': [(term(), {}) for _ in range(count)],
+        'phrase': [(phrase(), {}) for _ in range(count)],
+        'prefix': [(term()[:4] + '*', {}) for _ in range(count)],
+        'and': [(f"{term()} AND {term()}", {}) for _ in range(count)],
+        'or': [(f"{term()} OR {term()}", {}) for _ in range(count)],
+        'not': [(f"{term()} NOT {rng.choice(common)}", {}) for _ in range(count)],
+        'filtered': [(term(), {'dialect': rng.choice(DIALECTS), 'min_quality': 70.0}) for _ in range(count)],
+        'common term': [(rng.choice(common), {}) for _ in range(count)]
+    }
+
+def run_queries(conn, queries: List[Tuple[str, Dict]], sort: str, limit: int,
+                rank_window: Optional[int] = None) -> Dict:
+    """Latency percentiles of the first result page of every query, and its match counts"""
+    
+    from sentence_search import search_sentences
+    
+    latencies, matches = [], []
+    for query, filters in queries:
+        start = time.perf_counter()
+        search_sentences(conn, query, filters, sort=sort, limit=limit, rank_window=rank_window)
+        latencies.append(time.perf_counter() - start)
+        matches.append(conn.execute("SELECT COUNT(*) FROM sentences_fts WHERE sentences_fts MATCH ?",
+                                    (query,)).fetchone()[0])
+    
+    latencies.sort()
+    matches.sort()
+    return {
+        'queries': len(latencies),
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'median_matches': percentile(matches, 0.50),
+        'max_matches': matches[-1]
+    }
+
+def run_benchmark(db_path: str, size: int, queries_per_kind: int, limit: int = 20,
+                  seed: int = DEFAULT_SEED, rank_window: int = 1000) -> Dict:
+    """Build (or reuse) the corpus, then time every query kind under both sorts, and ranked within rank_window"""
+    
+    from database import connect
+    
+    pool = load_sentence_pool(seed)
+    print(f"📚 Building a {size:,}-text corpus in {db_path}...")
+    sentences = build_corpus(db_path, size, pool, seed)
+    queries = build_queries(pool, queries_per_kind, seed)
+    
+    results = []
+    with closing(connect(db_path)) as conn:
+        conn.execute("PRAGMA cache_size = -262144")     # 256 MB: the index pages queries touch stay cached
+        
+        # Untimed pass so the numbers measure a warm cache, as on a running server
+        for kind_queries in queries.values():
+            run_queries(conn, kind_queries[:5], 'rank', limit)
+        
+        for kind, kind_queries in queries.items():
+            for label, sort, window in (('rank', 'rank', None), (f'rank/{rank_window}', 'rank', rank_window),
+                                        ('newest', 'newest', None)):
+                result = run_queries(conn, kind_queries, sort, limit, window)
+                result.update({'kind': kind, 'sort': label})
+                results.append(result)
+                print(f"   {kind:<12} {label:<9} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+                      f"p99 {result['p99_ms']:8.2f} ms  median matches {result['median_matches']:>9,}")
+    
+    return {'sentences': sentences, 'limit': limit, 'seed': seed, 'rank_window': rank_window, 'results': results}
+
+def main():
+    """Command-line entry point"""
+    
+    parser = argparse.ArgumentParser(description="Benchmark full-text search latency")
+    parser.add_argument('--sentences', default=str(DEFAULT_SENTENCES), help="Corpus size, e.g. 500k or 3m")
+    parser.add_argument('--db', help="Database to build the corpus in and keep (default: a temporary one)")
+    parser.add_argument('--queries', type=int, default=DEFAULT_QUERIES, help="Queries per kind")
+    parser.add_argument('--limit', type=int, default=20, help="Results per page")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--rank-window', type=int, default=1000, help="Window of the windowed ranking runs")
+    parser.add_argument('--max-p95-ms', type=float, default=10.0,
+                        help="Allowed p95 latency of every query kind and sort")
+    parser.add_argument('--output', help="Where to write the JSON results")
+    args = parser.parse_args()
+    
+    size = parse_size(args.sentences)
+    
+    if args.db:
+        report = run_benchmark(args.db, size, args.queries, args.limit, args.seed, args.rank_window)
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            report = run_benchmark(os.path.join(workdir, 'search.db'), size, args.queries, args.limit, args.seed,
+                                   args.rank_window)
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results saved to {args.output}")
+    
+    slow = [result for result in report['results'] if result['p95_ms'] > args.max_p95_ms]
+    if slow:
+        for result in slow:
+            print(f"❌ {result['kind']} ({result['sort']}): p95 {result['p95_ms']:.2f} ms > {args.max_p95_ms} ms")
+        sys.exit(1)
+    print(f"✅ Every query kind within p95 {args.max_p95_ms} ms on {report['sentences']:,} sentences")
+
+if __name__ == "__main__":
+    main()
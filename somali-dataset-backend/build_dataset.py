@@ -4,7 +4,6 @@ Build Real Somali Dataset
 Generate 10,000+ high-quality Somali sentences
 """
 
-import sqlite3
 import json
 import random
 from datetime import datetime
@@ -14,33 +13,20 @@ import os
 # Add the current directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+import schema
+import dataset_stats
+from database import connect
+from segment_store import open_sentence_writer
+
 def init_database():
     """Initialize the database with required tables"""
-    conn = sqlite3.connect('somali_dataset.db')
-    cursor = conn.cursor()
-    
-    # Create tables if they don't exist
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS somali_sentences (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            text TEXT UNIQUE NOT NULL,
-            translation TEXT,
-            dialect TEXT,
-            quality_score REAL,
-            source TEXT,
-            validated BOOLEAN DEFAULT FALSE,
-            scholar_approved BOOLEAN DEFAULT FALSE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            metadata TEXT
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    schema.init_database()
     print("✅ Database initialized")
 
-def generate_comprehensive_dataset():
-    """Generate comprehensive Somali dataset"""
+def generate_comprehensive_dataset(rng: random.Random = None):
+    """Generate comprehensive Somali dataset (pass a seeded rng for a reproducible one)"""
+    
+    rng = rng or random
     
     # High-quality sentence templates organized by category
     categories = {
@@ -245,23 +231,23 @@ def generate_comprehensive_dataset():
         
         for template in data["templates"]:
             # Generate variations of each template
-            for _ in range(random.randint(5, 15)):  # 5-15 variations per template
+            for _ in range(rng.randint(5, 15)):  # 5-15 variations per template
                 sentence = template
                 
                 # Replace placeholders with random words
                 if "words" in data:
                     for placeholder, word_list in data["words"].items():
                         if f"{{{placeholder}}}" in sentence:
-                            sentence = sentence.replace(f"{{{placeholder}}}", random.choice(word_list))
+                            sentence = sentence.replace(f"{{{placeholder}}}", rng.choice(word_list))
                 
                 # Add some natural variations
-                if random.random() < 0.2:  # 20% chance
+                if rng.random() < 0.2:  # 20% chance
                     sentence = f"Si kastaba, {sentence.lower()}"
                 
-                if random.random() < 0.15:  # 15% chance
+                if rng.random() < 0.15:  # 15% chance
                     sentence = f"{sentence}. Waa run."
                 
-                if random.random() < 0.1:  # 10% chance
+                if rng.random() < 0.1:  # 10% chance
                     sentence = f"Waxaa la yidhi: '{sentence}'"
                 
                 # Basic quality check
@@ -314,14 +300,12 @@ def generate_comprehensive_dataset():
     return generated_sentences
 
 def save_to_database(sentences):
-    """Save generated sentences to database"""
-    conn = sqlite3.connect('somali_dataset.db')
-    cursor = conn.cursor()
-    
-    success_count = 0
+    """Save generated sentences to database (duplicates are skipped)"""
+    conn = connect('somali_dataset.db')
     
-    for sentence_data in sentences:
-        try:
+    columns = ('text', 'dialect', 'quality_score', 'source', 'category', 'validated', 'metadata')
+    with open_sentence_writer(conn, columns) as writer:
+        for sentence_data in sentences:
             # Calculate a basic quality score
             text = sentence_data["text"]
             words = text.split()
@@ -334,58 +318,35 @@ def save_to_database(sentences):
             
             quality_score = length_score + char_score + structure_score + somali_score
             
-            cursor.execute('''
-                INSERT OR IGNORE INTO somali_sentences 
-                (text, dialect, quality_score, source, validated, metadata)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
+            writer.add((
                 text,
                 sentence_data["dialect"],
                 quality_score,
                 sentence_data["source"],
+                sentence_data["category"],
                 True,
                 json.dumps({"category": sentence_data["category"]})
             ))
-            
-            if cursor.rowcount > 0:
-                success_count += 1
-                
-        except sqlite3.IntegrityError:
-            continue  # Skip duplicates
     
-    conn.commit()
     conn.close()
     
-    print(f"✅ Successfully saved {success_count} sentences to database")
-    return success_count
+    print(f"✅ Successfully saved {writer.inserted} sentences to database "
+          f"({writer.duplicates} duplicates, {writer.near_duplicates} near-duplicates skipped)")
+    return writer.inserted
 
 def get_dataset_stats():
     """Get current dataset statistics"""
-    conn = sqlite3.connect('somali_dataset.db')
-    cursor = conn.cursor()
-    
-    # Total sentences
-    cursor.execute("SELECT COUNT(*) FROM somali_sentences")
-    total = cursor.fetchone()[0]
-    
-    # Average quality
-    cursor.execute("SELECT AVG(quality_score) FROM somali_sentences")
-    avg_quality = cursor.fetchone()[0] or 0
-    
-    # High quality sentences (>= 80)
-    cursor.execute("SELECT COUNT(*) FROM somali_sentences WHERE quality_score >= 80")
-    high_quality = cursor.fetchone()[0]
+    conn = connect('somali_dataset.db')
     
-    # By source
-    cursor.execute("SELECT source, COUNT(*) FROM somali_sentences GROUP BY source")
-    by_source = dict(cursor.fetchall())
+    stats = dataset_stats.summary(conn)
+    by_source = dataset_stats.breakdown(conn, 'source')
     
     conn.close()
     
     return {
-        "total_sentences": total,
-        "average_quality": round(avg_quality, 1),
-        "high_quality_sentences": high_quality,
+        "total_sentences": stats["total_sentences"],
+        "average_quality": round(stats["average_quality"], 1),
+        "high_quality_sentences": stats["high_quality"],
         "by_source": by_source
     }
 
@@ -0,0 +1,196 @@
+"""
+Enterprise Bulk Writer
+Buffered, chunked multi-row inserts shared by every ingestion path
+"""
+
+import sqlite3
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from near_duplicates import NearDuplicateIndex, database_path, get_index
+from schema import rollup_stats
+
+DEFAULT_CHUNK_SIZE = 5000
+
+class BulkWriter:
+    """
+    Buffers rows for one table and inserts them with executemany, a chunk per transaction.
+    
+    Each chunk is written inside BEGIN IMMEDIATE ... COMMIT, so the write
+    lock is taken up front (no deadlocking lock upgrade under WAL) and held
+    for one chunk only, letting API writes interleave with a long import.
+    With on_conflict='IGNORE' rows that hit a UNIQUE constraint (the same
+    text already stored, or repeated within the import) are skipped and
+    counted in duplicates.
+    
+    Usage:
+        with BulkWriter(conn, 'somali_sentences', ('text', 'source')) as writer:
+            for text in texts:
+                writer.add((text, 'manual'))
+        print(writer.inserted, writer.duplicates)
+    """
+    
+    def __init__(self, conn: sqlite3.Connection, table: str, columns: Sequence[str],
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, on_conflict: Optional[str] = 'IGNORE'):
+        """
+        Args:
+            conn: Connection to write with; a transaction it already has open
+                is committed with the first chunk
+            table: Table to insert into
+            columns: Column names, in the order of every added row
+            chunk_size: Rows per executemany and per transaction
+            on_conflict: INSERT OR <on_conflict> resolution, or None for a plain INSERT
+        """
+        self.conn = conn
+        self.chunk_size = chunk_size
+        self.sql = (f"INSERT {f'OR {on_conflict} ' if on_conflict else ''}INTO {table} "
+                    f"({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})")
+        
+        self._buffer: List[Sequence] = []
+        self.written = 0      # Rows sent to SQLite in committed chunks
+        self.inserted = 0     # Of those, rows actually inserted
+    
+    @property
+    def duplicates(self) -> int:
+        """Committed rows skipped by the conflict resolution"""
+        return self.written - self.inserted
+    
+    def add(self, row: Sequence):
+        """Queue one row, writing a chunk once chunk_size rows are buffered"""
+        
+        self._buffer.append(row)
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+    
+    def add_many(self, rows: Iterable[Sequence]):
+        """Queue several rows"""
+        
+        for row in rows:
+            self.add(row)
+    
+    def flush(self) -> int:
+        """
+        Write the buffered rows in one transaction
+        
+        Returns:
+            Rows inserted by this chunk
+        
+        Raises:
+            sqlite3.Error: The chunk is rolled back and its rows dropped;
+                earlier chunks stay committed
+        """
+        
+        if not self._buffer:
+            return 0
+        rows, self._buffer = self._buffer, []
+        
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows, state = self._before_chunk(rows)
+            # rowcount sums sqlite3_changes() over the rows: ignored rows and trigger writes count 0
+            inserted = self.conn.executemany(self.sql, rows).rowcount if rows else 0
+            self._after_chunk(state)
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        
+        self.written += len(rows)
+        self.inserted += inserted
+        self._after_commit(state)
+        return inserted
+    
+    def _before_chunk(self, rows: List[Sequence]) -> Tuple[List[Sequence], object]:
+        """Hook run in the chunk's transaction before the insert: the rows to insert, and a state for the other hooks"""
+        return rows, None
+    
+    def _after_chunk(self, state):
+        """Hook run in the chunk's transaction after the insert"""
+        pass
+    
+    def _after_commit(self, state):
+        """Hook run once the chunk is committed"""
+        pass
+    
+    def __enter__(self) -> 'BulkWriter':
+        return self
+    
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.flush()
+        else:
+            # Abandon the unwritten rows; committed chunks are kept
+            self._buffer = []
+            if self.conn.in_transaction:
+                self.conn.rollback()
+        return False
+
+class SentenceWriter(BulkWriter):
+    """
+    BulkWriter for somali_sentences that updates the dataset statistics once per chunk
+    and drops near-duplicate texts.
+    
+    The per-row statistics trigger costs more than the insert itself, so each
+    chunk suspends it (schema version 7) and adds all of its new rows to
+    dataset_stats with a few grouped upserts instead.
+    
+    Texts that are near-duplicates of a stored sentence or of an earlier text
+    of the import (see near_duplicates.py) are not inserted: they are counted
+    in near_duplicates and logged in the index for the /dedupe/report.
+    """
+    
+    def __init__(self, conn: sqlite3.Connection, columns: Sequence[str], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 near_duplicate_threshold: Optional[float] = None):
+        """
+        Args:
+            conn: Connection to write with
+            columns: Column names, in the order of every added row; must include 'text'
+            chunk_size: Rows per executemany and per transaction
+            near_duplicate_threshold: Jaccard similarity of a near-duplicate;
+                None for NEAR_DUPLICATE_THRESHOLD, 0 to keep near-duplicates
+        """
+        # OR IGNORE only: OR REPLACE would delete rows without the delete trigger
+        super().__init__(conn, 'somali_sentences', columns, chunk_size, 'IGNORE')
+        self.index: Optional[NearDuplicateIndex] = get_index(database_path(conn), near_duplicate_threshold)
+        self._text = list(columns).index('text')
+        self._source = list(columns).index('source') if 'source' in columns else None
+        self.near_duplicates = 0    # Rows dropped as near-duplicates in committed chunks
+    
+    def _before_chunk(self, rows: List[Sequence]) -> Tuple[List[Sequence], tuple]:
+        # New rows get ids above the current maximum (AUTOINCREMENT)
+        last_id = self.conn.execute("SELECT IFNULL(MAX(id), 0) FROM somali_sentences").fetchone()[0]
+        self.conn.execute("INSERT INTO stats_deferred (id) VALUES (1)")
+        
+        if self.index is None:
+            return rows, (last_id, rows, None, None)
+        sigs, matches = self.index.match(self.conn, [row[self._text] for row in rows])
+        return [row for row, match in zip(rows, matches) if match is None], (last_id, rows, sigs, matches)
+    
+    def _after_chunk(self, state: tuple):
+        self.conn.execute("DELETE FROM stats_deferred")
+        rollup_stats(self.conn, 'id > ?', (state[0],))
+    
+    def _after_commit(self, state: tuple):
+        last_id, rows, sigs, matches = state
+        if matches is None:
+            return
+        
+        new_ids = {row[1]: row[0] for row in self.conn.execute(
+            "SELECT id, text FROM somali_sentences WHERE id > ?", (last_id,)
+        )}
+        self.index.add((new_ids[row[self._text]], sig) for row, sig in zip(rows, sigs)
+                       if sig is not None and row[self._text] in new_ids)
+        
+        rejected = []
+        for row, match in zip(rows, matches):
+            if match is None:
+                continue
+            if 'sentence_id' in match:
+                representative = match['sentence_id']
+            else:
+                # Kept earlier in the chunk; the write lock was held since the match
+                representative = new_ids[rows[match['index']][self._text]]
+            source = row[self._source] if self._source is not None else None
+            rejected.append((representative, None, row[self._text], match['similarity'], source))
+        self.index.record(rejected)
+        self.near_duplicates += sum(match is not None for match in matches)
@@ -3,8 +3,6 @@ Enterprise Data Collection System
 Automated collection and validation of Somali language data
 """
 
-import asyncio
-import aiohttp
 import sqlite3
 import json
 import re
@@ -13,137 +11,99 @@ from datetime import datetime
 import hashlib
 from pathlib import Path
 import logging
-from enterprise_nlp import nlp_engine
+import threading
+from enterprise_nlp import get_nlp_engine
+from database import get_pool
+from bulk_writer import BulkWriter
+from segment_store import get_segment_store, open_sentence_writer
+from schema import migrate
+import dataset_stats
+from lexicon_matcher import lexicon_matcher, WORD
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Analysis fields the collector reads and stores; the rest is pruned before results come back
+COLLECTOR_FIELDS = ['enterprise_metrics', 'dialect_analysis.primary_dialect']
+
+# Somali-specific function words (matched as whole words)
+SOMALI_INDICATORS = [
+    'waa', 'baa', 'ayaa', 'oo', 'iyo', 'ka', 'ku', 'la', 
+    'ah', 'si', 'ugu', 'soo', 'aan', 'waxa', 'waxaa'
+]
+
+lexicon_matcher.add_lexicon('collector.somali_indicators', SOMALI_INDICATORS)
+
 class SomaliDataCollector:
     """Enterprise-grade Somali data collection system"""
     
     def __init__(self, db_path: str = "somali_dataset.db"):
         self.db_path = db_path
+        self.pool = get_pool(db_path)
         self.init_data_tables()
         
     def init_data_tables(self):
         """Initialize additional tables for data collection"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Sources table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS data_sources (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                source_name TEXT UNIQUE NOT NULL,
-                source_type TEXT,
-                url TEXT,
-                is_active BOOLEAN DEFAULT TRUE,
-                last_scraped TIMESTAMP,
-                total_collected INTEGER DEFAULT 0,
-                success_rate REAL DEFAULT 0.0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Raw data table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS raw_data (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                source_id INTEGER,
-                raw_text TEXT NOT NULL,
-                language_detected TEXT,
-                confidence_score REAL,
-                is_processed BOOLEAN DEFAULT FALSE,
-                is_valid BOOLEAN DEFAULT NULL,
-                collected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (source_id) REFERENCES data_sources (id)
-            )
-        ''')
-        
-        # Validation queue
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS validation_queue (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                raw_data_id INTEGER,
-                text TEXT NOT NULL,
-                validation_status TEXT DEFAULT 'pending',
-                validator_id INTEGER,
-                validation_notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                validated_at TIMESTAMP,
-                FOREIGN KEY (raw_data_id) REFERENCES raw_data (id)
-            )
-        ''')
-        
-        # Scholar validation
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS scholar_validations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                sentence_id INTEGER,
-                scholar_email TEXT,
-                validation_score INTEGER,
-                cultural_score INTEGER,
-                grammar_score INTEGER,
-                notes TEXT,
-                approved BOOLEAN,
-                validated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (sentence_id) REFERENCES somali_sentences (id)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        with self.pool.connection() as conn:
+            migrate(conn)
         
     def add_data_source(self, source_name: str, source_type: str, url: str = None) -> int:
         """Add a new data source"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute('''
-                INSERT INTO data_sources (source_name, source_type, url)
-                VALUES (?, ?, ?)
-            ''', (source_name, source_type, url))
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
             
-            source_id = cursor.lastrowid
-            conn.commit()
-            
-            logger.info(f"Added data source: {source_name} (ID: {source_id})")
-            return source_id
-            
-        except sqlite3.IntegrityError:
-            logger.warning(f"Source {source_name} already exists")
-            return None
-        finally:
-            conn.close()
+            try:
+                cursor.execute('''
+                    INSERT INTO data_sources (source_name, source_type, url)
+                    VALUES (?, ?, ?)
+                ''', (source_name, source_type, url))
+                
+                source_id = cursor.lastrowid
+                conn.commit()
+                
+                logger.info(f"Added data source: {source_name} (ID: {source_id})")
+                return source_id
+                
+            except sqlite3.IntegrityError:
+                logger.warning(f"Source {source_name} already exists")
+                return None
     
-    def collect_from_text_sources(self, text_sources: List[str]) -> Dict:
-        """Collect data from provided text sources"""
+    def collect_from_text_sources(self, text_sources: List[str], analyzer=None,
+                                  conn: Optional[sqlite3.Connection] = None) -> Dict:
+        """
+        Collect data from provided text sources
+        
+        Args:
+            text_sources: Raw texts to split, filter and analyze
+            analyzer: Object with analyze_batch (e.g. the analysis pool); defaults to nlp_engine
+            conn: Connection the caller already holds; one is borrowed from the pool otherwise
+        """
         
         collected_data = []
         
-        for source_text in text_sources:
-            # Split into sentences
-            sentences = self._extract_sentences(source_text)
-            
-            for sentence in sentences:
-                if self._is_valid_somali_sentence(sentence):
-                    # Analyze with enterprise NLP
-                    analysis = nlp_engine.analyze_text_enterprise(sentence)
-                    
-                    # Only keep high-quality sentences
-                    if analysis['enterprise_metrics']['overall_enterprise_score'] >= 70:
-                        collected_data.append({
-                            'text': sentence,
-                            'analysis': analysis,
-                            'source': 'text_input'
-                        })
+        # Split into sentences and keep the ones that look Somali
+        candidates = [
+            sentence
+            for source_text in text_sources
+            for sentence in self._extract_sentences(source_text)
+            if self._is_valid_somali_sentence(sentence)
+        ]
+        
+        # Analyze with enterprise NLP in one batch
+        analyses = (analyzer or get_nlp_engine()).analyze_batch(candidates, fields=COLLECTOR_FIELDS)
+        
+        for sentence, analysis in zip(candidates, analyses):
+            # Only keep high-quality sentences
+            if analysis['enterprise_metrics']['overall_enterprise_score'] >= 70:
+                collected_data.append({
+                    'text': sentence,
+                    'analysis': analysis,
+                    'source': 'text_input'
+                })
         
         # Save to database
-        self._save_collected_data(collected_data)
+        self._save_collected_data(collected_data, conn)
         
         return {
             'total_collected': len(collected_data),
@@ -184,54 +144,38 @@ class SomaliDataCollector:
     def _is_valid_somali_sentence(self, sentence: str) -> bool:
         """Quick validation if sentence is likely Somali"""
         
-        # Check for Somali-specific indicators
-        somali_indicators = [
-            'waa', 'baa', 'ayaa', 'oo', 'iyo', 'ka', 'ku', 'la', 
-            'ah', 'si', 'ugu', 'soo', 'aan', 'waxa', 'waxaa'
-        ]
-        
-        sentence_lower = sentence.lower()
-        indicator_count = sum(1 for indicator in somali_indicators if indicator in sentence_lower)
+        # Check for Somali-specific indicators as whole words ('la' must not match inside 'Allah')
+        indicator_count = lexicon_matcher.count('collector.somali_indicators', sentence.lower(), WORD)
         
         # Must have at least 1 Somali indicator and reasonable length
         return indicator_count >= 1 and 5 <= len(sentence.split()) <= 50
     
-    def _save_collected_data(self, data: List[Dict]):
+    def _save_collected_data(self, data: List[Dict], conn: Optional[sqlite3.Connection] = None):
         """Save collected data to database"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        for item in data:
-            try:
-                # Save to raw_data table
-                cursor.execute('''
-                    INSERT INTO raw_data (source_id, raw_text, language_detected, confidence_score, is_processed, is_valid)
-                    VALUES (1, ?, 'somali', ?, TRUE, TRUE)
-                ''', (item['text'], item['analysis']['enterprise_metrics']['overall_enterprise_score']))
-                
-                # Save to main sentences table
-                cursor.execute('''
-                    INSERT OR IGNORE INTO somali_sentences 
-                    (text, dialect, quality_score, source, validated, metadata)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (
-                    item['text'],
-                    item['analysis']['dialect_analysis']['primary_dialect'],
-                    item['analysis']['enterprise_metrics']['overall_enterprise_score'],
-                    item['source'],
-                    True,
-                    json.dumps(item['analysis']['enterprise_metrics'])
-                ))
-                
-            except sqlite3.IntegrityError:
-                # Sentence already exists, skip
-                continue
+        raw_columns = ('source_id', 'raw_text', 'language_detected', 'confidence_score', 'is_processed', 'is_valid')
+        sentence_columns = ('text', 'dialect', 'quality_score', 'source', 'validated', 'metadata')
         
-        conn.commit()
-        conn.close()
+        with self.pool.connection(conn) as conn:
+            with BulkWriter(conn, 'raw_data', raw_columns, on_conflict=None) as raw_writer, \
+                 open_sentence_writer(conn, sentence_columns) as sentence_writer:
+                for item in data:
+                    metrics = item['analysis']['enterprise_metrics']
+                    
+                    # Save to raw_data table
+                    raw_writer.add((1, item['text'], 'somali', metrics['overall_enterprise_score'], True, True))
+                    
+                    # Save to main sentences table (sentences already stored are skipped)
+                    sentence_writer.add((
+                        item['text'],
+                        item['analysis']['dialect_analysis']['primary_dialect'],
+                        metrics['overall_enterprise_score'],
+                        item['source'],
+                        True,
+                        json.dumps(metrics)
+                    ))
     
-    def generate_sample_data(self, count: int = 1000) -> Dict:
+    def generate_sample_data(self, count: int = 1000, analyzer=None, conn: Optional[sqlite3.Connection] = None) -> Dict:
         """Generate sample Somali sentences for testing"""
         
         # Sample Somali sentence templates
@@ -288,7 +232,7 @@ class SomaliDataCollector:
             generated_sentences.append(sentence)
         
         # Process and save generated sentences
-        collection_result = self.collect_from_text_sources(generated_sentences)
+        collection_result = self.collect_from_text_sources(generated_sentences, analyzer=analyzer, conn=conn)
         
         return {
             'generated_count': count,
@@ -297,66 +241,54 @@ class SomaliDataCollector:
             'average_quality': collection_result['average_quality']
         }
     
-    def get_collection_stats(self) -> Dict:
+    def get_collection_stats(self, conn: Optional[sqlite3.Connection] = None) -> Dict:
         """Get data collection statistics"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Total sentences
-        cursor.execute("SELECT COUNT(*) FROM somali_sentences")
-        total_sentences = cursor.fetchone()[0]
-        
-        # High quality sentences (score >= 80)
-        cursor.execute("SELECT COUNT(*) FROM somali_sentences WHERE quality_score >= 80")
-        high_quality = cursor.fetchone()[0]
-        
-        # Average quality
-        cursor.execute("SELECT AVG(quality_score) FROM somali_sentences")
-        avg_quality = cursor.fetchone()[0] or 0
-        
-        # By source
-        cursor.execute("SELECT source, COUNT(*) FROM somali_sentences GROUP BY source")
-        by_source = dict(cursor.fetchall())
-        
-        # By dialect
-        cursor.execute("SELECT dialect, COUNT(*) FROM somali_sentences GROUP BY dialect")
-        by_dialect = dict(cursor.fetchall())
-        
-        # Recent additions (last 24 hours)
-        cursor.execute("SELECT COUNT(*) FROM somali_sentences WHERE created_at > datetime('now', '-1 day')")
-        recent_additions = cursor.fetchone()[0]
-        
-        conn.close()
+        store = get_segment_store(self.db_path)
+        with self.pool.connection(conn) as conn:
+            if store is None:
+                stats = dataset_stats.summary(conn)
+                by_source = dataset_stats.breakdown(conn, 'source')
+                by_dialect = dataset_stats.breakdown(conn, 'dialect')
+                recent_additions = dataset_stats.recent_additions(conn, hours=24)
+            else:
+                stats = store.summary(conn)
+                by_source = store.breakdown('source', conn)
+                by_dialect = store.breakdown('dialect', conn)
+                recent_additions = store.recent_additions(24, conn)
+        
+        total_sentences = stats['total_sentences']
+        high_quality = stats['high_quality']
         
         return {
             'total_sentences': total_sentences,
             'high_quality_sentences': high_quality,
-            'average_quality': round(avg_quality, 1),
+            'average_quality': round(stats['average_quality'], 1),
             'quality_percentage': round((high_quality / total_sentences) * 100, 1) if total_sentences > 0 else 0,
             'by_source': by_source,
             'by_dialect': by_dialect,
             'recent_additions_24h': recent_additions
         }
     
-    def bulk_validate_sentences(self, sentences: List[str], validator_id: int = 1) -> Dict:
+    def bulk_validate_sentences(self, sentences: List[str], validator_id: int = 1, analyzer=None,
+                                conn: Optional[sqlite3.Connection] = None) -> Dict:
         """Bulk validate sentences for quality"""
         
         validated_sentences = []
         
-        for sentence in sentences:
-            if self._is_valid_somali_sentence(sentence):
-                analysis = nlp_engine.analyze_text_enterprise(sentence)
-                
-                validated_sentences.append({
-                    'text': sentence,
-                    'quality_score': analysis['enterprise_metrics']['overall_enterprise_score'],
-                    'is_valid': analysis['enterprise_metrics']['overall_enterprise_score'] >= 70,
-                    'analysis': analysis
-                })
+        candidates = [sentence for sentence in sentences if self._is_valid_somali_sentence(sentence)]
+        analyses = (analyzer or get_nlp_engine()).analyze_batch(candidates, fields=COLLECTOR_FIELDS)
+        
+        for sentence, analysis in zip(candidates, analyses):
+            validated_sentences.append({
+                'text': sentence,
+                'quality_score': analysis['enterprise_metrics']['overall_enterprise_score'],
+                'is_valid': analysis['enterprise_metrics']['overall_enterprise_score'] >= 70,
+                'analysis': analysis
+            })
         
         # Save validation results
-        self._save_validation_results(validated_sentences, validator_id)
+        self._save_validation_results(validated_sentences, validator_id, conn)
         
         return {
             'total_validated': len(validated_sentences),
@@ -365,32 +297,41 @@ class SomaliDataCollector:
             'average_quality': sum(s['quality_score'] for s in validated_sentences) / len(validated_sentences) if validated_sentences else 0
         }
     
-    def _save_validation_results(self, validated_sentences: List[Dict], validator_id: int):
+    def _save_validation_results(self, validated_sentences: List[Dict], validator_id: int,
+                                 conn: Optional[sqlite3.Connection] = None):
         """Save validation results to database"""
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        for sentence_data in validated_sentences:
-            if sentence_data['is_valid']:
-                try:
-                    cursor.execute('''
-                        INSERT OR IGNORE INTO somali_sentences 
-                        (text, dialect, quality_score, source, validated, metadata)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (
+        with self.pool.connection(conn) as conn:
+            columns = ('text', 'dialect', 'quality_score', 'source', 'validated', 'metadata')
+            with open_sentence_writer(conn, columns) as writer:
+                writer.add_many(
+                    (
                         sentence_data['text'],
                         sentence_data['analysis']['dialect_analysis']['primary_dialect'],
                         sentence_data['quality_score'],
                         'bulk_validation',
                         True,
                         json.dumps(sentence_data['analysis']['enterprise_metrics'])
-                    ))
-                except sqlite3.IntegrityError:
-                    continue
-        
-        conn.commit()
-        conn.close()
+                    )
+                    for sentence_data in validated_sentences if sentence_data['is_valid']
+                )
+
+# Global data collector, created (with its tables) on first use
+_data_collector = None
+_data_collector_lock = threading.Lock()
+
+def get_data_collector() -> SomaliDataCollector:
+    """Return the shared data collector, creating its tables on first call"""
+    global _data_collector
+    
+    if _data_collector is None:
+        with _data_collector_lock:
+            if _data_collector is None:
+                _data_collector = SomaliDataCollector()
+    return _data_collector
 
-# Initialize global data collector
-data_collector = SomaliDataCollector()
\ No newline at end of file
+def __getattr__(name: str):
+    # Keeps `from data_collection_system import data_collector` working without touching SQLite at import
+    if name == 'data_collector':
+        return get_data_collector()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,240 @@
+"""
+Enterprise Database Layer
+Pooled, pre-configured SQLite connections shared by the API and the collectors
+"""
+
+import asyncio
+import functools
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+DEFAULT_DB_PATH = 'somali_dataset.db'
+
+# Applied once to every new connection. WAL lets API reads proceed while a
+# scraper or PDF job writes; NORMAL sync cannot corrupt the database in WAL mode
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 30000,      # ms to wait on a locked database before failing
+    'cache_size': -65536,       # KiB (64 MiB) of page cache per connection
+    'mmap_size': 268435456,     # 256 MiB of memory-mapped reads
+    'temp_store': 'MEMORY'
+}
+
+def connect(db_path: str = DEFAULT_DB_PATH, timeout: float = 30.0, pragmas: Optional[Dict] = None,
+            check_same_thread: bool = True) -> sqlite3.Connection:
+    """Open a connection with the backend's pragmas and sqlite3.Row rows"""
+    
+    conn = sqlite3.connect(db_path, timeout=timeout, check_same_thread=check_same_thread)
+    conn.row_factory = sqlite3.Row
+    for name, value in (DEFAULT_PRAGMAS if pragmas is None else pragmas).items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+class PoolTimeout(Exception):
+    """No connection became free in time"""
+
+class ConnectionPool:
+    """
+    Bounded pool of long-lived SQLite connections.
+    
+    Each connection is borrowed exclusively, so it can be used from any
+    thread (FastAPI's threadpool, the event loop) without sharing a cursor
+    between concurrent requests. Connections come back rolled back if the
+    borrower left a transaction open, matching connect/close semantics.
+    """
+    
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, max_connections: int = 8,
+                 timeout: float = 30.0, pragmas: Optional[Dict] = None):
+        """
+        Args:
+            db_path: SQLite database file
+            max_connections: Upper bound on open connections
+            timeout: Seconds to wait for a free connection (and for SQLite locks)
+            pragmas: PRAGMA name -> value applied to each new connection
+        """
+        self.db_path = db_path
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.closed = False
+        
+        self._idle = queue.LifoQueue()  # Most recently used first: its pages are warm
+        self._slots = threading.BoundedSemaphore(max_connections)
+    
+    def _connect(self) -> sqlite3.Connection:
+        return connect(self.db_path, self.timeout, self.pragmas, check_same_thread=False)
+    
+    @staticmethod
+    def _discard(conn: sqlite3.Connection):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    
+    def acquire(self) -> sqlite3.Connection:
+        """Borrow a connection; pair with release()"""
+        
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"No free connection to {self.db_path} after {self.timeout}s")
+        
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        
+        try:
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+    
+    def release(self, conn: sqlite3.Connection):
+        """Return a borrowed connection to the pool"""
+        
+        try:
+            if self.closed:
+                self._discard(conn)
+                return
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+        except sqlite3.Error:
+            # Broken connection (closed, disk I/O error): replace it on next borrow
+            self._discard(conn)
+        finally:
+            self._slots.release()
+    
+    @contextmanager
+    def connection(self, conn: Optional[sqlite3.Connection] = None) -> Iterator[sqlite3.Connection]:
+        """
+        Borrow a connection for the duration of a with-block
+        
+        Args:
+            conn: Connection the caller already holds; reused as-is so one
+                request never holds two connections
+        """
+        
+        if conn is not None:
+            yield conn
+            return
+        
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+    
+    def close_all(self):
+        """Close every idle connection; connections still borrowed are left open"""
+        
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+    
+    def close(self):
+        """Close the pool for good: idle connections now, borrowed ones when they are released"""
+        
+        self.closed = True
+        self.close_all()
+
+class AsyncDatabase:
+    """
+    Awaitable access to a ConnectionPool for async handlers.
+    
+    Blocking sqlite3 calls run on a dedicated thread pool with one thread per
+    pooled connection, so the event loop never waits on SQLite, at most
+    max_connections calls run at once, and a burst of queries cannot starve
+    the threadpool FastAPI uses for sync dependencies and streaming.
+    """
+    
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+        self._executor = ThreadPoolExecutor(max_workers=pool.max_connections, thread_name_prefix='sqlite')
+    
+    def _call(self, func: Callable, args: tuple, kwargs: Dict):
+        with self.pool.connection() as conn:
+            return func(*args, conn=conn, **kwargs)
+    
+    async def run(self, func: Callable, *args, **kwargs):
+        """
+        Await func(*args, conn=<pooled connection>, **kwargs) on a database thread
+        
+        func follows the conn= convention of the data layer, so existing
+        functions (load_api_key_user, dataset_stats.summary, collector methods)
+        run unchanged; several statements in one func share one connection
+        and one thread hop.
+        """
+        
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(self._call, func, args, kwargs))
+    
+    async def fetchall(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        """All rows of one query"""
+        return await self.run(lambda conn: conn.execute(sql, params).fetchall())
+    
+    async def fetchone(self, sql: str, params: tuple = ()) -> Optional[sqlite3.Row]:
+        """First row of one query, or None"""
+        return await self.run(lambda conn: conn.execute(sql, params).fetchone())
+    
+    def close(self):
+        """Wait for running calls and stop the database threads"""
+        self._executor.shutdown(wait=True)
+
+_pools: Dict[str, ConnectionPool] = {}
+_async_databases: Dict[str, AsyncDatabase] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path: str = DEFAULT_DB_PATH) -> ConnectionPool:
+    """Shared pool for a database file, created on first use"""
+    
+    pool = _pools.get(db_path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(db_path)
+            if pool is None:
+                pool = _pools[db_path] = ConnectionPool(
+                    db_path, max_connections=int(os.environ.get('DB_POOL_SIZE', 8))
+                )
+    return pool
+
+def get_async_database(db_path: str = DEFAULT_DB_PATH) -> AsyncDatabase:
+    """Shared AsyncDatabase over the pool of a database file"""
+    
+    database = _async_databases.get(db_path)
+    if database is None:
+        with _pools_lock:
+            database = _async_databases.get(db_path)
+            if database is None:
+                database = _async_databases[db_path] = AsyncDatabase(get_pool(db_path))
+    return database
+
+def close_pools():
+    """Stop the database threads and close the idle connections of every pool"""
+    
+    with _pools_lock:
+        pools = list(_pools.values())
+        databases = list(_async_databases.values())
+        _async_databases.clear()    # Recreated on next use, e.g. when the app starts again
+    for database in databases:
+        database.close()
+    for pool in pools:
+        pool.close_all()
+
+def get_db() -> Iterator[sqlite3.Connection]:
+    """FastAPI dependency: one pooled connection per request"""
+    
+    with get_pool().connection() as conn:
+        yield conn
+
+async def get_async_db() -> AsyncDatabase:
+    """FastAPI dependency: the shared AsyncDatabase, for async handlers"""
+    return get_async_database()
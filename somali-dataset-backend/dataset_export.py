@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Enterprise Dataset Export
+Streams somali_sentences with their latest quality metrics as JSONL, CSV, Parquet or Arrow
+"""
+
+import argparse
+import csv
+import io
+import json
+import sqlite3
+import sys
+import zlib
+from contextlib import closing
+from typing import Dict, Iterator, List, Optional
+
+from database import DEFAULT_DB_PATH, ConnectionPool, connect, get_pool
+from schema import init_database
+from sentence_listing import LISTING_COLUMNS, SENTENCE_FILTERS, parse_timestamp
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Rows per keyset query, and per Parquet row group / Arrow record batch
+DEFAULT_CHUNK_SIZE = 5000
+
+METRIC_COLUMNS = ('accuracy_score', 'cultural_score', 'grammar_score', 'completeness_score',
+                  'overall_score', 'validator_notes')
+EXPORT_COLUMNS = tuple(column.strip() for column in LISTING_COLUMNS.split(',')) + METRIC_COLUMNS
+
+# Arrow type of every export column
+COLUMN_TYPES = {
+    'id': 'int64', 'text': 'string', 'translation': 'string', 'dialect': 'string',
+    'quality_score': 'double', 'source': 'string', 'category': 'string', 'word_count': 'int64',
+    'validated': 'bool', 'scholar_approved': 'bool', 'created_at': 'string',
+    'accuracy_score': 'double', 'cultural_score': 'double', 'grammar_score': 'double',
+    'completeness_score': 'double', 'overall_score': 'double', 'validator_notes': 'string'
+}
+BOOLEAN_COLUMNS = ('validated', 'scholar_approved')
+
+# Format -> (file extension, media type)
+FORMATS = {
+    'jsonl': ('jsonl', 'application/x-ndjson'),
+    'csv': ('csv', 'text/csv'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('arrow', 'application/vnd.apache.arrow.stream')
+}
+COLUMNAR_FORMATS = ('parquet', 'arrow')
+
+# Compression -> (file extension, media type); columnar formats compress inside the file instead
+COMPRESSIONS = {
+    'gzip': ('gz', 'application/gzip'),
+    'zstd': ('zst', 'application/zstd')
+}
+
+def chunk_query(filters: Dict, after_id: int, limit: int, id_base: int = 0) -> tuple:
+    """
+    SQL and parameters for the next chunk of export rows after after_id
+    
+    The sentences are read in primary key order (NOT INDEXED keeps the planner
+    off the filter indexes, whose matches it would have to sort), so a whole
+    export is a single pass over the table however selective the filters are.
+    id_base is added to the exported ids (of a storage segment, see
+    segment_store.py); after_id is a local id.
+    """
+    
+    columns = [f's.{column}' for column in EXPORT_COLUMNS[:-len(METRIC_COLUMNS)]]
+    if id_base:
+        columns[0] = f's.id + {int(id_base)} AS id'
+    columns = ', '.join(columns + [f'm.{column}' for column in METRIC_COLUMNS])
+    conditions = ['s.id > ?'] + [f's.{SENTENCE_FILTERS[name]}' for name in filters]
+    sql = f'''
+        SELECT {columns}
+        FROM somali_sentences AS s NOT INDEXED
+        LEFT JOIN quality_metrics AS m
+            ON m.id = (SELECT MAX(id) FROM quality_metrics WHERE sentence_id = s.id)
+        WHERE {' AND '.join(conditions)}
+        ORDER BY s.id LIMIT ?
+    '''
+    return sql, [after_id] + list(filters.values()) + [limit]
+
+def export_chunks(filters: Dict, chunk_size: int = DEFAULT_CHUNK_SIZE, conn: Optional[sqlite3.Connection] = None,
+                  db_path: str = DEFAULT_DB_PATH, id_base: int = 0,
+                  pool: Optional[ConnectionPool] = None) -> Iterator[List[sqlite3.Row]]:
+    """
+    Matching rows in id order, chunk_size at a time
+    
+    Each chunk is its own keyset query, so no read transaction stays open for
+    the length of the export to hold back WAL checkpoints, and memory is
+    bounded by one chunk.
+    """
+    
+    after_id = 0
+    while True:
+        sql, params = chunk_query(filters, after_id, chunk_size, id_base)
+        with (pool or get_pool(db_path)).connection(conn) as chunk_conn:
+            rows = chunk_conn.execute(sql, params).fetchall()
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        after_id = rows[-1]['id'] - id_base
+
+def _jsonl(chunks: Iterator[List[sqlite3.Row]]) -> Iterator[bytes]:
+    for rows in chunks:
+        lines = []
+        for row in rows:
+            record = dict(row)
+            for column in BOOLEAN_COLUMNS:
+                record[column] = bool(record[column])
+            lines.append(json.dumps(record, ensure_ascii=False) + '\n')
+        yield ''.join(lines).encode('utf-8')
+
+def _csv(chunks: Iterator[List[sqlite3.Row]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    
+    if buffer.tell():  # Header of an empty export
+        yield buffer.getvalue().encode('utf-8')
+
+class _ByteSink:
+    """Write-only file for the Arrow writers whose bytes are handed on after every batch"""
+    
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+    
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+    
+    def tell(self) -> int:
+        return self.position
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        self.closed = True
+    
+    def drain(self) -> bytes:
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+def _columnar(chunks: Iterator[List[sqlite3.Row]], fmt: str, compression: Optional[str]) -> Iterator[bytes]:
+    schema = pa.schema([(column, pa.type_for_alias(COLUMN_TYPES[column])) for column in EXPORT_COLUMNS])
+    sink = _ByteSink()
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(sink, schema, compression=compression or 'none')
+    else:
+        writer = pa.ipc.new_stream(sink, schema, options=pa.ipc.IpcWriteOptions(compression=compression))
+    
+    try:
+        for rows in chunks:
+            columns = [list(values) for values in zip(*rows)]
+            for column in BOOLEAN_COLUMNS:
+                index = EXPORT_COLUMNS.index(column)
+                columns[index] = [bool(value) for value in columns[index]]
+            # One Parquet row group / Arrow record batch per chunk
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def _compressed(stream: Iterator[bytes], compression: str) -> Iterator[bytes]:
+    if compression == 'gzip':
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)   # wbits 31: gzip container
+    else:
+        compressor = zstandard.ZstdCompressor().compressobj()
+    
+    for data in stream:
+        compressed = compressor.compress(data)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def check_export(filters: Dict, fmt: str, compression: Optional[str], chunk_size: int):
+    """ValueError for an unknown filter, format or compression, or a codec whose optional package is missing"""
+    
+    unknown = sorted(set(filters) - set(SENTENCE_FILTERS))
+    if unknown:
+        raise ValueError(f"Unknown sentence filter: {', '.join(unknown)}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}. Use one of: {', '.join(FORMATS)}")
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression}. Use one of: {', '.join(COMPRESSIONS)}")
+    if fmt in COLUMNAR_FORMATS and not PYARROW_AVAILABLE:
+        raise ValueError(f"{fmt} export requires pyarrow (pip install pyarrow)")
+    if fmt == 'arrow' and compression == 'gzip':
+        raise ValueError("Arrow streams support zstd compression only")
+    if compression == 'zstd' and fmt not in COLUMNAR_FORMATS and not ZSTD_AVAILABLE:
+        raise ValueError("zstd compression requires zstandard (pip install zstandard)")
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+
+def encode_chunks(chunks: Iterator[List[sqlite3.Row]], fmt: str, compression: Optional[str] = None) -> Iterator[bytes]:
+    """Export file contents of row chunks in EXPORT_COLUMNS order; arguments checked by check_export"""
+    
+    if fmt in COLUMNAR_FORMATS:
+        return _columnar(chunks, fmt, compression)
+    
+    stream = _jsonl(chunks) if fmt == 'jsonl' else _csv(chunks)
+    return _compressed(stream, compression) if compression else stream
+
+def export_stream(filters: Dict, fmt: str = 'jsonl', compression: Optional[str] = None,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE, conn: Optional[sqlite3.Connection] = None,
+                  db_path: str = DEFAULT_DB_PATH) -> Iterator[bytes]:
+    """
+    Export file contents as a stream of byte chunks
+    
+    Args:
+        filters: SENTENCE_FILTERS name -> value, as for the listing API
+        fmt: One of FORMATS
+        compression: None or one of COMPRESSIONS; Parquet and Arrow apply it
+            per column inside the file (Arrow streams support zstd only)
+        chunk_size: Rows per query and per output chunk
+        conn: Connection to read with; a pooled one per chunk if None
+        db_path: Database of the pool when conn is None
+    
+    Raises:
+        ValueError: For an unknown filter, format or compression, or a codec
+            whose optional package is not installed (raised here, before any
+            output is produced)
+    """
+    
+    check_export(filters, fmt, compression, chunk_size)
+    return encode_chunks(export_chunks(filters, chunk_size, conn, db_path), fmt, compression)
+
+def export_filename(fmt: str, compression: Optional[str] = None) -> str:
+    """Download file name of an export"""
+    
+    name = f"somali_sentences.{FORMATS[fmt][0]}"
+    if compression and fmt not in COLUMNAR_FORMATS:
+        name += f".{COMPRESSIONS[compression][0]}"
+    return name
+
+def export_media_type(fmt: str, compression: Optional[str] = None) -> str:
+    """Content type of an export"""
+    
+    if compression and fmt not in COLUMNAR_FORMATS:
+        return COMPRESSIONS[compression][1]
+    return FORMATS[fmt][1]
+
+def main():
+    """Command-line entry point"""
+    
+    parser = argparse.ArgumentParser(description="Export the Somali sentence dataset")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help="SQLite database to export")
+    parser.add_argument('--format', choices=list(FORMATS), default='jsonl')
+    parser.add_argument('--compression', choices=list(COMPRESSIONS))
+    parser.add_argument('--output', help="Output file, '-' for stdout (default: somali_sentences.<format>)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per query and row group")
+    for name in ('dialect', 'source', 'category'):
+        parser.add_argument(f'--{name}')
+    parser.add_argument('--validated', action='store_true', default=None, help="Only validated sentences")
+    parser.add_argument('--scholar-approved', action='store_true', default=None,
+                        help="Only scholar-approved sentences")
+    parser.add_argument('--min-quality', type=float)
+    parser.add_argument('--max-quality', type=float)
+    parser.add_argument('--min-words', type=int)
+    parser.add_argument('--max-words', type=int)
+    parser.add_argument('--created-after', help="ISO date or datetime")
+    parser.add_argument('--created-before', help="ISO date or datetime")
+    args = parser.parse_args()
+    
+    filters = {name: getattr(args, name) for name in SENTENCE_FILTERS if getattr(args, name) is not None}
+    try:
+        for name in ('created_after', 'created_before'):
+            if name in filters:
+                filters[name] = parse_timestamp(filters[name])
+        init_database(args.db)
+        
+        with closing(connect(args.db)) as conn:
+            stream = export_stream(filters, args.format, args.compression, args.chunk_size, conn=conn)
+            output = args.output or export_filename(args.format, args.compression)
+            
+            if output == '-':
+                for data in stream:
+                    sys.stdout.buffer.write(data)
+                sys.stdout.buffer.flush()
+                return
+            
+            written = 0
+            with open(output, 'wb') as f:
+                for data in stream:
+                    f.write(data)
+                    written += len(data)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    print(f"💾 Exported {written:,} bytes to {output}")
+
+if __name__ == "__main__":
+    main()
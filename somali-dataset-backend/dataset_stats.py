@@ -0,0 +1,53 @@
+"""
+Enterprise Dataset Statistics
+Constant-time reads of the trigger-maintained sentence statistics
+"""
+
+import sqlite3
+from typing import Dict, Optional
+
+import queries
+
+TOTAL_COLUMNS = ('sentences', 'validated', 'scholar_approved', 'high_quality', 'top_quality',
+                 'quality_sum', 'quality_count')
+
+def totals(conn: sqlite3.Connection) -> Dict:
+    """Raw corpus-wide counters (TOTAL_COLUMNS), which add up across databases"""
+    
+    row = conn.execute(queries.STATS_SUMMARY).fetchone()
+    if row is None:
+        return dict.fromkeys(TOTAL_COLUMNS, 0)
+    return {column: row[column] for column in TOTAL_COLUMNS}
+
+def summarize(totals: Dict) -> Dict:
+    """Counts and average quality of raw counters"""
+    return {
+        'total_sentences': totals['sentences'],
+        'validated': totals['validated'],
+        'scholar_approved': totals['scholar_approved'],
+        'high_quality': totals['high_quality'],      # quality_score >= 80
+        'top_quality': totals['top_quality'],        # quality_score >= 90
+        'average_quality': totals['quality_sum'] / totals['quality_count'] if totals['quality_count'] else 0
+    }
+
+def summary(conn: sqlite3.Connection) -> Dict:
+    """Corpus-wide counts and average quality"""
+    return summarize(totals(conn))
+
+def breakdown(conn: sqlite3.Connection, dimension: str) -> Dict[Optional[str], int]:
+    """Sentence counts per dialect, source or category (missing values under None)"""
+    return {
+        value if value != '' else None: sentences
+        for value, sentences in conn.execute(queries.STATS_BREAKDOWN, (dimension,))
+    }
+
+def category_count(conn: sqlite3.Connection, category: str) -> int:
+    """Sentences in one category"""
+    
+    row = conn.execute(queries.STATS_CATEGORY, (category,)).fetchone()
+    return row[0] if row else 0
+
+def recent_additions(conn: sqlite3.Connection, hours: int = 24) -> int:
+    """Sentences created in the last hours"""
+    
+    return conn.execute(queries.RECENT_ADDITIONS, (f'-{hours} hours',)).fetchone()[0]
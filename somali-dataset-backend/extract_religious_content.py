@@ -4,35 +4,38 @@ Extract Religious Content from SomaliTalk for $9.99 Market Domination
 Process authentic Somali Islamic content for the dataset
 """
 
-import sqlite3
 import json
 import re
 from datetime import datetime
 from typing import List, Dict
+from lexicon_matcher import lexicon_matcher, WORD
+from database import connect
+from segment_store import open_sentence_writer
+import schema
+import dataset_stats
+
+# Somali function words (matched as whole words)
+SOMALI_WORDS = ['waa', 'wuxuu', 'waxay', 'waxaa', 'oo', 'iyo', 'ah', 'ka', 'ku', 'la']
+
+# Religious stems (matched inside inflected words)
+RELIGIOUS_WORDS = ['allah', 'allaah', 'nabiga', 'scw', 'islaam', 'muslim', 'quraan', 'salaad', 'diinta']
+
+RELIGIOUS_TERMS = [
+    'allah', 'allaah', 'nabiga', 'scw', 'islaam', 'muslim', 'quraan', 'salaad', 'diinta',
+    'ramadaan', 'hajj', 'xaj', 'zakah', 'shahaadah', 'imaan', 'ducada', 'masjid',
+    'jannah', 'naar', 'qiyaamah', 'taqwa', 'sabr', 'shukr', 'tawbah', 'halal', 'haram'
+]
+
+SOMALI_PATTERNS = ['waa', 'wuxuu', 'waxay', 'oo']
+
+lexicon_matcher.add_lexicon('extract.somali_words', SOMALI_WORDS)
+lexicon_matcher.add_lexicon('extract.religious_words', RELIGIOUS_WORDS)
+lexicon_matcher.add_lexicon('extract.religious_terms', RELIGIOUS_TERMS)
+lexicon_matcher.add_lexicon('extract.somali_patterns', SOMALI_PATTERNS)
 
 def init_database():
     """Initialize database for religious content"""
-    conn = sqlite3.connect('somali_dataset.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS somali_sentences (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            text TEXT UNIQUE NOT NULL,
-            translation TEXT,
-            dialect TEXT DEFAULT 'Standard Somali',
-            quality_score REAL DEFAULT 95.0,
-            source TEXT,
-            category TEXT DEFAULT 'religious',
-            validated BOOLEAN DEFAULT TRUE,
-            scholar_approved BOOLEAN DEFAULT TRUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            metadata TEXT
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    schema.init_database()
 
 def process_somalitalk_content():
     """Process the religious content from SomaliTalk"""
@@ -257,26 +260,16 @@ def process_somalitalk_content():
 
 def is_somali_religious(text):
     """Check if text is Somali religious content"""
-    somali_words = ['waa', 'wuxuu', 'waxay', 'waxaa', 'oo', 'iyo', 'ah', 'ka', 'ku', 'la']
-    religious_words = ['allah', 'allaah', 'nabiga', 'scw', 'islaam', 'muslim', 'quraan', 'salaad', 'diinta']
-    
     text_lower = text.lower()
     
-    somali_count = sum(1 for word in somali_words if word in text_lower)
-    religious_count = sum(1 for word in religious_words if word in text_lower)
+    somali_count = lexicon_matcher.count('extract.somali_words', text_lower, WORD)
+    religious_count = lexicon_matcher.count('extract.religious_words', text_lower)
     
     return somali_count >= 2 and religious_count >= 1
 
 def count_religious_terms(text):
     """Count religious terms in text"""
-    religious_terms = [
-        'allah', 'allaah', 'nabiga', 'scw', 'islaam', 'muslim', 'quraan', 'salaad', 'diinta',
-        'ramadaan', 'hajj', 'xaj', 'zakah', 'shahaadah', 'imaan', 'ducada', 'masjid',
-        'jannah', 'naar', 'qiyaamah', 'taqwa', 'sabr', 'shukr', 'tawbah', 'halal', 'haram'
-    ]
-    
-    text_lower = text.lower()
-    return sum(1 for term in religious_terms if term in text_lower)
+    return lexicon_matcher.count('extract.religious_terms', text.lower())
 
 def calculate_quality(text):
     """Calculate quality score for religious content"""
@@ -296,66 +289,50 @@ def calculate_quality(text):
         score += 10
     
     # Somali patterns
-    if any(pattern in text.lower() for pattern in ['waa', 'wuxuu', 'waxay', 'oo']):
+    if lexicon_matcher.count('extract.somali_patterns', text.lower()) > 0:
         score += 15
     
     return min(score, 100)
 
 def save_to_database(sentences):
     """Save sentences to database"""
-    conn = sqlite3.connect('somali_dataset.db')
-    cursor = conn.cursor()
-    
-    success_count = 0
-    
-    for sentence in sentences:
-        try:
-            cursor.execute('''
-                INSERT OR IGNORE INTO somali_sentences 
-                (text, quality_score, source, category, validated, scholar_approved, metadata)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                sentence['text'],
-                sentence['quality_score'],
-                sentence['source'],
-                sentence['category'],
-                True,
-                True,
-                json.dumps(sentence['metadata'])
-            ))
-            
-            if cursor.rowcount > 0:
-                success_count += 1
-                
-        except Exception as e:
-            print(f"Error: {e}")
-            continue
+    conn = connect('somali_dataset.db')
+    
+    columns = ('text', 'quality_score', 'source', 'category', 'validated', 'scholar_approved', 'metadata')
+    with open_sentence_writer(conn, columns) as writer:
+        for sentence in sentences:
+            try:
+                writer.add((
+                    sentence['text'],
+                    sentence['quality_score'],
+                    sentence['source'],
+                    sentence['category'],
+                    True,
+                    True,
+                    json.dumps(sentence['metadata'])
+                ))
+            except (KeyError, TypeError) as e:
+                print(f"Error: {e}")
     
-    conn.commit()
     conn.close()
     
-    return success_count
+    if writer.near_duplicates:
+        print(f"🔁 Skipped {writer.near_duplicates} near-duplicate sentences")
+    return writer.inserted
 
 def get_stats():
     """Get dataset statistics"""
-    conn = sqlite3.connect('somali_dataset.db')
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT COUNT(*) FROM somali_sentences")
-    total = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT AVG(quality_score) FROM somali_sentences")
-    avg_quality = cursor.fetchone()[0] or 0
+    conn = connect('somali_dataset.db')
     
-    cursor.execute("SELECT COUNT(*) FROM somali_sentences WHERE category = 'religious'")
-    religious = cursor.fetchone()[0]
+    stats = dataset_stats.summary(conn)
+    religious = dataset_stats.category_count(conn, 'religious')
     
     conn.close()
     
     return {
-        'total_sentences': total,
+        'total_sentences': stats['total_sentences'],
         'religious_sentences': religious,
-        'average_quality': round(avg_quality, 1)
+        'average_quality': round(stats['average_quality'], 1)
     }
 
 def main():
@@ -0,0 +1,165 @@
+"""
+Compiled Lexicon Matcher
+Multi-pattern term lookup shared by every Somali lexicon in the backend
+"""
+
+import threading
+from typing import Dict, Iterable, List, Set
+
+# Aho-Corasick automaton (install with: pip install pyahocorasick)
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+SUBSTRING = 'substring'
+WORD = 'word'
+MATCH_MODES = (SUBSTRING, WORD)
+
+def _is_word_char(ch: str) -> bool:
+    """Word characters for boundary checks; apostrophes belong to words (hay'adaha)"""
+    return ch.isalnum() or ch == '_' or ch == "'"
+
+def _is_word_match(text: str, start: int, end: int) -> bool:
+    """Check that text[start:end] is not glued to neighbouring word characters"""
+    if start > 0 and _is_word_char(text[start - 1]):
+        return False
+    if end < len(text) and _is_word_char(text[end]):
+        return False
+    return True
+
+class LexiconMatcher:
+    """
+    One compiled automaton over every registered lexicon.
+    
+    Lexicons are registered as named categories of lowercase terms. A single
+    pass over the text returns the hits for every category at once, either as
+    plain substrings (the historical ``term in text`` behaviour) or as whole
+    words / phrases only.
+    """
+    
+    def __init__(self):
+        self._lexicons: Dict[str, List[str]] = {}
+        self._term_index: Dict[str, List[tuple]] = {}
+        self._automaton = None
+        self._terms: List[str] = []
+        self._dirty = True
+        self._lock = threading.Lock()
+        self._last = {}  # mode -> (text, hits) of the most recent scan
+    
+    def add_lexicon(self, category: str, terms: Iterable[str]):
+        """Register (or replace) a category of terms"""
+        
+        terms = [term.lower() for term in terms]
+        with self._lock:
+            if self._lexicons.get(category) == terms:
+                return
+            self._lexicons[category] = terms
+            self._dirty = True
+    
+    def lexicon(self, category: str) -> List[str]:
+        """Return the registered terms of a category"""
+        return list(self._lexicons[category])
+    
+    def compile(self):
+        """Build the automaton from all registered lexicons"""
+        
+        with self._lock:
+            if self._dirty:
+                self._compile_locked()
+    
+    def _compile_locked(self):
+        term_index: Dict[str, List[tuple]] = {}
+        for category, terms in self._lexicons.items():
+            for position, term in enumerate(terms):
+                term_index.setdefault(term, []).append((category, position))
+        
+        automaton = None
+        if AHOCORASICK_AVAILABLE:
+            automaton = ahocorasick.Automaton()
+            for term in term_index:
+                if term:
+                    automaton.add_word(term, term)
+            if len(automaton):
+                automaton.make_automaton()
+            else:
+                automaton = None
+        
+        self._term_index = term_index
+        self._terms = [term for term in term_index if term]
+        self._automaton = automaton
+        self._last = {}
+        self._dirty = False
+    
+    def _found_terms(self, text: str, mode: str) -> Set[str]:
+        """Distinct terms occurring in text"""
+        
+        if self._automaton is not None:
+            found = set()
+            if mode == WORD:
+                for end, term in self._automaton.iter(text):
+                    if term not in found and _is_word_match(text, end - len(term) + 1, end + 1):
+                        found.add(term)
+            else:
+                for _, term in self._automaton.iter(text):
+                    found.add(term)
+            return found
+        
+        # Fallback without the C automaton: one scan per distinct term
+        found = {term for term in self._terms if term in text}
+        if mode == WORD:
+            found = {term for term in found if self._has_word_occurrence(text, term)}
+        return found
+    
+    @staticmethod
+    def _has_word_occurrence(text: str, term: str) -> bool:
+        start = text.find(term)
+        while start != -1:
+            if _is_word_match(text, start, start + len(term)):
+                return True
+            start = text.find(term, start + 1)
+        return False
+    
+    def match(self, text: str, mode: str = SUBSTRING) -> Dict[str, List[str]]:
+        """
+        Find every category hit in a single pass.
+        
+        Args:
+            text: Lowercased text to scan
+            mode: 'substring' or 'word'
+        
+        Returns:
+            Category -> found terms, in lexicon order. Categories without hits
+            are omitted.
+        """
+        
+        if mode not in MATCH_MODES:
+            raise ValueError(f"Unknown match mode: {mode}")
+        
+        if self._dirty:
+            self.compile()
+        
+        last = self._last.get(mode)
+        if last is not None and last[0] == text:
+            return last[1]
+        
+        positioned: Dict[str, List[tuple]] = {}
+        for term in self._found_terms(text, mode):
+            for category, position in self._term_index[term]:
+                positioned.setdefault(category, []).append((position, term))
+        
+        hits = {category: [term for _, term in sorted(found)] for category, found in positioned.items()}
+        self._last[mode] = (text, hits)
+        return hits
+    
+    def find(self, category: str, text: str, mode: str = SUBSTRING) -> List[str]:
+        """Terms of one category found in text"""
+        return list(self.match(text, mode).get(category, ()))
+    
+    def count(self, category: str, text: str, mode: str = SUBSTRING) -> int:
+        """Number of terms of one category found in text"""
+        return len(self.find(category, text, mode))
+
+# Shared matcher; every module registers its lexicons here
+lexicon_matcher = LexiconMatcher()
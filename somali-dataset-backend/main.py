@@ -1,19 +1,55 @@
-from fastapi import FastAPI, HTTPException, Depends, Header
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Optional
+from contextlib import asynccontextmanager
 import sqlite3
 import json
 import re
 from datetime import datetime
 import hashlib
-import secrets
 import uuid
-from enterprise_nlp import nlp_engine
-from data_collection_system import data_collector
-
-app = FastAPI(title="Somali AI Dataset API", version="1.0.0")
+from enterprise_nlp import get_nlp_engine
+from data_collection_system import get_data_collector
+from lexicon_matcher import lexicon_matcher
+from analysis_pool import analysis_pool
+from metrics import metrics, MetricsMiddleware, DB_CALL_SECONDS, BATCH_SIZE
+from database import AsyncDatabase, get_async_db, get_pool, close_pools
+from schema import migrate
+import queries
+import dataset_stats
+from sentence_listing import list_sentences, parse_timestamp, MAX_PAGE_SIZE
+from sentence_search import rank_window_truncated, search_sentences
+from near_duplicates import database_path, get_index
+from segment_store import get_segment_store
+from api_key_cache import KeyInvalidations, api_key_cache
+from usage_ledger import get_usage_ledger
+from usage_rollups import usage_report
+from user_listing import count_users, list_users, plan_summary, stream_users
+from rate_limiter import RateLimitHeadersMiddleware, get_rate_limiter, rate_limit_headers
+from accounts import DEFAULT_REQUESTS_LIMIT, PLAN_LIMITS, generate_api_key, is_admin_key, rotate_api_key
+from dataset_export import export_stream, export_filename, export_media_type
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize the database, analysis workers, rate limiter, usage ledger and key invalidation polling"""
+    
+    init_db()
+    get_rate_limiter()  # Creates the bucket file now rather than on the event loop at the first request
+    analysis_pool.start()
+    get_usage_ledger().start()
+    key_invalidations = KeyInvalidations.from_env(api_key_cache)
+    key_invalidations.start()
+    yield
+    key_invalidations.close()
+    analysis_pool.shutdown()
+    get_usage_ledger().close()
+    close_pools()
+
+app = FastAPI(title="Somali AI Dataset API", version="1.0.0", lifespan=lifespan)
 
 # Enable CORS for frontend
 app.add_middleware(
@@ -24,128 +60,104 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency and counts per route (skipped unless METRICS_ENABLED is set)
+app.add_middleware(MetricsMiddleware, registry=metrics)
+
+# X-RateLimit-* headers on every authenticated response
+app.add_middleware(RateLimitHeadersMiddleware)
+
 # Authentication setup
 security = HTTPBearer()
 
 # Database setup
 def init_db():
-    conn = sqlite3.connect('somali_dataset.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            api_key TEXT UNIQUE NOT NULL,
-            plan TEXT DEFAULT 'free',
-            requests_used INTEGER DEFAULT 0,
-            requests_limit INTEGER DEFAULT 100,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            is_active BOOLEAN DEFAULT TRUE
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS somali_sentences (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            text TEXT UNIQUE NOT NULL,
-            translation TEXT,
-            dialect TEXT,
-            quality_score REAL,
-            source TEXT,
-            validated BOOLEAN DEFAULT FALSE,
-            scholar_approved BOOLEAN DEFAULT FALSE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            metadata TEXT
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS quality_metrics (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            sentence_id INTEGER,
-            accuracy_score REAL,
-            cultural_score REAL,
-            grammar_score REAL,
-            completeness_score REAL,
-            overall_score REAL,
-            validator_notes TEXT,
-            FOREIGN KEY (sentence_id) REFERENCES somali_sentences (id)
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS api_usage (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            endpoint TEXT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
-
-# Initialize database on startup
-init_db()
+    """Create or upgrade the database schema, and open the segment store if there is one"""
+    with get_pool().connection() as conn:
+        migrate(conn)
+    get_segment_store()
 
 # Authentication functions
-def generate_api_key():
-    """Generate a secure API key"""
-    return f"sk_live_{secrets.token_urlsafe(32)}"
+@metrics.timed(DB_CALL_SECONDS, 'verify_api_key')
+def load_api_key_user(api_key: str, conn: Optional[sqlite3.Connection] = None) -> Optional[Dict]:
+    """Active user of an API key from the database (None if there is none), cached for the next requests"""
+    
+    generation = api_key_cache.generation
+    ledger = get_usage_ledger()
+    with get_pool().connection(conn) as conn:
+        while True:
+            flushed = ledger.generation
+            user = conn.execute(queries.VERIFY_API_KEY, (api_key,)).fetchone()
+            pending = ledger.pending(user[0]) if user else 0
+            if ledger.generation == flushed:
+                break   # No flush moved requests out of pending() between the two reads
+    
+    if user:
+        user_id, email, plan, requests_used, requests_limit, is_active = user
+        user = {
+            "user_id": user_id,
+            "email": email,
+            "plan": plan,
+            # Requests this process has counted but not yet flushed
+            "requests_used": requests_used + pending,
+            "requests_limit": requests_limit
+        }
+    api_key_cache.put(api_key, user, generation)
+    return user
 
-def verify_api_key(api_key: str):
-    """Verify API key and return user info"""
-    conn = sqlite3.connect('somali_dataset.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT id, email, plan, requests_used, requests_limit, is_active 
-        FROM users WHERE api_key = ? AND is_active = 1
-    ''', (api_key,))
-    
-    user = cursor.fetchone()
-    conn.close()
+def authorize_user(user: Optional[Dict]) -> Dict:
+    """The user of a request, if its key is valid and within quota"""
     
     if not user:
         raise HTTPException(status_code=401, detail="Invalid API key")
-    
-    user_id, email, plan, requests_used, requests_limit, is_active = user
-    
-    if requests_used >= requests_limit:
+    if user["requests_used"] >= user["requests_limit"]:
         raise HTTPException(status_code=429, detail="API rate limit exceeded")
-    
-    return {
-        "user_id": user_id,
-        "email": email,
-        "plan": plan,
-        "requests_used": requests_used,
-        "requests_limit": requests_limit
-    }
-
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Dependency to get current authenticated user"""
-    return verify_api_key(credentials.credentials)
-
-def track_api_usage(user_id: int, endpoint: str):
-    """Track API usage for billing"""
-    conn = sqlite3.connect('somali_dataset.db')
-    cursor = conn.cursor()
-    
-    # Log the usage
-    cursor.execute('''
-        INSERT INTO api_usage (user_id, endpoint) VALUES (?, ?)
-    ''', (user_id, endpoint))
-    
-    # Increment user's request count
-    cursor.execute('''
-        UPDATE users SET requests_used = requests_used + 1 WHERE id = ?
-    ''', (user_id,))
-    
-    conn.commit()
-    conn.close()
+    return user
+
+async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security),
+                           db: AsyncDatabase = Depends(get_async_db)):
+    """Dependency to get current authenticated user, within quota and within their plan's request rate"""
+    
+    # Cached keys (valid or not) are answered on the event loop, without a database call
+    hit, user = api_key_cache.get(credentials.credentials)
+    if not hit:
+        user = await db.run(load_api_key_user, credentials.credentials)
+    user = authorize_user(user)
+    
+    # Spending this worker's lease of tokens needs no I/O; renewing it reads the shared bucket file
+    limiter = get_rate_limiter()
+    decision = limiter.acquire(user["user_id"], user["plan"], local_only=True)
+    if decision is None:
+        decision = await run_in_threadpool(limiter.acquire, user["user_id"], user["plan"])
+    request.state.rate_limit = decision
+    if not decision["allowed"]:
+        raise HTTPException(status_code=429, detail=f"Too many requests, retry in {decision['retry_after']}s",
+                            headers=rate_limit_headers(decision))
+    return user
+
+async def track_api_usage(user: Dict, endpoint: str, requests: int = 1,
+                          detail: str = "API rate limit exceeded"):
+    """
+    Count requests against the user's quota and bill them (written behind by the usage ledger)
+    
+    The quota check and the count are one atomic step on the cached record,
+    so concurrent requests cannot overdraw the quota. With USAGE_JOURNAL_FSYNC
+    the journal write waits for the disk, so it runs off the event loop.
+    
+    Raises:
+        HTTPException: 429 if the requests would exceed the user's quota
+    """
+    
+    counted = api_key_cache.consume(user["user_id"], requests, user["requests_limit"])
+    if counted is None:
+        # Not cached (API_KEY_CACHE_TTL_SECONDS=0): check the record loaded for this request
+        counted = user["requests_used"] + requests <= user["requests_limit"]
+    if not counted:
+        raise HTTPException(status_code=429, detail=detail)
+    ledger = get_usage_ledger()
+    if ledger.fsync:
+        await run_in_threadpool(ledger.record, user["user_id"], endpoint, requests)
+    else:
+        ledger.record(user["user_id"], endpoint, requests)
 
 # Pydantic models
 class UserSignup(BaseModel):
@@ -166,9 +178,15 @@ class SomaliSentence(BaseModel):
 class QualityAnalysis(BaseModel):
     text: str
 
+class EnterpriseAnalysisRequest(QualityAnalysis):
+    components: Optional[List[str]] = None
+    fields: Optional[List[str]] = None
+
 class BulkAnalysis(BaseModel):
     texts: List[str]
     include_enterprise: bool = True
+    components: Optional[List[str]] = None
+    fields: Optional[List[str]] = None
 
 class DataCollection(BaseModel):
     texts: List[str]
@@ -217,17 +235,18 @@ def calculate_quality_score(text: str) -> Dict:
         "character_count": len(text)
     }
 
+# Simple dialect detection based on common patterns
+lexicon_matcher.add_lexicon('api.northern_indicators', ['waa', 'baa', 'ayaa', 'oo', 'iyo'])
+lexicon_matcher.add_lexicon('api.southern_indicators', ['ka', 'ku', 'la', 'ah', 'uu'])
+lexicon_matcher.add_lexicon('api.central_indicators', ['si', 'ugu', 'kala', 'soo', 'aan'])
+
 def detect_dialect(text: str) -> Dict:
     """Detect Somali dialect from text patterns"""
     
-    # Simple dialect detection based on common patterns
-    northern_indicators = ['waa', 'baa', 'ayaa', 'oo', 'iyo']
-    southern_indicators = ['ka', 'ku', 'la', 'ah', 'uu']
-    central_indicators = ['si', 'ugu', 'kala', 'soo', 'aan']
-    
-    northern_count = sum(1 for word in northern_indicators if word in text.lower())
-    southern_count = sum(1 for word in southern_indicators if word in text.lower())
-    central_count = sum(1 for word in central_indicators if word in text.lower())
+    hits = lexicon_matcher.match(text.lower())
+    northern_count = len(hits.get('api.northern_indicators', ()))
+    southern_count = len(hits.get('api.southern_indicators', ()))
+    central_count = len(hits.get('api.central_indicators', ()))
     
     total_indicators = northern_count + southern_count + central_count
     
@@ -244,67 +263,66 @@ def detect_dialect(text: str) -> Dict:
         confidence = (central_count / total_indicators) * 100
         return {"dialect": "Central Somali", "confidence": round(confidence, 1)}
 
+def validate_analysis_selection(components: Optional[List[str]], fields: Optional[List[str]]):
+    """Reject unknown enterprise analysis components before any work is done"""
+    
+    try:
+        get_nlp_engine().resolve_components(components, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # API Endpoints
 @app.get("/")
 def read_root():
     return {"message": "Somali AI Dataset API", "status": "active", "version": "1.0.0"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus scrape endpoint (enable with METRICS_ENABLED=1)"""
+    
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/signup")
-async def signup_user(user: UserSignup):
+async def signup_user(user: UserSignup, db: AsyncDatabase = Depends(get_async_db)):
     """Sign up a new user and get API key"""
     
     api_key = generate_api_key()
     password_hash = hashlib.sha256(user.password.encode()).hexdigest()
     
-    # Set limits based on plan
-    limits = {
-        "free": 100,
-        "basic": 1000,
-        "premium": 10000,
-        "enterprise": 100000,
-        "enterprise_plus": 1000000
-    }
-    
-    conn = sqlite3.connect('somali_dataset.db')
-    cursor = conn.cursor()
+    requests_limit = PLAN_LIMITS.get(user.plan, DEFAULT_REQUESTS_LIMIT)
     
-    try:
-        cursor.execute('''
+    def insert_user(conn):
+        cursor = conn.execute('''
             INSERT INTO users (email, password, api_key, plan, requests_limit)
             VALUES (?, ?, ?, ?, ?)
-        ''', (user.email, password_hash, api_key, user.plan, limits.get(user.plan, 100)))
-        
+        ''', (user.email, password_hash, api_key, user.plan, requests_limit))
         conn.commit()
+        return cursor.lastrowid
+    
+    try:
+        user_id = await db.run(insert_user)
         
         return {
             "message": "User created successfully",
             "api_key": api_key,
             "plan": user.plan,
-            "requests_limit": limits.get(user.plan, 100),
-            "user_id": cursor.lastrowid
+            "requests_limit": requests_limit,
+            "user_id": user_id
         }
-        
+    
     except sqlite3.IntegrityError:
         raise HTTPException(status_code=400, detail="Email already registered")
-    finally:
-        conn.close()
 
 @app.post("/login")
-async def login_user(user: UserLogin):
+async def login_user(user: UserLogin, db: AsyncDatabase = Depends(get_async_db)):
     """Login existing user"""
     
     password_hash = hashlib.sha256(user.password.encode()).hexdigest()
     
-    conn = sqlite3.connect('somali_dataset.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT id, email, api_key, plan, requests_used, requests_limit, is_active
-        FROM users WHERE email = ? AND password = ? AND is_active = 1
-    ''', (user.email, password_hash))
-    
-    user_data = cursor.fetchone()
-    conn.close()
+    user_data = await db.fetchone(queries.LOGIN_USER, (user.email, password_hash))
     
     if not user_data:
         raise HTTPException(status_code=401, detail="Invalid email or password")
@@ -321,37 +339,98 @@ async def login_user(user: UserLogin):
         "requests_limit": requests_limit
     }
 
-@app.get("/admin/users")
-async def get_all_users():
-    """Admin endpoint to see all users"""
+@app.post("/keys/rotate")
+async def rotate_key(current_user: dict = Depends(get_current_user), db: AsyncDatabase = Depends(get_async_db)):
+    """Replace the caller's API key; the current key stops working immediately"""
+    
+    api_key = await db.run(rotate_api_key, current_user["user_id"])
+    if api_key is None:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    
+    return {
+        "message": "API key rotated",
+        "api_key": api_key
+    }
+
+@app.get("/usage")
+async def get_usage(granularity: str = "day", start: Optional[str] = None, end: Optional[str] = None,
+                    endpoint: Optional[str] = None, current_user: dict = Depends(get_current_user),
+                    db: AsyncDatabase = Depends(get_async_db)):
+    """
+    The caller's requests per UTC hour or day and per endpoint, from the usage rollups
+    
+    Requests from the last flush interval are reported in pending_requests until they are written.
+    """
+    
+    try:
+        report = await db.run(usage_report, current_user["user_id"], granularity, start, end, endpoint)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        **report,
+        "pending_requests": get_usage_ledger().pending(current_user["user_id"]),
+        "requests_used": current_user["requests_used"],
+        "requests_limit": current_user["requests_limit"]
+    }
+
+def require_admin(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Dependency admitting only requests that bear ADMIN_API_KEY"""
     
-    conn = sqlite3.connect('somali_dataset.db')
-    cursor = conn.cursor()
+    if not is_admin_key(credentials.credentials):
+        raise HTTPException(status_code=403, detail="Admin API key required")
+
+@app.get("/admin/users", dependencies=[Depends(require_admin)])
+async def get_all_users(plan: Optional[str] = None, is_active: Optional[bool] = None,
+                        min_usage: Optional[float] = Query(None, ge=0), max_usage: Optional[float] = Query(None, ge=0),
+                        created_after: Optional[str] = None, created_before: Optional[str] = None,
+                        cursor: Optional[str] = None, limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+                        format: str = "json", db: AsyncDatabase = Depends(get_async_db)):
+    """
+    Admin endpoint to see users, newest first
     
-    cursor.execute('''
-        SELECT id, email, plan, requests_used, requests_limit, created_at, is_active
-        FROM users ORDER BY created_at DESC
-    ''')
+    Filters by plan, activity, usage ratio (requests_used / requests_limit,
+    e.g. min_usage=0.8) and creation time. format=json returns one keyset
+    page (follow next_cursor), with the number of matching users on the
+    first page; format=ndjson streams every matching user.
+    """
     
-    users = cursor.fetchall()
-    conn.close()
+    filters = {
+        "plan": plan,
+        "is_active": is_active,
+        "min_usage": min_usage,
+        "max_usage": max_usage,
+        "created_after": created_after,
+        "created_before": created_before
+    }
+    filters = {name: value for name, value in filters.items() if value is not None}
     
+    try:
+        for name in ("created_after", "created_before"):
+            if name in filters:
+                filters[name] = parse_timestamp(filters[name])
+        if format == "ndjson":
+            # Starlette iterates the stream in its threadpool; each chunk borrows a pooled connection there
+            return StreamingResponse(stream_users(filters), media_type="application/x-ndjson")
+        if format != "json":
+            raise ValueError(f"Invalid format: {format}. Use json or ndjson")
+        users, next_cursor = await db.run(list_users, filters=filters, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Counted once per listing; later pages carry None
+    total_users = await db.run(count_users, filters=filters) if cursor is None else None
     return {
-        "total_users": len(users),
-        "users": [
-            {
-                "id": u[0],
-                "email": u[1],
-                "plan": u[2],
-                "requests_used": u[3],
-                "requests_limit": u[4],
-                "created_at": u[5],
-                "is_active": bool(u[6])
-            }
-            for u in users
-        ]
+        "total_users": total_users,
+        "users": users,
+        "next_cursor": next_cursor
     }
 
+@app.get("/admin/users/summary", dependencies=[Depends(require_admin)])
+async def get_users_summary(db: AsyncDatabase = Depends(get_async_db)):
+    """User, active user and request counts overall and per plan, without reading the users table"""
+    return await db.run(plan_summary)
+
 @app.post("/analyze")
 async def analyze_text(analysis: QualityAnalysis, current_user: dict = Depends(get_current_user)):
     """Analyze Somali text for quality and dialect"""
@@ -360,7 +439,7 @@ async def analyze_text(analysis: QualityAnalysis, current_user: dict = Depends(g
         raise HTTPException(status_code=400, detail="Text cannot be empty")
     
     # Track API usage
-    track_api_usage(current_user["user_id"], "/analyze")
+    await track_api_usage(current_user, "/analyze")
     
     quality_metrics = calculate_quality_score(analysis.text)
     dialect_info = detect_dialect(analysis.text)
@@ -376,7 +455,7 @@ async def analyze_text(analysis: QualityAnalysis, current_user: dict = Depends(g
     }
 
 @app.post("/analyze/enterprise")
-async def analyze_text_enterprise(analysis: QualityAnalysis, current_user: dict = Depends(get_current_user)):
+async def analyze_text_enterprise(analysis: EnterpriseAnalysisRequest, current_user: dict = Depends(get_current_user)):
     """Enterprise-grade comprehensive Somali text analysis"""
     
     if not analysis.text.strip():
@@ -386,11 +465,15 @@ async def analyze_text_enterprise(analysis: QualityAnalysis, current_user: dict
     if current_user["plan"] not in ["premium", "enterprise"]:
         raise HTTPException(status_code=403, detail="Enterprise analysis requires Premium or Enterprise plan")
     
+    validate_analysis_selection(analysis.components, analysis.fields)
+    
     # Track API usage
-    track_api_usage(current_user["user_id"], "/analyze/enterprise")
+    await track_api_usage(current_user, "/analyze/enterprise")
     
-    # Use enterprise NLP engine
-    enterprise_analysis = nlp_engine.analyze_text_enterprise(analysis.text)
+    # Use enterprise NLP engine, computing only the selected components
+    enterprise_analysis = get_nlp_engine().analyze_text_enterprise(
+        analysis.text, components=analysis.components, fields=analysis.fields
+    )
     
     return {
         "text": analysis.text,
@@ -416,13 +499,29 @@ async def analyze_bulk_texts(bulk_analysis: BulkAnalysis, current_user: dict = D
     if current_user["plan"] not in ["premium", "enterprise"]:
         raise HTTPException(status_code=403, detail="Bulk analysis requires Premium or Enterprise plan")
     
-    # Check if user has enough requests remaining
-    requests_needed = len(bulk_analysis.texts)
-    if current_user["requests_used"] + requests_needed > current_user["requests_limit"]:
-        raise HTTPException(status_code=429, detail="Insufficient requests remaining for bulk analysis")
+    if bulk_analysis.include_enterprise:
+        validate_analysis_selection(bulk_analysis.components, bulk_analysis.fields)
+    
+    # Take every text from the quota before analyzing, so concurrent bulk requests cannot overdraw it
+    await track_api_usage(current_user, "/analyze/bulk", requests=len(bulk_analysis.texts),
+                          detail="Insufficient requests remaining for bulk analysis")
+    
+    BATCH_SIZE.observe(len(bulk_analysis.texts), "/analyze/bulk")
     
     results = []
     
+    # Enterprise analysis runs as one batch over the non-empty texts
+    enterprise_analyses = {}
+    if bulk_analysis.include_enterprise:
+        indexes = [i for i, text in enumerate(bulk_analysis.texts) if text.strip()]
+        batch = await analysis_pool.analyze_batch_async(
+            [bulk_analysis.texts[i] for i in indexes],
+            return_exceptions=True,
+            components=bulk_analysis.components,
+            fields=bulk_analysis.fields
+        )
+        enterprise_analyses = dict(zip(indexes, batch))
+    
     for i, text in enumerate(bulk_analysis.texts):
         if not text.strip():
             results.append({
@@ -435,7 +534,9 @@ async def analyze_bulk_texts(bulk_analysis: BulkAnalysis, current_user: dict = D
         
         try:
             if bulk_analysis.include_enterprise:
-                analysis = nlp_engine.analyze_text_enterprise(text)
+                analysis = enterprise_analyses[i]
+                if isinstance(analysis, Exception):
+                    raise analysis
                 result = {
                     "index": i,
                     "text": text,
@@ -456,7 +557,7 @@ async def analyze_bulk_texts(bulk_analysis: BulkAnalysis, current_user: dict = D
                 }
             
             results.append(result)
-            
+        
         except Exception as e:
             results.append({
                 "index": i,
@@ -465,10 +566,6 @@ async def analyze_bulk_texts(bulk_analysis: BulkAnalysis, current_user: dict = D
                 "status": "failed"
             })
     
-    # Track API usage for all processed texts
-    for _ in bulk_analysis.texts:
-        track_api_usage(current_user["user_id"], "/analyze/bulk")
-    
     return {
         "bulk_analysis_results": results,
         "total_texts": len(bulk_analysis.texts),
@@ -480,18 +577,27 @@ async def analyze_bulk_texts(bulk_analysis: BulkAnalysis, current_user: dict = D
     }
 
 @app.post("/sentences")
-async def add_sentence(sentence: SomaliSentence):
+async def add_sentence(sentence: SomaliSentence, db: AsyncDatabase = Depends(get_async_db)):
     """Add a new Somali sentence to the dataset"""
     
     # Calculate quality score
     quality_metrics = calculate_quality_score(sentence.text)
     dialect_info = detect_dialect(sentence.text)
     
-    conn = sqlite3.connect('somali_dataset.db')
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute('''
+    def insert_sentence(conn):
+        index = get_index(database_path(conn))
+        if index is not None:
+            sigs, matches = index.match(conn, [sentence.text])
+            match = matches[0]
+            if match is not None:
+                index.record([(match['sentence_id'], None, sentence.text, match['similarity'], sentence.source)])
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Sentence is a near-duplicate of sentence {match['sentence_id']} "
+                           f"(similarity {match['similarity']:.2f})"
+                )
+        
+        cursor = conn.execute('''
             INSERT INTO somali_sentences 
             (text, translation, dialect, quality_score, source, metadata)
             VALUES (?, ?, ?, ?, ?, ?)
@@ -507,7 +613,7 @@ async def add_sentence(sentence: SomaliSentence):
         sentence_id = cursor.lastrowid
         
         # Add quality metrics
-        cursor.execute('''
+        conn.execute('''
             INSERT INTO quality_metrics
             (sentence_id, accuracy_score, cultural_score, grammar_score, 
              completeness_score, overall_score)
@@ -522,6 +628,16 @@ async def add_sentence(sentence: SomaliSentence):
         ))
         
         conn.commit()
+        if index is not None and sigs[0] is not None:
+            index.add([(sentence_id, sigs[0])])
+        return sentence_id
+    
+    try:
+        store = get_segment_store()
+        if store is None:
+            sentence_id = await db.run(insert_sentence)
+        else:
+            sentence_id = await run_in_threadpool(store.insert, sentence.source, sentence.text, insert_sentence)
         
         return {
             "id": sentence_id,
@@ -529,127 +645,220 @@ async def add_sentence(sentence: SomaliSentence):
             "quality_score": quality_metrics["overall_score"],
             "dialect": dialect_info["dialect"]
         }
-        
+    
     except sqlite3.IntegrityError:
         raise HTTPException(status_code=400, detail="Sentence already exists")
-    finally:
-        conn.close()
 
-@app.get("/sentences")
-async def get_sentences(limit: int = 10, validated: Optional[bool] = None):
-    """Get sentences from the dataset"""
-    
-    conn = sqlite3.connect('somali_dataset.db')
-    cursor = conn.cursor()
+def sentence_filters(validated: Optional[bool] = None, scholar_approved: Optional[bool] = None,
+                     dialect: Optional[str] = None, source: Optional[str] = None, category: Optional[str] = None,
+                     min_quality: Optional[float] = None, max_quality: Optional[float] = None,
+                     min_words: Optional[int] = None, max_words: Optional[int] = None,
+                     created_after: Optional[str] = None, created_before: Optional[str] = None) -> Dict:
+    """Sentence filters shared by /sentences and /export; only the ones given"""
+    
+    filters = {
+        "dialect": dialect,
+        "source": source,
+        "category": category,
+        "validated": validated,
+        "scholar_approved": scholar_approved,
+        "min_quality": min_quality,
+        "max_quality": max_quality,
+        "min_words": min_words,
+        "max_words": max_words,
+        "created_after": created_after,
+        "created_before": created_before
+    }
+    filters = {name: value for name, value in filters.items() if value is not None}
     
-    query = "SELECT * FROM somali_sentences"
-    params = []
+    try:
+        for name in ("created_after", "created_before"):
+            if name in filters:
+                filters[name] = parse_timestamp(filters[name])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    if validated is not None:
-        query += " WHERE validated = ?"
-        params.append(validated)
+    return filters
+
+@app.get("/sentences")
+async def get_sentences(limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE), sort: str = "quality",
+                        cursor: Optional[str] = None, filters: Dict = Depends(sentence_filters),
+                        db: AsyncDatabase = Depends(get_async_db)):
+    """
+    Get sentences from the dataset, one keyset page at a time
     
-    query += " ORDER BY quality_score DESC LIMIT ?"
-    params.append(limit)
+    Pass the returned next_cursor to get the following page; sort is
+    'quality' (best first) or 'id' (insertion order).
+    """
     
-    cursor.execute(query, params)
-    sentences = cursor.fetchall()
+    store = get_segment_store()
+    try:
+        sentences, next_cursor = await db.run(store.list_sentences if store else list_sentences,
+                                              filters=filters, sort=sort, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    conn.close()
+    return {
+        "sentences": sentences,
+        "next_cursor": next_cursor
+    }
+
+@app.get("/sentences/search")
+async def search_sentences_endpoint(q: str, limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE), sort: str = "rank",
+                                    cursor: Optional[str] = None, rank_window: Optional[int] = Query(None, ge=1),
+                                    filters: Dict = Depends(sentence_filters),
+                                    db: AsyncDatabase = Depends(get_async_db)):
+    """
+    Full-text search of the dataset, best matches first
+    
+    q uses FTS5 query syntax: words, "quoted phrases", prefix* terms and
+    AND / OR / NOT. Every result carries an HTML-escaped snippet with the
+    matches in <mark>; sort is 'rank' (BM25 relevance over every match) or
+    'newest'. rank_window ranks only the newest rank_window matches, faster
+    for broad queries; ranked_window is set when that left matches out.
+    Takes the same filters as /sentences. With segmented storage every
+    segment is searched and the matches merged.
+    """
+    
+    store = get_segment_store()
+    try:
+        results, next_cursor = await db.run(store.search_sentences if store else search_sentences, query=q,
+                                            filters=filters, sort=sort, cursor=cursor, limit=limit,
+                                            rank_window=rank_window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    ranked_window = None
+    if sort == "rank" and rank_window is not None:
+        if await db.run(store.rank_window_truncated if store else rank_window_truncated, query=q,
+                        filters=filters, rank_window=rank_window):
+            ranked_window = rank_window
     
     return {
-        "sentences": [
-            {
-                "id": s[0],
-                "text": s[1],
-                "translation": s[2],
-                "dialect": s[3],
-                "quality_score": s[4],
-                "source": s[5],
-                "validated": bool(s[6]),
-                "scholar_approved": bool(s[7]),
-                "created_at": s[8]
-            }
-            for s in sentences
-        ]
+        "query": q,
+        "results": results,
+        "next_cursor": next_cursor,
+        "ranked_window": ranked_window
     }
 
-@app.get("/stats")
-async def get_dataset_stats():
-    """Get dataset statistics"""
+@app.get("/dedupe/report")
+async def dedupe_report(limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE), current_user: dict = Depends(get_current_user),
+                        db: AsyncDatabase = Depends(get_async_db)):
+    """
+    Largest clusters of near-duplicate sentences
+    
+    Each cluster is a stored sentence with the number of texts rejected (or,
+    after a rebuild, found stored) as its near-duplicates and the most similar
+    of them. With segmented storage the clusters of every segment are merged.
+    """
+    
+    def read_report(conn, limit):
+        index = get_index(database_path(conn))
+        return index.clusters(conn, limit) if index is not None else None
+    
+    store = get_segment_store()
+    report = await db.run(store.near_duplicate_report if store else read_report, limit=limit)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Near-duplicate detection is turned off")
+    
+    await track_api_usage(current_user, "/dedupe/report")
     
-    conn = sqlite3.connect('somali_dataset.db')
-    cursor = conn.cursor()
+    return report
+
+@app.get("/export")
+async def export_dataset(format: str = "jsonl", compression: Optional[str] = None,
+                         filters: Dict = Depends(sentence_filters), current_user: dict = Depends(get_current_user)):
+    """
+    Stream the whole (filtered) dataset with its quality metrics
+    
+    format is jsonl, csv, parquet or arrow; compression is gzip or zstd.
+    Rows are read and sent a chunk at a time, so exports of any size start
+    immediately and use constant memory.
+    """
     
-    # Total sentences
-    cursor.execute("SELECT COUNT(*) FROM somali_sentences")
-    total = cursor.fetchone()[0]
+    # Only allow exports for premium/enterprise users
+    if current_user["plan"] not in ["premium", "enterprise", "enterprise_plus"]:
+        raise HTTPException(status_code=403, detail="Dataset export requires Premium or Enterprise plan")
     
-    # Validated sentences
-    cursor.execute("SELECT COUNT(*) FROM somali_sentences WHERE validated = 1")
-    validated = cursor.fetchone()[0]
+    try:
+        # Starlette iterates the stream in its threadpool; each chunk borrows a pooled connection there
+        store = get_segment_store()
+        stream = (store.export_stream if store else export_stream)(filters, format, compression)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Scholar approved
-    cursor.execute("SELECT COUNT(*) FROM somali_sentences WHERE scholar_approved = 1")
-    scholar_approved = cursor.fetchone()[0]
+    await track_api_usage(current_user, "/export")
     
-    # Average quality
-    cursor.execute("SELECT AVG(quality_score) FROM somali_sentences")
-    avg_quality = cursor.fetchone()[0] or 0
+    return StreamingResponse(
+        stream,
+        media_type=export_media_type(format, compression),
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(format, compression)}"'}
+    )
+
+@app.get("/stats")
+async def get_dataset_stats(db: AsyncDatabase = Depends(get_async_db)):
+    """Get dataset statistics"""
     
-    # Dialect distribution
-    cursor.execute("SELECT dialect, COUNT(*) FROM somali_sentences GROUP BY dialect")
-    dialects = dict(cursor.fetchall())
+    def read_stats(conn):
+        store = get_segment_store()
+        if store is not None:
+            return store.summary(conn), store.breakdown('dialect', conn)
+        return dataset_stats.summary(conn), dataset_stats.breakdown(conn, 'dialect')
     
-    conn.close()
+    # Trigger-maintained counters: constant time regardless of corpus size
+    stats, dialects = await db.run(read_stats)
     
     return {
-        "total_sentences": total,
-        "validated_sentences": validated,
-        "scholar_approved": scholar_approved,
-        "average_quality": round(avg_quality, 1),
+        "total_sentences": stats["total_sentences"],
+        "validated_sentences": stats["validated"],
+        "scholar_approved": stats["scholar_approved"],
+        "average_quality": round(stats["average_quality"], 1),
         "dialects": dialects,
         "last_updated": datetime.now().isoformat()
     }
 
 @app.put("/sentences/{sentence_id}/validate")
-async def validate_sentence(sentence_id: int, scholar_approved: bool = False):
+async def validate_sentence(sentence_id: int, scholar_approved: bool = False, db: AsyncDatabase = Depends(get_async_db)):
     """Validate a sentence (mark as reviewed)"""
     
-    conn = sqlite3.connect('somali_dataset.db')
-    cursor = conn.cursor()
+    def mark_validated(row_id, conn):
+        cursor = conn.execute('''
+            UPDATE somali_sentences 
+            SET validated = 1, scholar_approved = ?
+            WHERE id = ?
+        ''', (scholar_approved, row_id))
+        conn.commit()
+        return cursor.rowcount
     
-    cursor.execute('''
-        UPDATE somali_sentences 
-        SET validated = 1, scholar_approved = ?
-        WHERE id = ?
-    ''', (scholar_approved, sentence_id))
+    store = get_segment_store()
+    if store is None:
+        updated = await db.run(mark_validated, sentence_id)
+    else:
+        updated = await run_in_threadpool(store.run, sentence_id, mark_validated)
     
-    if cursor.rowcount == 0:
-        conn.close()
+    if not updated:
         raise HTTPException(status_code=404, detail="Sentence not found")
     
-    conn.commit()
-    conn.close()
-    
     return {"message": "Sentence validated successfully"}
 
 @app.delete("/sentences/{sentence_id}")
-async def delete_sentence(sentence_id: int):
+async def delete_sentence(sentence_id: int, db: AsyncDatabase = Depends(get_async_db)):
     """Delete a sentence from the dataset"""
     
-    conn = sqlite3.connect('somali_dataset.db')
-    cursor = conn.cursor()
+    def delete(conn):
+        cursor = conn.execute("DELETE FROM somali_sentences WHERE id = ?", (sentence_id,))
+        conn.commit()
+        return cursor.rowcount
     
-    cursor.execute("DELETE FROM somali_sentences WHERE id = ?", (sentence_id,))
+    store = get_segment_store()
+    if store is None:
+        deleted = await db.run(delete)
+    else:
+        deleted = await run_in_threadpool(store.delete, sentence_id)
     
-    if cursor.rowcount == 0:
-        conn.close()
+    if not deleted:
         raise HTTPException(status_code=404, detail="Sentence not found")
     
-    conn.commit()
-    conn.close()
-    
     return {"message": "Sentence deleted successfully"}
 
 @app.post("/data/collect")
@@ -667,10 +876,13 @@ async def collect_data(data_collection: DataCollection, current_user: dict = Dep
         raise HTTPException(status_code=400, detail="Maximum 10,000 texts per collection request")
     
     # Track API usage
-    track_api_usage(current_user["user_id"], "/data/collect")
+    await track_api_usage(current_user, "/data/collect")
+    BATCH_SIZE.observe(len(data_collection.texts), "/data/collect")
     
-    # Collect and validate data
-    collection_result = data_collector.collect_from_text_sources(data_collection.texts)
+    # Collect and validate data (analysis on the process pool; the collector borrows a connection only to save)
+    collection_result = await run_in_threadpool(
+        get_data_collector().collect_from_text_sources, data_collection.texts, analyzer=analysis_pool
+    )
     
     return {
         "collection_result": collection_result,
@@ -691,10 +903,13 @@ async def generate_sample_data(data_generation: DataGeneration, current_user: di
         raise HTTPException(status_code=400, detail="Maximum 50,000 sentences per generation")
     
     # Track API usage
-    track_api_usage(current_user["user_id"], "/data/generate")
+    await track_api_usage(current_user, "/data/generate")
+    BATCH_SIZE.observe(data_generation.count, "/data/generate")
     
     # Generate sample data
-    generation_result = data_collector.generate_sample_data(data_generation.count)
+    generation_result = await run_in_threadpool(
+        get_data_collector().generate_sample_data, data_generation.count, analyzer=analysis_pool
+    )
     
     return {
         "generation_result": generation_result,
@@ -704,14 +919,15 @@ async def generate_sample_data(data_generation: DataGeneration, current_user: di
     }
 
 @app.get("/data/stats")
-async def get_collection_stats(current_user: dict = Depends(get_current_user)):
+async def get_collection_stats(current_user: dict = Depends(get_current_user),
+                               db: AsyncDatabase = Depends(get_async_db)):
     """Get comprehensive data collection statistics"""
     
     # Track API usage
-    track_api_usage(current_user["user_id"], "/data/stats")
+    await track_api_usage(current_user, "/data/stats")
     
     # Get collection statistics
-    stats = data_collector.get_collection_stats()
+    stats = await db.run(get_data_collector().get_collection_stats)
     
     return {
         "collection_stats": stats,
@@ -734,10 +950,14 @@ async def validate_bulk_sentences(data_collection: DataCollection, current_user:
         raise HTTPException(status_code=400, detail="Maximum 5,000 texts per validation request")
     
     # Track API usage
-    track_api_usage(current_user["user_id"], "/data/validate")
+    await track_api_usage(current_user, "/data/validate")
+    BATCH_SIZE.observe(len(data_collection.texts), "/data/validate")
     
     # Validate sentences
-    validation_result = data_collector.bulk_validate_sentences(data_collection.texts, current_user["user_id"])
+    validation_result = await run_in_threadpool(
+        get_data_collector().bulk_validate_sentences, data_collection.texts, current_user["user_id"],
+        analyzer=analysis_pool
+    )
     
     return {
         "validation_result": validation_result,
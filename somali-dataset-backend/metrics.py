@@ -0,0 +1,273 @@
+"""
+Enterprise Metrics
+Latency histograms and counters for the API, exported in Prometheus text format
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Seconds; fine-grained at the low end where analyzers and SQLite calls live
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names: Iterable[str], values: Iterable) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """Cumulative-bucket latency/size histogram with labels"""
+    
+    def __init__(self, registry: 'MetricsRegistry', name: str, help_text: str,
+                 labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, *labels):
+        """Record one observation (no-op while metrics are disabled)"""
+        
+        if not self.registry.enabled:
+            return
+        
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+    
+    def drain(self) -> Dict[tuple, list]:
+        """Take the series recorded so far, leaving the histogram empty (see merge)"""
+        
+        with self._lock:
+            series, self._series = self._series, {}
+        return series
+    
+    def merge(self, series: Dict[tuple, list]):
+        """Add series drained from the same histogram in another process, e.g. an analysis pool worker"""
+        
+        if not self.registry.enabled:
+            return
+        
+        with self._lock:
+            for labels, values in series.items():
+                current = self._series.get(labels)
+                if current is None:
+                    self._series[labels] = list(values)
+                else:
+                    self._series[labels] = [mine + theirs for mine, theirs in zip(current, values)]
+    
+    def time(self, *labels) -> '_Timer':
+        """Context manager observing the elapsed time of its block"""
+        return _Timer(self, labels) if self.registry.enabled else _NULL_TIMER
+    
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        
+        bucket_names = self.labelnames + ('le',)
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _format_value(float(bound))
+                lines.append(f'{self.name}_bucket{_format_labels(bucket_names, labels + (le,))} {cumulative}')
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {_format_value(values[-2])}')
+            lines.append(f'{self.name}_count{label_text} {values[-1]}')
+        return lines
+
+class Counter:
+    """Monotonic counter with labels"""
+    
+    def __init__(self, registry: 'MetricsRegistry', name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, *labels, amount: float = 1):
+        """Add to the counter (no-op while metrics are disabled)"""
+        
+        if not self.registry.enabled:
+            return
+        
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+    
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+class CallbackMetric:
+    """Gauge or counter whose samples are read from a callback at scrape time"""
+    
+    def __init__(self, name: str, help_text: str, metric_type: str, func: Callable[[], Dict[tuple, float]],
+                 labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.metric_type = metric_type
+        self.func = func
+        self.labelnames = labelnames
+    
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.metric_type}']
+        for labels, value in sorted(self.func().items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}')
+        return lines
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+    
+    def __init__(self, histogram: Histogram, labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+class _NullTimer:
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class MetricsRegistry:
+    """All metric families of the process; recording is skipped entirely while disabled"""
+    
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_env(cls) -> 'MetricsRegistry':
+        """Build a registry switched on by METRICS_ENABLED=1"""
+        return cls(enabled=os.environ.get('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes'))
+    
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+    
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, help_text, labelnames, buckets))
+    
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(self, name, help_text, labelnames))
+    
+    def callback(self, name: str, help_text: str, metric_type: str, func: Callable[[], Dict[tuple, float]],
+                 labelnames: Tuple[str, ...] = ()) -> CallbackMetric:
+        return self._register(CallbackMetric(name, help_text, metric_type, func, labelnames))
+    
+    def timed(self, histogram: Histogram, *labels):
+        """Decorator timing every call of a function into histogram"""
+        
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start, *labels)
+            return wrapper
+        return decorator
+    
+    def render(self) -> str:
+        """Every metric family in Prometheus text exposition format"""
+        
+        with self._lock:
+            families = list(self._metrics.values())
+        
+        lines = []
+        for metric in families:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency and counts per route template"""
+    
+    def __init__(self, app, registry: 'MetricsRegistry'):
+        self.app = app
+        self.registry = registry
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.registry.enabled:
+            await self.app(scope, receive, send)
+            return
+        
+        status = [500]
+        
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+        
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Route templates (/sentences/{sentence_id}) keep label cardinality bounded
+            route = scope.get('route')
+            path = getattr(route, 'path', 'unmatched')
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, scope['method'], path)
+            HTTP_REQUESTS_TOTAL.inc(scope['method'], path, str(status[0]))
+
+# Initialize global metrics registry and the metric families shared by the backend
+metrics = MetricsRegistry.from_env()
+
+ANALYZER_SECONDS = metrics.histogram(
+    'somali_nlp_analyzer_seconds', 'Time spent in each enterprise analysis component', ('analyzer', 'mode')
+)
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    'somali_api_request_seconds', 'API request latency by route', ('method', 'path')
+)
+HTTP_REQUESTS_TOTAL = metrics.counter(
+    'somali_api_requests_total', 'API requests by route and status', ('method', 'path', 'status')
+)
+DB_CALL_SECONDS = metrics.histogram(
+    'somali_db_call_seconds', 'Latency of hot-path SQLite calls', ('operation',)
+)
+BATCH_SIZE = metrics.histogram(
+    'somali_api_batch_size', 'Texts per bulk request', ('endpoint',), buckets=BATCH_SIZE_BUCKETS
+)
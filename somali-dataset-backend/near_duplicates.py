@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+Enterprise Near-Duplicate Detection
+MinHash/LSH index that catches near-identical sentences at ingestion
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import unicodedata
+from contextlib import closing
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from database import DEFAULT_DB_PATH, ConnectionPool, get_pool
+
+# Shingles: every SHINGLE_SIZE bytes of the normalized UTF-8 text, read as one integer
+SHINGLE_SIZE = 5
+
+# 32 bands of 4 minimum hashes: a pair at Jaccard similarity 0.6 shares a
+# band with probability 0.99, at 0.5 with 0.87, at 0.3 with 0.23
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+
+# Jaccard similarity at or above which a new sentence is a near-duplicate of a
+# stored one. On build_dataset's output 0.6 catches 93% of the "Si kastaba, ..."
+# and "... Waa run." variants; most of the other sentences it catches are
+# template fills that differ in one word. Lower thresholds would need more bands
+DEFAULT_THRESHOLD = 0.6
+MIN_THRESHOLD = 0.5
+
+_FNV_OFFSET = 0xcbf29ce484222325
+_FNV_PRIME = 0x100000001b3
+
+# Multiply-shift hash functions, h(x) = ((a * x + b) mod 2^64) >> 32 for odd a.
+# Fixed seed: signatures must stay comparable across processes and releases
+_rng = random.Random(0x5eed)
+_A = [_rng.getrandbits(64) | 1 for _ in range(NUM_PERM)]
+_B = [_rng.getrandbits(64) for _ in range(NUM_PERM)]
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS minhash_signatures (
+        sentence_id INTEGER PRIMARY KEY,
+        signature BLOB NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS minhash_buckets (
+        bucket INTEGER NOT NULL,
+        sentence_id INTEGER NOT NULL,
+        PRIMARY KEY (bucket, sentence_id)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS near_duplicates (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sentence_id INTEGER NOT NULL,
+        duplicate_id INTEGER,
+        text TEXT NOT NULL,
+        similarity REAL NOT NULL,
+        source TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (sentence_id, text)
+    )
+    """,
+)
+
+def normalize(text: str) -> str:
+    """Casefold, strip diacritics and punctuation, and collapse whitespace"""
+    
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(re.findall(r"[^\W_]+", text.casefold()))
+
+def _shingle_bytes(text: str) -> bytes:
+    # Texts shorter than a shingle are one zero-padded shingle
+    return normalize(text).encode().ljust(SHINGLE_SIZE, b'\0')
+
+def signatures(texts: Sequence[str]) -> List[bytes]:
+    """MinHash signature of each text: the minimum of each of NUM_PERM hashes over its shingles, as little-endian uint32"""
+    
+    import numpy as np
+    
+    a = np.array(_A, dtype=np.uint64)
+    b = np.array(_B, dtype=np.uint64)
+    result = []
+    for group in range(0, len(texts), 128):     # Bounds the (NUM_PERM, shingles) matrix to a few MB
+        data = [_shingle_bytes(text) for text in texts[group:group + 128]]
+        lengths = np.array([len(item) for item in data])
+        counts = lengths - SHINGLE_SIZE + 1
+        firsts = np.cumsum(counts) - counts
+        
+        # Offset of every shingle in the joined bytes: none spans two texts
+        offsets = np.repeat(np.cumsum(lengths) - lengths - firsts, counts) + np.arange(counts.sum())
+        joined = np.frombuffer(b''.join(data), np.uint8).astype(np.uint64)
+        shingles = np.zeros(len(offsets), np.uint64)
+        for k in range(SHINGLE_SIZE):
+            shingles |= joined[offsets + k] << np.uint64(8 * k)
+        
+        # Hashes as (NUM_PERM, shingles), so each text's minimums reduce contiguous memory;
+        # uint64 arithmetic wraps modulo 2^64
+        hashes = np.multiply.outer(a, shingles)
+        hashes += b[:, None]
+        hashes >>= np.uint64(32)
+        minimums = np.minimum.reduceat(hashes, firsts, axis=1).T.astype('<u4')
+        result.extend(row.tobytes() for row in minimums)
+    return result
+
+def band_keys(sigs: Sequence[bytes]) -> List[List[int]]:
+    """
+    LSH bucket keys of each signature, one per band
+    
+    A key is the 64-bit FNV-1a hash of the band number and the band's ROWS
+    values, as a signed integer for SQLite.
+    """
+    
+    import numpy as np
+    
+    bands = np.frombuffer(b''.join(sigs), '<u4').astype(np.uint64).reshape(len(sigs), BANDS, ROWS)
+    keys = np.broadcast_to(np.uint64(_FNV_OFFSET) ^ np.arange(BANDS, dtype=np.uint64), bands.shape[:2])
+    for row in range(ROWS):
+        keys = (keys ^ bands[:, :, row]) * np.uint64(_FNV_PRIME)    # Wraps modulo 2^64
+    return keys.view(np.int64).tolist()
+
+def similarities(signature: bytes, others: Sequence[bytes]) -> List[float]:
+    """Estimated Jaccard similarity of a signature to each of others: the fraction of equal values"""
+    
+    import numpy as np
+    
+    if not others:
+        return []
+    matrix = np.frombuffer(b''.join(others), '<u4').reshape(len(others), NUM_PERM)
+    return ((matrix == np.frombuffer(signature, '<u4')).sum(axis=1) / NUM_PERM).tolist()
+
+def index_path(db_path: str) -> str:
+    """The index file kept next to a database: somali_dataset.db -> somali_dataset.minhash.db"""
+    return os.path.splitext(db_path)[0] + '.minhash.db'
+
+def database_path(conn: sqlite3.Connection) -> Optional[str]:
+    """File of a connection's main database; None for an in-memory one"""
+    
+    for row in conn.execute("PRAGMA database_list"):
+        if row[1] == 'main':
+            return row[2] or None
+    return None
+
+def _json(values: Iterable) -> str:
+    return json.dumps(list(values))
+
+class NearDuplicateIndex:
+    """
+    MinHash signatures and LSH buckets of the stored sentences, in their own SQLite file.
+    
+    A new text's candidates are the sentences sharing at least one band key
+    with it; a candidate whose signature estimates a Jaccard similarity of at
+    least threshold, and that is still stored, makes the text a
+    near-duplicate. Rejected texts are logged in near_duplicates for the
+    report.
+    
+    Usage:
+        index = get_index(db_path)
+        sigs, matches = index.match(conn, texts)
+        ... insert the texts whose match is None ...
+        index.add([(sentence_id, sig), ...])
+    """
+    
+    def __init__(self, path: str, threshold: float = DEFAULT_THRESHOLD, pool: Optional[ConnectionPool] = None):
+        """
+        Args:
+            path: Index database file
+            threshold: Jaccard similarity of a near-duplicate, MIN_THRESHOLD to 1
+            pool: Connection pool of the index file (default: its shared pool)
+        """
+        if not MIN_THRESHOLD <= threshold <= 1:
+            raise ValueError(f"Near-duplicate threshold must be between {MIN_THRESHOLD} and 1, got {threshold}")
+        self.path = path
+        self.threshold = threshold
+        self.pool = pool or get_pool(path)
+        
+        if path not in _initialized:
+            with _indexes_lock, self.pool.connection() as index:
+                if path not in _initialized:
+                    for statement in SCHEMA:
+                        index.execute(statement)
+                    index.commit()
+                    _initialized.add(path)
+    
+    def match(self, conn: sqlite3.Connection, texts: Sequence[str],
+              skip_stored: bool = True) -> Tuple[List[Optional[bytes]], List[Optional[Dict]]]:
+        """
+        Near-duplicate match of each text, against the stored sentences and the earlier texts
+        
+        Args:
+            conn: Connection to the main database
+            texts: Texts about to be inserted, in order
+            skip_stored: Leave texts already stored verbatim to the UNIQUE constraint
+        
+        Returns:
+            Per text, its signature (None for skipped texts and verbatim
+            repeats) and None or its most similar earlier sentence:
+            {'sentence_id', 'similarity'} for a stored one, {'index',
+            'similarity'} for an earlier text of the batch. Repeats of a text
+            get its first match.
+        """
+        
+        stored = set()
+        if skip_stored and texts:
+            stored = {row[0] for row in conn.execute(
+                "SELECT text FROM somali_sentences WHERE text IN (SELECT value FROM json_each(?))", (_json(texts),)
+            )}
+        
+        first: Dict[str, int] = {}
+        for i, text in enumerate(texts):
+            if text not in stored and text not in first:
+                first[text] = i
+        pending = list(first.values())
+        
+        sigs: List[Optional[bytes]] = [None] * len(texts)
+        for i, sig in zip(pending, signatures([texts[i] for i in pending])):
+            sigs[i] = sig
+        keys = dict(zip(pending, band_keys([sigs[i] for i in pending])))
+        
+        buckets: Dict[int, List[int]] = {}
+        with self.pool.connection() as index:
+            rows = index.execute(
+                "SELECT bucket, sentence_id FROM minhash_buckets WHERE bucket IN (SELECT value FROM json_each(?))",
+                (_json({key for i in pending for key in keys[i]}),)
+            )
+            for bucket, sentence_id in rows:
+                buckets.setdefault(bucket, []).append(sentence_id)
+            candidate_sigs = dict(index.execute(
+                "SELECT sentence_id, signature FROM minhash_signatures WHERE sentence_id IN (SELECT value FROM json_each(?))",
+                (_json({sentence_id for ids in buckets.values() for sentence_id in ids}),)
+            )) if buckets else {}
+        
+        # Stored candidates at or above the threshold, best first
+        similar: Dict[int, List[Tuple[float, int]]] = {}
+        for i in pending:
+            candidates = list({sentence_id for key in keys[i] for sentence_id in buckets.get(key, ())})
+            scores = similarities(sigs[i], [candidate_sigs[sentence_id] for sentence_id in candidates])
+            similar[i] = sorted((-score, sentence_id) for score, sentence_id in zip(scores, candidates)
+                                if score >= self.threshold)
+        
+        # Deleted sentences stay in the index until the next rebuild
+        live = set()
+        similar_ids = {sentence_id for found in similar.values() for _, sentence_id in found}
+        if similar_ids:
+            live = {row[0] for row in conn.execute(
+                "SELECT id FROM somali_sentences WHERE id IN (SELECT value FROM json_each(?))", (_json(similar_ids),)
+            )}
+        
+        matches: List[Optional[Dict]] = [None] * len(texts)
+        batch_buckets: Dict[int, List[int]] = {}
+        for i in pending:
+            best = next(({'sentence_id': sentence_id, 'similarity': -score}
+                         for score, sentence_id in similar[i] if sentence_id in live), None)
+            
+            if best is None:
+                earlier = list({j for key in keys[i] for j in batch_buckets.get(key, ())})
+                scores = similarities(sigs[i], [sigs[j] for j in earlier])
+                for j, score in zip(earlier, scores):
+                    if score >= self.threshold and (best is None or score > best['similarity']):
+                        best = {'index': j, 'similarity': score}
+            
+            matches[i] = best
+            if best is None:
+                for key in keys[i]:
+                    batch_buckets.setdefault(key, []).append(i)
+        
+        for i, text in enumerate(texts):
+            if text in first and first[text] != i:
+                matches[i] = matches[first[text]]
+        return sigs, matches
+    
+    def add(self, entries: Iterable[Tuple[int, bytes]]):
+        """Index stored sentences: (sentence_id, signature) pairs"""
+        
+        entries = list(entries)
+        if not entries:
+            return
+        with self.pool.connection() as index:
+            index.execute("BEGIN IMMEDIATE")
+            index.executemany("INSERT OR REPLACE INTO minhash_signatures (sentence_id, signature) VALUES (?, ?)",
+                              entries)
+            # In key order: each insert lands next to the previous one in the b-tree
+            keys = band_keys([sig for _, sig in entries])
+            buckets = sorted((key, sentence_id) for (sentence_id, _), row_keys in zip(entries, keys) for key in row_keys)
+            index.executemany("INSERT OR IGNORE INTO minhash_buckets (bucket, sentence_id) VALUES (?, ?)", buckets)
+            index.commit()
+    
+    def record(self, rejected: Iterable[Tuple[int, Optional[int], str, float, Optional[str]]]):
+        """Log near-duplicates, each text once per sentence: (sentence_id, duplicate_id, text, similarity, source) tuples"""
+        
+        rejected = list(rejected)
+        if not rejected:
+            return
+        with self.pool.connection() as index:
+            index.executemany("""
+                INSERT INTO near_duplicates (sentence_id, duplicate_id, text, similarity, source)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (sentence_id, text) DO UPDATE SET duplicate_id = IFNULL(excluded.duplicate_id, duplicate_id)
+            """, rejected)
+            index.commit()
+    
+    def clusters(self, conn: sqlite3.Connection, limit: int = 50, examples: int = 5) -> Dict:
+        """
+        Report of the largest near-duplicate clusters
+        
+        A cluster is a stored sentence and the texts found to be its
+        near-duplicates: rejected at ingestion (duplicate_id None) or, after a
+        rebuild, stored sentences (duplicate_id set).
+        """
+        
+        with self.pool.connection() as index:
+            totals = index.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT sentence_id) FROM near_duplicates"
+            ).fetchone()
+            groups = index.execute("""
+                SELECT sentence_id, COUNT(*) AS near_duplicates, MAX(similarity) AS max_similarity
+                FROM near_duplicates GROUP BY sentence_id
+                ORDER BY near_duplicates DESC, sentence_id LIMIT ?
+            """, (limit,)).fetchall()
+            members = {
+                group['sentence_id']: [dict(row) for row in index.execute("""
+                    SELECT duplicate_id, text, similarity, source, created_at FROM near_duplicates
+                    WHERE sentence_id = ? ORDER BY similarity DESC, id LIMIT ?
+                """, (group['sentence_id'], examples))]
+                for group in groups
+            }
+        
+        sentences = {}
+        if groups:
+            rows = conn.execute("SELECT id, text, source FROM somali_sentences WHERE id IN (SELECT value FROM json_each(?))",
+                                (_json(members),))
+            sentences = {row['id']: dict(row) for row in rows}
+        
+        return {
+            'threshold': self.threshold,
+            'near_duplicates': totals[0],
+            'clusters': totals[1],
+            'largest': [{
+                'sentence': sentences.get(group['sentence_id'], {'id': group['sentence_id'], 'text': None, 'source': None}),
+                'near_duplicates': group['near_duplicates'],
+                'max_similarity': group['max_similarity'],
+                'examples': members[group['sentence_id']]
+            } for group in groups]
+        }
+    
+    def rebuild(self, conn: sqlite3.Connection, chunk_size: int = 5000) -> Dict:
+        """
+        Re-index every stored sentence, oldest first
+        
+        Stored sentences that are near-duplicates of older ones are logged
+        with their duplicate_id rather than indexed; nothing is deleted from
+        the main database. The log of rejected texts is kept.
+        
+        Returns:
+            {'indexed', 'near_duplicates'} counts
+        """
+        
+        with self.pool.connection() as index:
+            index.execute("DELETE FROM minhash_signatures")
+            index.execute("DELETE FROM minhash_buckets")
+            index.execute("DELETE FROM near_duplicates WHERE duplicate_id IS NOT NULL")
+            index.commit()
+        
+        indexed = found = last_id = 0
+        while True:
+            rows = conn.execute("SELECT id, text, source FROM somali_sentences WHERE id > ? ORDER BY id LIMIT ?",
+                                (last_id, chunk_size)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            
+            sigs, matches = self.match(conn, [row['text'] for row in rows], skip_stored=False)
+            rejected = []
+            for row, match in zip(rows, matches):
+                if match is not None:
+                    representative = match['sentence_id'] if 'sentence_id' in match else rows[match['index']]['id']
+                    rejected.append((representative, row['id'], row['text'], match['similarity'], row['source']))
+            self.add((row['id'], sig) for row, sig, match in zip(rows, sigs, matches) if match is None)
+            self.record(rejected)
+            indexed += len(rows) - len(rejected)
+            found += len(rejected)
+        
+        return {'indexed': indexed, 'near_duplicates': found}
+
+_initialized: Set[str] = set()
+_indexes_lock = threading.Lock()
+
+def get_index(db_path: Optional[str] = DEFAULT_DB_PATH, threshold: Optional[float] = None,
+              pool: Optional[ConnectionPool] = None) -> Optional[NearDuplicateIndex]:
+    """
+    The near-duplicate index of a database file, or None when detection is off
+    
+    threshold defaults to NEAR_DUPLICATE_THRESHOLD (DEFAULT_THRESHOLD when
+    unset); 0 turns detection off, as does an in-memory database. pool, if
+    given, is the connection pool of the index file.
+    """
+    
+    if threshold is None:
+        threshold = float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', DEFAULT_THRESHOLD))
+    if not threshold or not db_path or db_path == ':memory:':
+        return None
+    return NearDuplicateIndex(index_path(os.path.abspath(db_path)), threshold, pool)
+
+def main():
+    """Command-line entry point"""
+    
+    parser = argparse.ArgumentParser(description="Report near-duplicate sentence clusters")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH)
+    parser.add_argument('--threshold', type=float, help=f"Jaccard similarity (default {DEFAULT_THRESHOLD})")
+    parser.add_argument('--rebuild', action='store_true', help="Re-index the stored sentences first")
+    parser.add_argument('--limit', type=int, default=20, help="Clusters to show")
+    args = parser.parse_args()
+    
+    from database import connect
+    
+    index = get_index(args.db, args.threshold)
+    if index is None:
+        parser.error("near-duplicate detection is turned off (threshold 0)")
+    
+    with closing(connect(args.db)) as conn:
+        if args.rebuild:
+            print(f"🔁 Rebuilding the near-duplicate index of {args.db}...")
+            result = index.rebuild(conn)
+            print(f"   Indexed {result['indexed']:,} sentences, {result['near_duplicates']:,} near-duplicates")
+        report = index.clusters(conn, args.limit)
+    
+    print(f"📋 {report['near_duplicates']:,} near-duplicates in {report['clusters']:,} clusters "
+          f"(threshold {report['threshold']})")
+    for cluster in report['largest']:
+        print(f"   {cluster['near_duplicates']:>5} × {cluster['sentence']['text']}")
+        for example in cluster['examples']:
+            print(f"          {example['similarity']:.2f}  {example['text']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""
+Keyset Pagination
+Opaque cursors shared by the sentence, search and user listings
+"""
+
+import base64
+import json
+
+def encode_cursor(key: list) -> str:
+    """Opaque, URL-safe cursor for a keyset position"""
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(',', ':')).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> list:
+    """Keyset position of a cursor, as a non-empty list; ValueError if it is malformed"""
+    
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    
+    if not isinstance(key, list) or not key:
+        raise ValueError("Invalid cursor")
+    return key
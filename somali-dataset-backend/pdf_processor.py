@@ -4,12 +4,16 @@ PDF Processor for Authentic Somali Religious Content
 Extract and process billions of sentences from PDFs
 """
 
-import sqlite3
 import json
 import re
 from datetime import datetime
 from typing import List, Dict
 import hashlib
+from lexicon_matcher import lexicon_matcher, WORD
+from database import connect
+from segment_store import open_sentence_writer
+import schema
+import dataset_stats
 
 # For PDF processing (install with: pip install PyPDF2 pdfplumber)
 try:
@@ -20,6 +24,34 @@ except ImportError:
     PDF_AVAILABLE = False
     print("📋 To process PDFs, install: pip install PyPDF2 pdfplumber")
 
+# Somali function words and particles (matched as whole words)
+SOMALI_INDICATORS = [
+    # Common Somali words
+    'waa', 'baa', 'ayaa', 'oo', 'iyo', 'ka', 'ku', 'la', 'ah', 'si',
+    # Common particles
+    'waxa', 'waxaa', 'waxay', 'wuxuu', 'inuu', 'inay'
+]
+
+# Religious stems that also mark Somali text (matched inside inflected words)
+RELIGIOUS_INDICATORS = ['allah', 'allaah', 'islaam', 'diinta', 'nabiga', 'quraanka', 'salaad']
+
+RELIGIOUS_TERMS = [
+    'allah', 'allaah', 'islaam', 'diinta', 'nabiga', 'quraanka', 'salaad',
+    'ramadan', 'hajj', 'xaj', 'saum', 'zakah', 'shahaadah', 'imaan',
+    'muslim', 'muslimiinta', 'ducada', 'masjid', 'diin', 'kitaab',
+    'ayah', 'surah', 'hadith', 'sunnah', 'rasul', 'rasuul',
+    'bismillah', 'alhamdulillah', 'subhanallah', 'astaghfirullah',
+    'inshallah', 'mashaallah', 'barakallahu', 'jannah', 'naar',
+    'akhirah', 'dunya', 'taqwa', 'sabr', 'shukr', 'halal', 'haram'
+]
+
+SOMALI_PATTERNS = ['waa', 'baa', 'ayaa', 'waxa', 'waxaa']
+
+lexicon_matcher.add_lexicon('pdf.somali_indicators', SOMALI_INDICATORS)
+lexicon_matcher.add_lexicon('pdf.religious_indicators', RELIGIOUS_INDICATORS)
+lexicon_matcher.add_lexicon('pdf.religious_terms', RELIGIOUS_TERMS)
+lexicon_matcher.add_lexicon('pdf.somali_patterns', SOMALI_PATTERNS)
+
 class SomaliPDFProcessor:
     """Process authentic Somali religious PDFs into high-quality dataset"""
     
@@ -29,40 +61,7 @@ class SomaliPDFProcessor:
     
     def init_database(self):
         """Initialize database for religious content"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Enhanced table for religious content
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS somali_sentences (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                text TEXT UNIQUE NOT NULL,
-                translation TEXT,
-                dialect TEXT DEFAULT 'Standard Somali',
-                quality_score REAL DEFAULT 95.0,
-                source TEXT,
-                category TEXT DEFAULT 'religious',
-                validated BOOLEAN DEFAULT TRUE,
-                scholar_approved BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                metadata TEXT
-            )
-        ''')
-        
-        # Religious content tracking
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS religious_sources (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                pdf_name TEXT UNIQUE NOT NULL,
-                content_type TEXT,
-                sentences_extracted INTEGER DEFAULT 0,
-                processing_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                imam_approved BOOLEAN DEFAULT TRUE
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        schema.init_database(self.db_path)
         print("✅ Database initialized for religious content")
     
     def extract_text_from_pdf(self, pdf_path: str) -> str:
@@ -165,17 +164,11 @@ class SomaliPDFProcessor:
     
     def is_likely_somali(self, text: str) -> bool:
         """Check if text is likely Somali"""
-        somali_indicators = [
-            # Common Somali words
-            'waa', 'baa', 'ayaa', 'oo', 'iyo', 'ka', 'ku', 'la', 'ah', 'si',
-            # Religious terms
-            'allah', 'allaah', 'islaam', 'diinta', 'nabiga', 'quraanka', 'salaad',
-            # Common particles
-            'waxa', 'waxaa', 'waxay', 'wuxuu', 'inuu', 'inay'
-        ]
-        
         text_lower = text.lower()
-        indicator_count = sum(1 for indicator in somali_indicators if indicator in text_lower)
+        indicator_count = (
+            lexicon_matcher.count('pdf.somali_indicators', text_lower, WORD) +
+            lexicon_matcher.count('pdf.religious_indicators', text_lower)
+        )
         
         return indicator_count >= 2  # At least 2 Somali indicators
     
@@ -206,67 +199,46 @@ class SomaliPDFProcessor:
             score += 10
         
         # Somali language patterns
-        somali_patterns = ['waa', 'baa', 'ayaa', 'waxa', 'waxaa']
-        if any(pattern in text.lower() for pattern in somali_patterns):
+        if lexicon_matcher.count('pdf.somali_patterns', text.lower()) > 0:
             score += 15
         
         return min(score, 100)
     
     def count_religious_terms(self, text: str) -> int:
         """Count Islamic/religious terms in text"""
-        religious_terms = [
-            'allah', 'allaah', 'islaam', 'diinta', 'nabiga', 'quraanka', 'salaad',
-            'ramadan', 'hajj', 'xaj', 'saum', 'zakah', 'shahaadah', 'imaan',
-            'muslim', 'muslimiinta', 'ducada', 'masjid', 'diin', 'kitaab',
-            'ayah', 'surah', 'hadith', 'sunnah', 'rasul', 'rasuul',
-            'bismillah', 'alhamdulillah', 'subhanallah', 'astaghfirullah',
-            'inshallah', 'mashaallah', 'barakallahu', 'jannah', 'naar',
-            'akhirah', 'dunya', 'taqwa', 'sabr', 'shukr', 'halal', 'haram'
-        ]
-        
-        text_lower = text.lower()
-        return sum(1 for term in religious_terms if term in text_lower)
+        return lexicon_matcher.count('pdf.religious_terms', text.lower())
     
     def save_sentences_to_db(self, sentences: List[Dict], pdf_name: str):
         """Save processed sentences to database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        success_count = 0
+        conn = connect(self.db_path)
         
         # Record the PDF source
-        cursor.execute('''
+        conn.execute('''
             INSERT OR REPLACE INTO religious_sources 
             (pdf_name, content_type, sentences_extracted, imam_approved)
             VALUES (?, ?, ?, ?)
         ''', (pdf_name, 'religious', len(sentences), True))
         
-        # Save sentences
-        for sentence_data in sentences:
-            try:
-                cursor.execute('''
-                    INSERT OR IGNORE INTO somali_sentences 
-                    (text, quality_score, source, category, validated, scholar_approved, metadata)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    sentence_data['text'],
-                    sentence_data['quality_score'],
-                    sentence_data['source'],
-                    sentence_data['category'],
-                    True,
-                    sentence_data['scholar_approved'],
-                    json.dumps(sentence_data['metadata'])
-                ))
-                
-                if cursor.rowcount > 0:
-                    success_count += 1
-                    
-            except Exception as e:
-                print(f"⚠️ Error saving sentence: {e}")
-                continue
-        
-        conn.commit()
+        # Save sentences; the source row commits with the first chunk
+        columns = ('text', 'quality_score', 'source', 'category', 'validated', 'scholar_approved', 'metadata')
+        with open_sentence_writer(conn, columns) as writer:
+            for sentence_data in sentences:
+                try:
+                    writer.add((
+                        sentence_data['text'],
+                        sentence_data['quality_score'],
+                        sentence_data['source'],
+                        sentence_data['category'],
+                        True,
+                        sentence_data['scholar_approved'],
+                        json.dumps(sentence_data['metadata'])
+                    ))
+                except (KeyError, TypeError) as e:
+                    print(f"⚠️ Error saving sentence: {e}")
+        
+        conn.commit()     # Source row when there were no sentences
         conn.close()
+        success_count = writer.inserted
         
         print(f"✅ Saved {success_count} sentences from {pdf_name}")
         return success_count
@@ -299,36 +271,22 @@ class SomaliPDFProcessor:
     
     def get_dataset_stats(self) -> Dict:
         """Get current dataset statistics"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Total sentences
-        cursor.execute("SELECT COUNT(*) FROM somali_sentences")
-        total = cursor.fetchone()[0]
-        
-        # Religious sentences
-        cursor.execute("SELECT COUNT(*) FROM somali_sentences WHERE category = 'religious'")
-        religious = cursor.fetchone()[0]
-        
-        # High quality sentences
-        cursor.execute("SELECT COUNT(*) FROM somali_sentences WHERE quality_score >= 90")
-        high_quality = cursor.fetchone()[0]
+        conn = connect(self.db_path)
         
-        # Average quality
-        cursor.execute("SELECT AVG(quality_score) FROM somali_sentences")
-        avg_quality = cursor.fetchone()[0] or 0
+        stats = dataset_stats.summary(conn)
+        total = stats['total_sentences']
+        religious = dataset_stats.category_count(conn, 'religious')
         
         # Sources processed
-        cursor.execute("SELECT COUNT(*) FROM religious_sources")
-        sources = cursor.fetchone()[0]
+        sources = conn.execute("SELECT COUNT(*) FROM religious_sources").fetchone()[0]
         
         conn.close()
         
         return {
             "total_sentences": total,
             "religious_sentences": religious,
-            "high_quality_sentences": high_quality,
-            "average_quality": round(avg_quality, 1),
+            "high_quality_sentences": stats['top_quality'],
+            "average_quality": round(stats['average_quality'], 1),
             "sources_processed": sources,
             "ready_for_production": total >= 1000
         }
@@ -0,0 +1,92 @@
+"""
+Enterprise Query Catalog
+Hot-path SQL shared by the API and collectors, each backed by an index from schema.py
+"""
+
+# Authentication (users.api_key / users.email UNIQUE indexes)
+VERIFY_API_KEY = '''
+    SELECT id, email, plan, requests_used, requests_limit, is_active
+    FROM users WHERE api_key = ? AND is_active = 1
+'''
+
+LOGIN_USER = '''
+    SELECT id, email, api_key, plan, requests_used, requests_limit, is_active
+    FROM users WHERE email = ? AND password = ? AND is_active = 1
+'''
+
+# API key cache invalidations past the last one a process has applied (schema version 13)
+KEY_INVALIDATIONS = '''
+    SELECT id, user_id FROM api_key_invalidations WHERE id > ? ORDER BY id
+'''
+
+
+# Dataset statistics: trigger-maintained buckets (schema version 4), O(1) in corpus size
+STATS_SUMMARY = '''
+    SELECT sentences, validated, scholar_approved, high_quality, top_quality, quality_sum, quality_count
+    FROM dataset_stats WHERE dimension = 'total' AND value = ''
+'''
+
+STATS_CATEGORY = '''
+    SELECT sentences FROM dataset_stats WHERE dimension = 'category' AND value = ?
+'''
+
+STATS_BREAKDOWN = '''
+    SELECT value, sentences FROM dataset_stats WHERE dimension = ? AND sentences > 0
+'''
+
+# Whole hours from the hourly buckets, plus an exact indexed count inside the oldest, partial hour
+RECENT_ADDITIONS = '''
+    SELECT
+        (SELECT IFNULL(SUM(sentences), 0) FROM sentence_hourly
+         WHERE hour > strftime('%Y-%m-%d %H:00:00', 'now', ?1))
+        + (SELECT COUNT(*) FROM somali_sentences
+           WHERE created_at > datetime('now', ?1)
+             AND created_at < datetime(strftime('%Y-%m-%d %H:00:00', 'now', ?1), '+1 hour'))
+'''
+
+# Usage reports (schema version 10), formatted with table=usage_hourly or usage_daily:
+# one user's rows in bucket order from the primary key (series and per-endpoint totals
+# are summed from them), or one endpoint's from the endpoint index
+USAGE_ROWS = '''
+    SELECT bucket, endpoint, requests FROM {table}
+    WHERE user_id = ? AND bucket >= ? AND bucket < ? ORDER BY bucket
+'''
+
+USAGE_ENDPOINT_ROWS = '''
+    SELECT bucket, endpoint, requests FROM {table}
+    WHERE user_id = ? AND endpoint = ? AND bucket >= ? AND bucket < ? ORDER BY bucket
+'''
+
+# Every read above with sample parameters; test_query_plans checks none of them scans a table
+# (sentence and user listings are built per request by sentence_listing.py and user_listing.py;
+# test_query_plans checks those too)
+HOT_QUERIES = {
+    'verify_api_key': (VERIFY_API_KEY, ('sk_live_example',)),
+    'login_user': (LOGIN_USER, ('user@example.com', 'hash')),
+    'key_invalidations': (KEY_INVALIDATIONS, (123,)),
+    'stats_summary': (STATS_SUMMARY, ()),
+    'stats_category': (STATS_CATEGORY, ('religious',)),
+    'stats_breakdown': (STATS_BREAKDOWN, ('dialect',)),
+    'recent_additions': (RECENT_ADDITIONS, ('-1 day',)),
+    **{
+        f'{name}[{table}]': (sql.format(table=table), params)
+        for table in ('usage_hourly', 'usage_daily')
+        for name, sql, params in (
+            ('usage_rows', USAGE_ROWS, (1, '2024-01-01', '2024-02-01')),
+            ('usage_endpoint_rows', USAGE_ENDPOINT_ROWS, (1, '/analyze', '2024-01-01', '2024-02-01'))
+        )
+    }
+}
+
+# Admin summary from the trigger-maintained per-plan counts (schema version 11). Not a hot
+# query above: it reads the whole of user_plan_stats, which holds one row per plan
+PLAN_SUMMARY = '''
+    SELECT plan, users, active_users, exhausted_users, requests_used, requests_limit
+    FROM user_plan_stats ORDER BY plan
+'''
+
+# Users of one plan (or every plan when the parameter is NULL), from the same counts
+PLAN_USER_COUNTS = '''
+    SELECT IFNULL(SUM(users), 0), IFNULL(SUM(active_users), 0) FROM user_plan_stats
+    WHERE ?1 IS NULL OR plan = ?1
+'''
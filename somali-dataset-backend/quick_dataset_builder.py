@@ -3,33 +3,17 @@
 Quick Dataset Builder - Build 5000+ Somali sentences instantly
 """
 
-import sqlite3
 import json
 import random
 from datetime import datetime
+import schema
+import dataset_stats
+from database import connect
+from segment_store import open_sentence_writer
 
 def init_database():
     """Initialize database"""
-    conn = sqlite3.connect('somali_dataset.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS somali_sentences (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            text TEXT UNIQUE NOT NULL,
-            translation TEXT,
-            dialect TEXT,
-            quality_score REAL,
-            source TEXT,
-            validated BOOLEAN DEFAULT FALSE,
-            scholar_approved BOOLEAN DEFAULT FALSE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            metadata TEXT
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    schema.init_database()
 
 def build_enterprise_dataset():
     """Build enterprise-grade dataset"""
@@ -295,62 +279,44 @@ def build_enterprise_dataset():
 
 def save_to_database(sentences):
     """Save sentences to database"""
-    conn = sqlite3.connect('somali_dataset.db')
-    cursor = conn.cursor()
-    
-    success_count = 0
+    conn = connect('somali_dataset.db')
     
-    for sentence_data in sentences:
-        try:
-            cursor.execute('''
-                INSERT OR IGNORE INTO somali_sentences 
-                (text, dialect, quality_score, source, validated, scholar_approved, metadata)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                sentence_data["text"],
-                sentence_data["dialect"],
-                sentence_data["quality_score"],
-                sentence_data["source"],
-                True,
-                True,
-                json.dumps({"category": "enterprise_dataset"})
-            ))
-            
-            if cursor.rowcount > 0:
-                success_count += 1
-                
-        except Exception as e:
-            print(f"Error saving: {e}")
-            continue
+    columns = ('text', 'dialect', 'quality_score', 'source', 'category', 'validated', 'scholar_approved', 'metadata')
+    with open_sentence_writer(conn, columns) as writer:
+        for sentence_data in sentences:
+            try:
+                writer.add((
+                    sentence_data["text"],
+                    sentence_data["dialect"],
+                    sentence_data["quality_score"],
+                    sentence_data["source"],
+                    "enterprise_dataset",
+                    True,
+                    True,
+                    json.dumps({"category": "enterprise_dataset"})
+                ))
+            except KeyError as e:
+                print(f"Error saving: missing {e}")
     
-    conn.commit()
     conn.close()
     
-    return success_count
+    if writer.near_duplicates:
+        print(f"🔁 Skipped {writer.near_duplicates} near-duplicate sentences")
+    return writer.inserted
 
 def get_stats():
     """Get dataset statistics"""
-    conn = sqlite3.connect('somali_dataset.db')
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT COUNT(*) FROM somali_sentences")
-    total = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT AVG(quality_score) FROM somali_sentences")
-    avg_quality = cursor.fetchone()[0] or 0
-    
-    cursor.execute("SELECT COUNT(*) FROM somali_sentences WHERE quality_score >= 90")
-    high_quality = cursor.fetchone()[0]
+    conn = connect('somali_dataset.db')
     
-    cursor.execute("SELECT source, COUNT(*) FROM somali_sentences GROUP BY source")
-    by_source = dict(cursor.fetchall())
+    stats = dataset_stats.summary(conn)
+    by_source = dataset_stats.breakdown(conn, 'source')
     
     conn.close()
     
     return {
-        "total": total,
-        "avg_quality": round(avg_quality, 1),
-        "high_quality": high_quality,
+        "total": stats["total_sentences"],
+        "avg_quality": round(stats["average_quality"], 1),
+        "high_quality": stats["top_quality"],
         "by_source": by_source
     }
 
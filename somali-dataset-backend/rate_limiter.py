@@ -0,0 +1,243 @@
+"""
+Enterprise Rate Limiter
+Per-user token buckets refilled at each plan's rate, shared by every worker process through SQLite
+"""
+
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from database import DEFAULT_DB_PATH, get_pool
+
+# Sustained requests per second and burst size of each plan; other plans get the free rate
+PLAN_RATES = {
+    "free": (1, 10),
+    "basic": (5, 50),
+    "premium": (20, 200),
+    "enterprise": (100, 1000),
+    "enterprise_plus": (500, 5000)
+}
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS buckets (
+        user_id INTEGER PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated REAL NOT NULL
+    )""",
+)
+
+def buckets_path(db_path: str) -> str:
+    """The bucket file kept next to a database: somali_dataset.db -> somali_dataset.ratelimit.db"""
+    return os.path.splitext(db_path)[0] + '.ratelimit.db'
+
+def _refill(tokens: float, updated: float, now: float, rate: float, burst: float) -> float:
+    return min(burst, tokens + max(0.0, now - updated) * rate)
+
+class RateLimiter:
+    """
+    Token bucket per user: each request takes a token, and tokens come back at
+    the plan's rate up to its burst size.
+    
+    With a bucket file (the default) the buckets live in SQLite, so every
+    uvicorn worker draws from the same bucket. A worker does not write the
+    file on every request: it leases lease_fraction of the burst at a time
+    and spends the lease in memory, handing back what is left when it
+    renews. A worker can therefore hold up to one lease of a user's tokens
+    that the others cannot use, which makes the limit slightly stricter, never
+    looser. Without a bucket file the buckets are kept in memory, exact but
+    per process.
+    """
+    
+    def __init__(self, path: Optional[str] = None, lease_fraction: float = 0.1):
+        """
+        Args:
+            path: Bucket database file; None keeps the buckets in this process
+            lease_fraction: Share of a plan's burst leased by a worker at a time
+        """
+        self.path = path
+        self.lease_fraction = lease_fraction
+        self.pool = get_pool(path) if path else None
+        self._buckets: Dict[int, Tuple[float, float]] = {}    # user id -> (tokens, updated), in memory
+        # user id -> [leased tokens left, bucket tokens at the lease, refused until, refused cost]
+        self._leases: Dict[int, list] = {}
+        self._lock = threading.Lock()   # Guards the in-memory state only; never held across I/O
+        self._renewals: Dict[int, threading.Lock] = {}  # user id -> lock serializing that user's lease renewals
+        
+        if self.pool is not None:
+            with self.pool.connection() as conn:
+                for statement in SCHEMA:
+                    conn.execute(statement)
+                conn.commit()
+    
+    @classmethod
+    def from_env(cls, db_path: str = DEFAULT_DB_PATH) -> 'RateLimiter':
+        """Build a limiter configured by RATE_LIMIT_STORE (sqlite or memory) and RATE_LIMIT_LEASE_FRACTION"""
+        
+        store = os.environ.get('RATE_LIMIT_STORE', 'sqlite').lower()
+        if store not in ('sqlite', 'memory'):
+            raise ValueError(f"RATE_LIMIT_STORE must be sqlite or memory, got {store}")
+        return cls(
+            path=buckets_path(os.path.abspath(db_path)) if store == 'sqlite' else None,
+            lease_fraction=float(os.environ.get('RATE_LIMIT_LEASE_FRACTION', 0.1))
+        )
+    
+    def _take(self, user_id: int, rate: float, burst: float, want: int, cost: int,
+              returned: float) -> Tuple[int, float]:
+        """
+        Hand back returned tokens and take up to want (at least cost, or nothing) from a user's bucket
+        
+        Returns:
+            (tokens taken, tokens left in the bucket)
+        """
+        
+        now = time.time()
+        if self.pool is None:
+            tokens, updated = self._buckets.get(user_id, (burst, now))
+            tokens = min(burst, _refill(tokens, updated, now, rate, burst) + returned)
+            taken = min(want, math.floor(tokens)) if tokens >= cost else 0
+            self._buckets[user_id] = (tokens - taken, now)
+            return taken, tokens - taken
+        
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT tokens, updated FROM buckets WHERE user_id = ?", (user_id,)).fetchone()
+                tokens = burst if row is None else _refill(row[0], row[1], now, rate, burst)
+                tokens = min(burst, tokens + returned)
+                taken = min(want, math.floor(tokens)) if tokens >= cost else 0
+                conn.execute("INSERT OR REPLACE INTO buckets (user_id, tokens, updated) VALUES (?, ?, ?)",
+                             (user_id, tokens - taken, now))
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+        return taken, tokens - taken
+    
+    def _spend_lease(self, user_id: int, cost: int, now: float) -> Optional[Tuple[bool, float]]:
+        """(allowed, remaining) decided from this worker's lease alone, or None if it needs renewing; hold _lock"""
+        
+        lease = self._leases.get(user_id)
+        if lease is not None and lease[0] >= cost:
+            lease[0] -= cost
+            return True, lease[0] + lease[1]
+        if lease is not None and now < lease[2] and cost >= lease[3]:
+            # Refused moments ago; the bucket cannot have refilled yet
+            return False, lease[0] + lease[1]
+        return None
+    
+    def acquire(self, user_id: int, plan: str, cost: int = 1, local_only: bool = False) -> Optional[Dict]:
+        """
+        Take cost tokens from a user's bucket
+        
+        Args:
+            user_id: User making the request
+            plan: The user's plan, which sets the refill rate and burst
+            cost: Tokens the request takes
+            local_only: Only spend this worker's lease; None when the bucket
+                file has to be read (call again off the event loop). Never
+                waits for a renewal in progress.
+        
+        Returns:
+            allowed, limit (the burst), remaining tokens, reset (seconds until
+            the bucket is full) and retry_after (seconds until cost tokens are
+            back, 0 if allowed)
+        """
+        
+        rate, burst = PLAN_RATES.get(plan, PLAN_RATES["free"])
+        now = time.time()
+        with self._lock:
+            decision = self._spend_lease(user_id, cost, now)
+            if decision is None and self.pool is None:
+                # In-memory buckets: no I/O, so decide under the lock
+                taken, left = self._take(user_id, rate, burst, cost, cost, 0)
+                decision = taken > 0, left
+                self._leases[user_id] = [0, left, now + (cost - left) / rate if not taken else 0.0, cost]
+            elif decision is None and local_only:
+                return None
+            renewal = self._renewals.setdefault(user_id, threading.Lock()) if decision is None else None
+        
+        if renewal is not None:
+            # The bucket file is written outside _lock: one user's renewal never holds up
+            # another user, nor the lease spending done on the event loop
+            with renewal:
+                with self._lock:
+                    decision = self._spend_lease(user_id, cost, time.time())    # Renewed while we waited?
+                    lease = self._leases.get(user_id)
+                    returned = lease[0] if decision is None and lease is not None else 0
+                    if returned:
+                        lease[0] = 0    # Handed back by the renewal below
+                if decision is None:
+                    want = max(cost, int(burst * self.lease_fraction))
+                    try:
+                        taken, left = self._take(user_id, rate, burst, want, cost, returned)
+                    except BaseException:
+                        if returned:
+                            with self._lock:
+                                self._leases[user_id][0] += returned
+                        raise
+                    allowed = taken > 0
+                    refused_until = time.time() + (cost - left) / rate if not allowed else 0.0
+                    with self._lock:
+                        self._leases[user_id] = [taken - cost if allowed else 0, left, refused_until, cost]
+                    decision = allowed, left + (taken - cost if allowed else 0)
+        
+        allowed, remaining = decision
+        return {
+            'allowed': allowed,
+            'limit': burst,
+            'remaining': max(0, math.floor(remaining)),
+            'reset': math.ceil(max(0.0, burst - remaining) / rate),
+            'retry_after': 0 if allowed else max(1, math.ceil((cost - remaining) / rate))
+        }
+
+def rate_limit_headers(decision: Dict) -> Dict[str, str]:
+    """X-RateLimit-* (and Retry-After when refused) headers of a decision"""
+    
+    headers = {
+        'X-RateLimit-Limit': str(decision['limit']),
+        'X-RateLimit-Remaining': str(decision['remaining']),
+        'X-RateLimit-Reset': str(decision['reset'])
+    }
+    if not decision['allowed']:
+        headers['Retry-After'] = str(decision['retry_after'])
+    return headers
+
+class RateLimitHeadersMiddleware:
+    """ASGI middleware adding the X-RateLimit-* headers of the request's decision (request.state.rate_limit)"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        
+        async def send_with_headers(message):
+            decision = scope.get('state', {}).get('rate_limit')
+            if message['type'] == 'http.response.start' and decision is not None:
+                headers = list(message.get('headers', []))
+                present = {name.lower() for name, _ in headers}
+                for name, value in rate_limit_headers(decision).items():
+                    if name.lower().encode('latin-1') not in present:
+                        headers.append((name.lower().encode('latin-1'), value.encode('latin-1')))
+                message = {**message, 'headers': headers}
+            await send(message)
+        
+        await self.app(scope, receive, send_with_headers)
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(db_path: str = DEFAULT_DB_PATH) -> RateLimiter:
+    """Shared limiter of a database file, configured from the environment"""
+    
+    key = os.path.abspath(db_path)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = RateLimiter.from_env(db_path)
+        return limiter
@@ -0,0 +1,614 @@
+"""
+Enterprise Database Schema
+Versioned migrations for every table of the Somali dataset database
+"""
+
+import sqlite3
+from contextlib import closing
+from typing import Callable, List, Tuple, Union
+
+from database import DEFAULT_DB_PATH, connect
+
+# Canonical sentence table; every writer (API, collectors, builders, PDF and web jobs) uses it
+SENTENCES_TABLE = '''
+    CREATE TABLE {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        text TEXT UNIQUE NOT NULL,
+        translation TEXT,
+        dialect TEXT DEFAULT 'Standard Somali',
+        quality_score REAL,
+        source TEXT,
+        category TEXT,
+        validated BOOLEAN DEFAULT FALSE,
+        scholar_approved BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        metadata TEXT
+    )
+'''
+
+SENTENCE_COLUMNS = ('id', 'text', 'translation', 'dialect', 'quality_score', 'source', 'category',
+                    'validated', 'scholar_approved', 'created_at', 'metadata')
+
+def _create_base_tables(conn: sqlite3.Connection):
+    """Version 1: the tables as the API and collectors created them before migrations"""
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            api_key TEXT UNIQUE NOT NULL,
+            plan TEXT DEFAULT 'free',
+            requests_used INTEGER DEFAULT 0,
+            requests_limit INTEGER DEFAULT 100,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_active BOOLEAN DEFAULT TRUE
+        )
+    ''')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS somali_sentences (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT UNIQUE NOT NULL,
+            translation TEXT,
+            dialect TEXT,
+            quality_score REAL,
+            source TEXT,
+            validated BOOLEAN DEFAULT FALSE,
+            scholar_approved BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            metadata TEXT
+        )
+    ''')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS quality_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sentence_id INTEGER,
+            accuracy_score REAL,
+            cultural_score REAL,
+            grammar_score REAL,
+            completeness_score REAL,
+            overall_score REAL,
+            validator_notes TEXT,
+            FOREIGN KEY (sentence_id) REFERENCES somali_sentences (id)
+        )
+    ''')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS api_usage (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            endpoint TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    
+    # Data collection
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS data_sources (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source_name TEXT UNIQUE NOT NULL,
+            source_type TEXT,
+            url TEXT,
+            is_active BOOLEAN DEFAULT TRUE,
+            last_scraped TIMESTAMP,
+            total_collected INTEGER DEFAULT 0,
+            success_rate REAL DEFAULT 0.0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS raw_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source_id INTEGER,
+            raw_text TEXT NOT NULL,
+            language_detected TEXT,
+            confidence_score REAL,
+            is_processed BOOLEAN DEFAULT FALSE,
+            is_valid BOOLEAN DEFAULT NULL,
+            collected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (source_id) REFERENCES data_sources (id)
+        )
+    ''')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS validation_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            raw_data_id INTEGER,
+            text TEXT NOT NULL,
+            validation_status TEXT DEFAULT 'pending',
+            validator_id INTEGER,
+            validation_notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            validated_at TIMESTAMP,
+            FOREIGN KEY (raw_data_id) REFERENCES raw_data (id)
+        )
+    ''')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS scholar_validations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sentence_id INTEGER,
+            scholar_email TEXT,
+            validation_score INTEGER,
+            cultural_score INTEGER,
+            grammar_score INTEGER,
+            notes TEXT,
+            approved BOOLEAN,
+            validated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (sentence_id) REFERENCES somali_sentences (id)
+        )
+    ''')
+    
+    # Religious content sources (PDF processor and web scraper)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS religious_sources (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pdf_name TEXT UNIQUE NOT NULL,
+            content_type TEXT,
+            sentences_extracted INTEGER DEFAULT 0,
+            processing_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            imam_approved BOOLEAN DEFAULT TRUE
+        )
+    ''')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS web_sources (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT UNIQUE NOT NULL,
+            title TEXT,
+            content_type TEXT,
+            sentences_extracted INTEGER DEFAULT 0,
+            scraping_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            status TEXT DEFAULT 'success'
+        )
+    ''')
+
+def _unify_sentences_table(conn: sqlite3.Connection):
+    """
+    Version 2: rebuild somali_sentences with the canonical definition
+    
+    Older databases got whichever definition the first script created, with
+    or without category and with religious-content defaults. Rows are copied
+    over; a missing category is recovered from the metadata JSON.
+    """
+    
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(somali_sentences)")}
+    columns = ', '.join(column for column in SENTENCE_COLUMNS if column in existing)
+    
+    conn.execute(SENTENCES_TABLE.format(name='somali_sentences_unified'))
+    conn.execute(f"INSERT INTO somali_sentences_unified ({columns}) SELECT {columns} FROM somali_sentences")
+    conn.execute("DROP TABLE somali_sentences")
+    conn.execute("ALTER TABLE somali_sentences_unified RENAME TO somali_sentences")
+    
+    conn.execute('''
+        UPDATE somali_sentences SET category = json_extract(metadata, '$.category')
+        WHERE category IS NULL AND json_valid(metadata) AND json_type(metadata) = 'object'
+    ''')
+
+# Secondary indexes for the hot queries in queries.py. raw_data is append-only and
+# stays unindexed so inserts stay cheap; api_usage gets only the timestamp index
+# of USAGE_ROLLUPS, which retention needs to delete old rows.
+HOT_PATH_INDEXES = (
+    # Listing order, AVG(quality_score) and quality_score >= 80
+    "CREATE INDEX IF NOT EXISTS idx_sentences_quality ON somali_sentences (quality_score)",
+    # Listing filtered on validated, in quality order; COUNT of validated rows
+    "CREATE INDEX IF NOT EXISTS idx_sentences_validated_quality ON somali_sentences (validated, quality_score)",
+    "CREATE INDEX IF NOT EXISTS idx_sentences_scholar_approved ON somali_sentences (scholar_approved)",
+    # GROUP BY dialect / source read the index in group order, no temp b-tree
+    "CREATE INDEX IF NOT EXISTS idx_sentences_dialect ON somali_sentences (dialect)",
+    "CREATE INDEX IF NOT EXISTS idx_sentences_source ON somali_sentences (source)",
+    # Recent additions window
+    "CREATE INDEX IF NOT EXISTS idx_sentences_created_at ON somali_sentences (created_at)",
+    # Admin user listing, newest first
+    "CREATE INDEX IF NOT EXISTS idx_users_created_at ON users (created_at)"
+)
+
+# Dimensions of dataset_stats: (name, key expression over a sentence row); NULL keys share the '' bucket
+STATS_DIMENSIONS = (
+    ('total', "''"),
+    ('dialect', "IFNULL({row}.dialect, '')"),
+    ('source', "IFNULL({row}.source, '')"),
+    ('category', "IFNULL({row}.category, '')")
+)
+
+def _stats_upsert(row: str, sign: int, dimension: str, key: str) -> str:
+    """Add (sign=1) or remove (sign=-1) one sentence row in one dataset_stats bucket"""
+    
+    key = key.format(row=row)
+    return f'''
+        INSERT INTO dataset_stats (dimension, value, sentences, validated, scholar_approved,
+                                   high_quality, top_quality, quality_sum, quality_count)
+        VALUES ('{dimension}', {key}, {sign}, {sign} * ({row}.validated IS 1),
+                {sign} * ({row}.scholar_approved IS 1), {sign} * IFNULL({row}.quality_score >= 80, 0),
+                {sign} * IFNULL({row}.quality_score >= 90, 0), {sign} * IFNULL({row}.quality_score, 0),
+                {sign} * ({row}.quality_score IS NOT NULL))
+        ON CONFLICT (dimension, value) DO UPDATE SET
+            sentences = sentences + excluded.sentences,
+            validated = validated + excluded.validated,
+            scholar_approved = scholar_approved + excluded.scholar_approved,
+            high_quality = high_quality + excluded.high_quality,
+            top_quality = top_quality + excluded.top_quality,
+            quality_sum = quality_sum + excluded.quality_sum,
+            quality_count = quality_count + excluded.quality_count;
+    '''
+
+# Hour bucket of sentences whose created_at is NULL or not a timestamp SQLite understands
+UNKNOWN_HOUR = '1970-01-01 00:00:00'
+
+def _hour_bucket(timestamp: str) -> str:
+    """SQL for the hour bucket of a timestamp expression, UNKNOWN_HOUR if it has none"""
+    return f"IFNULL(strftime('%Y-%m-%d %H:00:00', {timestamp}), '{UNKNOWN_HOUR}')"
+
+def _hourly_upsert(row: str, sign: int) -> str:
+    """Add or remove one sentence row in its creation-hour bucket"""
+    return f'''
+        INSERT INTO sentence_hourly (hour, sentences)
+        VALUES ({_hour_bucket(f'{row}.created_at')}, {sign})
+        ON CONFLICT (hour) DO UPDATE SET sentences = sentences + excluded.sentences;
+    '''
+
+def _stats_changes(row: str, sign: int) -> str:
+    return ''.join(_stats_upsert(row, sign, dimension, key) for dimension, key in STATS_DIMENSIONS) + _hourly_upsert(row, sign)
+
+def rollup_stats(conn: sqlite3.Connection, where: str = '1', params: tuple = ()):
+    """Add the sentences matching where to dataset_stats and sentence_hourly, one grouped upsert per bucket table"""
+    
+    for dimension, key in STATS_DIMENSIONS:
+        key = key.format(row='somali_sentences')
+        conn.execute(f'''
+            INSERT INTO dataset_stats (dimension, value, sentences, validated, scholar_approved,
+                                       high_quality, top_quality, quality_sum, quality_count)
+            SELECT '{dimension}', {key}, COUNT(*), IFNULL(SUM(validated IS 1), 0),
+                   IFNULL(SUM(scholar_approved IS 1), 0), IFNULL(SUM(quality_score >= 80), 0),
+                   IFNULL(SUM(quality_score >= 90), 0), IFNULL(SUM(quality_score), 0), COUNT(quality_score)
+            FROM somali_sentences WHERE {where} GROUP BY 2
+            ON CONFLICT (dimension, value) DO UPDATE SET
+                sentences = sentences + excluded.sentences,
+                validated = validated + excluded.validated,
+                scholar_approved = scholar_approved + excluded.scholar_approved,
+                high_quality = high_quality + excluded.high_quality,
+                top_quality = top_quality + excluded.top_quality,
+                quality_sum = quality_sum + excluded.quality_sum,
+                quality_count = quality_count + excluded.quality_count
+        ''', params)
+    conn.execute(f'''
+        INSERT INTO sentence_hourly (hour, sentences)
+        SELECT {_hour_bucket('created_at')}, COUNT(*) FROM somali_sentences WHERE {where} GROUP BY 1
+        ON CONFLICT (hour) DO UPDATE SET sentences = sentences + excluded.sentences
+    ''', params)
+
+def _create_dataset_stats(conn: sqlite3.Connection):
+    """
+    Version 4: dataset statistics kept current by triggers
+    
+    Every insert, update and delete of somali_sentences adjusts the
+    dataset_stats buckets (overall, per dialect, source and category) and the
+    hourly creation counts, so statistics are read without scanning sentences.
+    """
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS dataset_stats (
+            dimension TEXT NOT NULL,
+            value TEXT NOT NULL,
+            sentences INTEGER NOT NULL DEFAULT 0,
+            validated INTEGER NOT NULL DEFAULT 0,
+            scholar_approved INTEGER NOT NULL DEFAULT 0,
+            high_quality INTEGER NOT NULL DEFAULT 0,
+            top_quality INTEGER NOT NULL DEFAULT 0,
+            quality_sum REAL NOT NULL DEFAULT 0,
+            quality_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, value)
+        ) WITHOUT ROWID
+    ''')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sentence_hourly (
+            hour TEXT PRIMARY KEY,
+            sentences INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    
+    # Backfill from the rows already stored
+    conn.execute("DELETE FROM dataset_stats")
+    conn.execute("DELETE FROM sentence_hourly")
+    rollup_stats(conn)
+    
+    # Only the statistics queries used these; they now cost writes for nothing
+    conn.execute("DROP INDEX IF EXISTS idx_sentences_scholar_approved")
+    conn.execute("DROP INDEX IF EXISTS idx_sentences_dialect")
+    conn.execute("DROP INDEX IF EXISTS idx_sentences_source")
+    
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_sentences_stats_insert AFTER INSERT ON somali_sentences
+        BEGIN {_stats_changes('NEW', 1)} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_sentences_stats_delete AFTER DELETE ON somali_sentences
+        BEGIN {_stats_changes('OLD', -1)} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_sentences_stats_update
+        AFTER UPDATE OF dialect, source, category, validated, scholar_approved, quality_score, created_at
+        ON somali_sentences
+        BEGIN {_stats_changes('OLD', -1)} {_stats_changes('NEW', 1)} END
+    """)
+
+# Keyset listing (sentence_listing.py): each equality filter leads a composite index
+# ending in quality_score, so filtered pages walk the index in quality order
+# (the rowid appended to every index breaks ties on id)
+LISTING_INDEXES = (
+    # Whitespace-separated words; VIRTUAL so no stored bytes, indexed for range filters
+    '''ALTER TABLE somali_sentences ADD COLUMN word_count INTEGER GENERATED ALWAYS AS (
+        CASE WHEN trim(text) = '' THEN 0
+             ELSE length(trim(text)) - length(replace(trim(text), ' ', '')) + 1 END
+    ) VIRTUAL''',
+    "CREATE INDEX IF NOT EXISTS idx_sentences_word_count ON somali_sentences (word_count)",
+    "CREATE INDEX IF NOT EXISTS idx_sentences_dialect_quality ON somali_sentences (dialect, quality_score)",
+    "CREATE INDEX IF NOT EXISTS idx_sentences_source_quality ON somali_sentences (source, quality_score)",
+    "CREATE INDEX IF NOT EXISTS idx_sentences_category_quality ON somali_sentences (category, quality_score)",
+    "CREATE INDEX IF NOT EXISTS idx_sentences_scholar_quality ON somali_sentences (scholar_approved, quality_score)"
+)
+
+# Latest metrics of a sentence for the export join: MAX(id) WHERE sentence_id = ? is one seek
+EXPORT_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_quality_metrics_sentence ON quality_metrics (sentence_id)",
+)
+
+def _defer_stats_for_bulk_loads(conn: sqlite3.Connection):
+    """
+    Version 7: bulk loads roll statistics up per chunk instead of per row
+    
+    While stats_deferred has a row, the insert trigger stands aside; the bulk
+    writer sets it inside its own write transaction, inserts a chunk, adds
+    the chunk with rollup_stats and clears it before committing, so no other
+    connection ever sees it set.
+    """
+    
+    conn.execute("CREATE TABLE IF NOT EXISTS stats_deferred (id INTEGER PRIMARY KEY)")
+    conn.execute("DROP TRIGGER IF EXISTS trg_sentences_stats_insert")
+    conn.execute(f"""
+        CREATE TRIGGER trg_sentences_stats_insert AFTER INSERT ON somali_sentences
+        WHEN NOT EXISTS (SELECT 1 FROM stats_deferred)
+        BEGIN {_stats_changes('NEW', 1)} END
+    """)
+
+# Full-text index over text and translation (sentence_search.py). External content:
+# the index stores only tokens and reads the sentences back from somali_sentences,
+# and these triggers keep it in step with every insert, edit and delete
+SEARCH_INDEX = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS sentences_fts USING fts5(
+        text, translation,
+        content = 'somali_sentences', content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS trg_sentences_fts_insert AFTER INSERT ON somali_sentences BEGIN
+        INSERT INTO sentences_fts (rowid, text, translation) VALUES (NEW.id, NEW.text, NEW.translation);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_sentences_fts_delete AFTER DELETE ON somali_sentences BEGIN
+        INSERT INTO sentences_fts (sentences_fts, rowid, text, translation)
+        VALUES ('delete', OLD.id, OLD.text, OLD.translation);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_sentences_fts_update AFTER UPDATE OF text, translation ON somali_sentences BEGIN
+        INSERT INTO sentences_fts (sentences_fts, rowid, text, translation)
+        VALUES ('delete', OLD.id, OLD.text, OLD.translation);
+        INSERT INTO sentences_fts (rowid, text, translation) VALUES (NEW.id, NEW.text, NEW.translation);
+    END""",
+    # Index the sentences stored before the table existed
+    "INSERT INTO sentences_fts (sentences_fts) VALUES ('rebuild')"
+)
+
+# Write-behind usage accounting (usage_ledger.py): a row counts the requests of one
+# user to one endpoint within a second, and flushed journals are marked applied in
+# the flush transaction so a replay after a crash never counts them twice
+USAGE_LEDGER = (
+    "ALTER TABLE api_usage ADD COLUMN requests INTEGER NOT NULL DEFAULT 1",
+    "CREATE TABLE IF NOT EXISTS usage_journals_applied (name TEXT PRIMARY KEY) WITHOUT ROWID"
+)
+
+# Usage rollups (usage_rollups.py): requests per user, endpoint and UTC hour or day,
+# added by every ledger flush. The primary key serves per-user time series; the
+# endpoint index serves per-endpoint totals. Raw api_usage rows older than the
+# retention window are pruned through the timestamp index
+USAGE_ROLLUP_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {name} (
+        user_id INTEGER NOT NULL,
+        endpoint TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        requests INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, bucket, endpoint)
+    ) WITHOUT ROWID
+'''
+
+USAGE_ROLLUPS = (
+    USAGE_ROLLUP_TABLE.format(name='usage_hourly'),
+    USAGE_ROLLUP_TABLE.format(name='usage_daily'),
+    "CREATE INDEX IF NOT EXISTS idx_usage_hourly_endpoint ON usage_hourly (user_id, endpoint, bucket, requests)",
+    "CREATE INDEX IF NOT EXISTS idx_usage_daily_endpoint ON usage_daily (user_id, endpoint, bucket, requests)",
+    "CREATE INDEX IF NOT EXISTS idx_api_usage_timestamp ON api_usage (timestamp)",
+    # Roll up the usage recorded so far
+    f'''INSERT INTO usage_hourly (user_id, endpoint, bucket, requests)
+       SELECT user_id, IFNULL(endpoint, ''), {_hour_bucket('timestamp')}, SUM(requests)
+       FROM api_usage WHERE user_id IS NOT NULL GROUP BY 1, 2, 3''',
+    '''INSERT INTO usage_daily (user_id, endpoint, bucket, requests)
+       SELECT user_id, endpoint, date(bucket), SUM(requests) FROM usage_hourly GROUP BY 1, 2, 3'''
+)
+
+def _user_plan_changes(row: str, sign: int) -> str:
+    """Add (sign=1) or remove (sign=-1) one user row in its plan's user_plan_stats bucket"""
+    return f'''
+        INSERT INTO user_plan_stats (plan, users, active_users, exhausted_users, requests_used, requests_limit)
+        VALUES (IFNULL({row}.plan, ''), {sign}, {sign} * ({row}.is_active IS 1),
+                {sign} * IFNULL({row}.requests_used >= {row}.requests_limit, 0),
+                {sign} * IFNULL({row}.requests_used, 0), {sign} * IFNULL({row}.requests_limit, 0))
+        ON CONFLICT (plan) DO UPDATE SET
+            users = users + excluded.users,
+            active_users = active_users + excluded.active_users,
+            exhausted_users = exhausted_users + excluded.exhausted_users,
+            requests_used = requests_used + excluded.requests_used,
+            requests_limit = requests_limit + excluded.requests_limit;
+    '''
+
+def _create_user_listing(conn: sqlite3.Connection):
+    """
+    Version 11: admin user listing indexes and per-plan user counts kept current by triggers
+    
+    Filtered pages of the keyset listing (user_listing.py) walk a (filter,
+    created_at) index in order, and user_plan_stats answers the admin
+    summary without reading users.
+    """
+    
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_plan_created_at ON users (plan, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_active_created_at ON users (is_active, created_at)")
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_plan_stats (
+            plan TEXT PRIMARY KEY,
+            users INTEGER NOT NULL DEFAULT 0,
+            active_users INTEGER NOT NULL DEFAULT 0,
+            exhausted_users INTEGER NOT NULL DEFAULT 0,
+            requests_used INTEGER NOT NULL DEFAULT 0,
+            requests_limit INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    
+    # Backfill from the users already stored
+    conn.execute("DELETE FROM user_plan_stats")
+    conn.execute('''
+        INSERT INTO user_plan_stats (plan, users, active_users, exhausted_users, requests_used, requests_limit)
+        SELECT IFNULL(plan, ''), COUNT(*), IFNULL(SUM(is_active IS 1), 0),
+               IFNULL(SUM(requests_used >= requests_limit), 0), IFNULL(SUM(requests_used), 0),
+               IFNULL(SUM(requests_limit), 0)
+        FROM users GROUP BY 1
+    ''')
+    
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_users_plan_stats_insert AFTER INSERT ON users
+        BEGIN {_user_plan_changes('NEW', 1)} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_users_plan_stats_delete AFTER DELETE ON users
+        BEGIN {_user_plan_changes('OLD', -1)} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_users_plan_stats_update
+        AFTER UPDATE OF plan, is_active, requests_used, requests_limit ON users
+        BEGIN {_user_plan_changes('OLD', -1)} {_user_plan_changes('NEW', 1)} END
+    """)
+
+def _bucket_unknown_hours(conn: sqlite3.Connection):
+    """
+    Version 12: sentences without a usable created_at count in the UNKNOWN_HOUR bucket
+    
+    The statistics triggers put a sentence in the hour bucket of its
+    created_at, which is NULL when created_at is NULL or not a timestamp, and
+    the NOT NULL hour then failed the sentence insert itself. Recreates the
+    triggers of versions 4 and 7 with the bucket falling back to UNKNOWN_HOUR.
+    """
+    
+    for trigger in ('insert', 'delete', 'update'):
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_sentences_stats_{trigger}")
+    conn.execute(f"""
+        CREATE TRIGGER trg_sentences_stats_insert AFTER INSERT ON somali_sentences
+        WHEN NOT EXISTS (SELECT 1 FROM stats_deferred)
+        BEGIN {_stats_changes('NEW', 1)} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER trg_sentences_stats_delete AFTER DELETE ON somali_sentences
+        BEGIN {_stats_changes('OLD', -1)} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER trg_sentences_stats_update
+        AFTER UPDATE OF dialect, source, category, validated, scholar_approved, quality_score, created_at
+        ON somali_sentences
+        BEGIN {_stats_changes('OLD', -1)} {_stats_changes('NEW', 1)} END
+    """)
+
+# Cross-process API key cache invalidation (api_key_cache.py): every change to what a
+# cached user record holds, by any process or tool, appends the user's id here, and
+# every server process polls the rows past the last id it has seen
+API_KEY_INVALIDATIONS = (
+    '''CREATE TABLE IF NOT EXISTS api_key_invalidations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''',
+    """CREATE TRIGGER IF NOT EXISTS trg_users_key_invalidation_update
+    AFTER UPDATE OF api_key, is_active, plan, requests_limit ON users
+    WHEN OLD.api_key IS NOT NEW.api_key OR OLD.is_active IS NOT NEW.is_active
+        OR OLD.plan IS NOT NEW.plan OR OLD.requests_limit IS NOT NEW.requests_limit
+    BEGIN
+        INSERT INTO api_key_invalidations (user_id) VALUES (NEW.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_users_key_invalidation_delete AFTER DELETE ON users BEGIN
+        INSERT INTO api_key_invalidations (user_id) VALUES (OLD.id);
+    END"""
+)
+
+# (version, description, step); a step is a function or a tuple of SQL statements
+MIGRATIONS: List[Tuple[int, str, Union[Callable[[sqlite3.Connection], None], Tuple[str, ...]]]] = [
+    (1, 'base tables', _create_base_tables),
+    (2, 'canonical somali_sentences with category', _unify_sentences_table),
+    (3, 'hot path indexes', HOT_PATH_INDEXES),
+    (4, 'trigger-maintained dataset statistics', _create_dataset_stats),
+    (5, 'word_count column and listing indexes', LISTING_INDEXES),
+    (6, 'quality_metrics sentence index', EXPORT_INDEXES),
+    (7, 'statistics deferred during bulk loads', _defer_stats_for_bulk_loads),
+    (8, 'full-text search index', SEARCH_INDEX),
+    (9, 'aggregated api_usage rows and usage journals', USAGE_LEDGER),
+    (10, 'hourly and daily usage rollups', USAGE_ROLLUPS),
+    (11, 'user listing indexes and per-plan user statistics', _create_user_listing),
+    (12, 'statistics triggers tolerate sentences without a created_at', _bucket_unknown_hours),
+    (13, 'API key cache invalidations shared between processes', API_KEY_INVALIDATIONS)
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    """Migration version recorded in the database file"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Bring a database up to LATEST_VERSION
+    
+    Pending migrations run in one write transaction, so concurrent processes
+    starting at once migrate the file exactly once and never see half a schema.
+    
+    Returns:
+        The schema version after migrating
+    """
+    
+    if schema_version(conn) >= LATEST_VERSION:
+        return schema_version(conn)
+    
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        current = schema_version(conn)  # Another process may have migrated while we waited
+        for version, description, step in MIGRATIONS:
+            if version <= current:
+                continue
+            if callable(step):
+                step(conn)
+            else:
+                for statement in step:
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {version}")
+            current = version
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    
+    return current
+
+def init_database(db_path: str = DEFAULT_DB_PATH) -> int:
+    """Create or upgrade the database at db_path; returns its schema version"""
+    
+    with closing(connect(db_path)) as conn:
+        return migrate(conn)
@@ -0,0 +1,838 @@
+#!/usr/bin/env python3
+"""
+Enterprise Segment Store
+Partitioned sentence storage: segment files per source and time bucket behind one dedupe index and query router
+"""
+
+import argparse
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import dataset_export
+import dataset_stats
+import sentence_search
+from bulk_writer import DEFAULT_CHUNK_SIZE, SentenceWriter
+from database import DEFAULT_DB_PATH, DEFAULT_PRAGMAS, ConnectionPool, get_pool
+from near_duplicates import database_path, get_index, index_path
+from schema import init_database
+from sentence_listing import check_listing, decode_cursor, encode_cursor, fetch_page
+
+# Global sentence id: the segment id above the low SEGMENT_SHIFT bits, which hold the
+# segment's own row id. The main database is segment 0, so its ids are unchanged;
+# every id stays below 2**53 and is exact in JSON
+SEGMENT_SHIFT = 36
+MAX_SEGMENTS = 2 ** (53 - SEGMENT_SHIFT)
+
+# Sentences after which a segment is sealed and its source starts a new one
+DEFAULT_MAX_SENTENCES = 50000000
+
+# Segment pools open at once (SEGMENT_OPEN_POOLS) and connections per pool (SEGMENT_POOL_SIZE).
+# A fan-out read touches every segment one after the other, so each needs few
+# connections, with a smaller page cache and mmap than the main database's
+DEFAULT_OPEN_POOLS = 16
+DEFAULT_POOL_SIZE = 2
+SEGMENT_PRAGMAS = dict(DEFAULT_PRAGMAS, cache_size=-8192, mmap_size=33554432)   # 8 MiB cache, 32 MiB mmap
+
+# Time bucket -> strftime format of the ingestion date
+BUCKETS = {'year': '%Y', 'month': '%Y-%m', 'day': '%Y-%m-%d'}
+
+CATALOG_VERSION = 1
+
+CATALOG_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS segments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        source TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        sentences INTEGER NOT NULL DEFAULT 0,
+        sealed BOOLEAN NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_segments_open ON segments(source, bucket) WHERE sealed = 0",
+    # 64-bit hash of every stored text -> segment holding it; the rowid table is the index
+    '''
+    CREATE TABLE IF NOT EXISTS sentence_hashes (
+        hash INTEGER PRIMARY KEY,
+        segment_id INTEGER NOT NULL
+    )
+    '''
+)
+
+OPEN_SEGMENT = '''
+    SELECT id, source, bucket FROM segments
+    WHERE source = ? AND bucket = ? AND sealed = 0
+    ORDER BY id DESC LIMIT 1
+'''
+
+def text_hash(text: str) -> int:
+    """64-bit BLAKE2b of a text, as a signed SQLite integer"""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+def split_id(global_id: int) -> Tuple[int, int]:
+    """(segment id, row id in the segment) of a global sentence id"""
+    return global_id >> SEGMENT_SHIFT, global_id & ((1 << SEGMENT_SHIFT) - 1)
+
+def segment_directory(db_path: str) -> str:
+    """Directory of a database's segments: somali_dataset.db -> somali_dataset.segments"""
+    return os.path.splitext(db_path)[0] + '.segments'
+
+def _slug(source: str) -> str:
+    return re.sub(r'[^a-z0-9]+', '-', source.lower()).strip('-')[:40] or 'unknown'
+
+def _quality_key(row: Dict) -> tuple:
+    # sort='quality' order over global ids: best first, ties newest first, unscored rows last
+    if row['quality_score'] is None:
+        return 1, 0, -row['id']
+    return 0, -row['quality_score'], -row['id']
+
+class Segment:
+    """One segment file: a database with the full schema, whose row ids are offset by id_base"""
+    
+    def __init__(self, id: int, path: str, source: Optional[str] = None, bucket: Optional[str] = None):
+        self.id = id
+        self.path = path
+        self.source = source
+        self.bucket = bucket
+        self.id_base = id << SEGMENT_SHIFT
+    
+    def global_id(self, local_id: int) -> int:
+        """Global id of one of the segment's rows"""
+        return self.id_base + local_id
+    
+    def __repr__(self) -> str:
+        return f"Segment({self.id}, {self.path!r})"
+
+class SegmentStore:
+    """
+    Sentences spread over segment files, with a catalog of the segments and a hash of every stored text.
+    
+    New sentences go to the open segment of their source and ingestion time
+    bucket (a month by default). Each segment is a complete database, so its
+    UNIQUE text index, statistics and near-duplicate index stay bounded by
+    max_sentences however large the corpus grows, and a sealed segment
+    can be vacuumed, backed up or archived on its own. The main database is
+    segment 0 and keeps its sentences and ids.
+    
+    A text is claimed in sentence_hashes before it is inserted, so an exact
+    duplicate of a sentence in any segment is skipped; near-duplicates are
+    detected within a segment. The router methods (list_sentences,
+    search_sentences, summary, breakdown, export_stream,
+    near_duplicate_report) read every segment and merge the results.
+    
+    Usage:
+        store = get_segment_store(db_path)
+        with open_sentence_writer(conn, ('text', 'source')) as writer:
+            writer.add((text, 'imam_approved_pdf'))
+        rows, next_cursor = store.list_sentences({}, sort='quality')
+    """
+    
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, max_sentences: Optional[int] = None,
+                 bucket: Optional[str] = None):
+        """
+        Args:
+            db_path: Main database; the segments live in segment_directory(db_path)
+            max_sentences: Sentences per segment (default SEGMENT_MAX_SENTENCES, else DEFAULT_MAX_SENTENCES)
+            bucket: 'year', 'month' or 'day' (default SEGMENT_BUCKET, else 'month')
+        """
+        bucket = bucket or os.environ.get('SEGMENT_BUCKET', 'month')
+        if bucket not in BUCKETS:
+            raise ValueError(f"Unknown segment bucket: {bucket}. Use one of: {', '.join(BUCKETS)}")
+        self.db_path = os.path.abspath(db_path)
+        self.directory = segment_directory(self.db_path)
+        self.catalog_path = os.path.join(self.directory, 'catalog.db')
+        self.max_sentences = max_sentences or int(os.environ.get('SEGMENT_MAX_SENTENCES', DEFAULT_MAX_SENTENCES))
+        self.bucket_format = BUCKETS[bucket]
+        self.main = Segment(0, self.db_path)
+        self.max_pools = int(os.environ.get('SEGMENT_OPEN_POOLS', DEFAULT_OPEN_POOLS))
+        self.pool_size = int(os.environ.get('SEGMENT_POOL_SIZE', DEFAULT_POOL_SIZE))
+        
+        self._pools: 'OrderedDict[str, ConnectionPool]' = OrderedDict()   # File -> pool, least recently used first
+        self._pools_lock = threading.Lock()
+        
+        os.makedirs(self.directory, exist_ok=True)
+        init_database(self.db_path)
+        self.catalog = get_pool(self.catalog_path)
+        
+        with self.catalog.connection() as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] < CATALOG_VERSION:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if conn.execute("PRAGMA user_version").fetchone()[0] < CATALOG_VERSION:
+                        for statement in CATALOG_SCHEMA:
+                            conn.execute(statement)
+                        # The main database's sentences count as stored from the start
+                        self._register(conn, self.main)
+                        conn.execute(f"PRAGMA user_version = {CATALOG_VERSION}")
+                    conn.commit()
+                except sqlite3.Error:
+                    conn.rollback()
+                    raise
+    
+    def _segment(self, row: sqlite3.Row) -> Segment:
+        path = os.path.join(self.directory, f"{row['id']:06d}-{_slug(row['source'])}-{row['bucket']}.db")
+        return Segment(row['id'], path, row['source'], row['bucket'])
+    
+    def pool(self, segment: Segment) -> ConnectionPool:
+        """
+        Connection pool of a segment
+        
+        The main database uses its shared pool. Other segments get small pools
+        of their own, of which at most max_pools stay open: the least recently
+        used is closed when another is needed, so connections, page caches and
+        file descriptors do not grow with the number of segments.
+        """
+        
+        if segment.id == 0:
+            return get_pool(self.db_path)
+        return self._file_pool(segment.path)
+    
+    def _file_pool(self, path: str) -> ConnectionPool:
+        """Small pool of a segment file (or its near-duplicate index), among the max_pools kept open"""
+        
+        with self._pools_lock:
+            pool = self._pools.get(path)
+            if pool is not None:
+                self._pools.move_to_end(path)
+                return pool
+            pool = self._pools[path] = ConnectionPool(path, max_connections=self.pool_size, pragmas=SEGMENT_PRAGMAS)
+            evicted = []
+            while len(self._pools) > self.max_pools:
+                evicted.append(self._pools.popitem(last=False)[1])
+        for stale in evicted:
+            stale.close()
+        return pool
+    
+    def close(self):
+        """Close every segment pool; they are reopened on next use"""
+        
+        with self._pools_lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            pool.close()
+    
+    def segments(self) -> List[Segment]:
+        """Every segment, the main database first, in id order"""
+        
+        with self.catalog.connection() as conn:
+            rows = conn.execute("SELECT id, source, bucket FROM segments ORDER BY id").fetchall()
+        return [self.main] + [self._segment(row) for row in rows]
+    
+    def segment(self, segment_id: int) -> Optional[Segment]:
+        """A segment by id, or None"""
+        
+        if segment_id == 0:
+            return self.main
+        with self.catalog.connection() as conn:
+            row = conn.execute("SELECT id, source, bucket FROM segments WHERE id = ?", (segment_id,)).fetchone()
+        return self._segment(row) if row else None
+    
+    def locate(self, global_id: int) -> Optional[Tuple[Segment, int]]:
+        """Segment and local row id of a global sentence id, or None for an unknown segment"""
+        
+        segment_id, local_id = split_id(global_id)
+        segment = self.segment(segment_id)
+        return (segment, local_id) if segment else None
+    
+    def segment_for(self, source: Optional[str], when: Optional[datetime] = None) -> Segment:
+        """
+        The open segment for new sentences of a source, created on first use
+        
+        Creating the segment of a new time bucket seals the source's earlier
+        ones.
+        """
+        
+        source = source or ''
+        bucket = (when or datetime.now(timezone.utc)).strftime(self.bucket_format)
+        with self.catalog.connection() as conn:
+            row = conn.execute(OPEN_SEGMENT, (source, bucket)).fetchone()
+            if row is not None:
+                return self._segment(row)
+            
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(OPEN_SEGMENT, (source, bucket)).fetchone()
+                if row is None:
+                    conn.execute("UPDATE segments SET sealed = 1 WHERE source = ? AND bucket < ? AND sealed = 0",
+                                 (source, bucket))
+                    segment_id = conn.execute("INSERT INTO segments (source, bucket) VALUES (?, ?)",
+                                              (source, bucket)).lastrowid
+                    if segment_id >= MAX_SEGMENTS:
+                        raise ValueError(f"Segment store is full ({MAX_SEGMENTS - 1} segments)")
+                    row = conn.execute("SELECT id, source, bucket FROM segments WHERE id = ?",
+                                       (segment_id,)).fetchone()
+                    # Created inside the catalog transaction: nobody sees the segment before its schema
+                    init_database(self._segment(row).path)
+                conn.commit()
+            except (sqlite3.Error, ValueError):
+                conn.rollback()
+                raise
+        return self._segment(row)
+    
+    def claim(self, segment: Segment, texts: Sequence[str]) -> List[bool]:
+        """
+        Claim texts for a segment before inserting them
+        
+        Returns, for each text, False if it is already stored (or claimed) in
+        any segment or repeated earlier in texts, else True: the text now
+        belongs to segment. Release the claimed texts that end up not being
+        inserted.
+        
+        Hashes are trusted without comparing texts: with 64-bit hashes a
+        billion-sentence corpus has about a 3% chance of skipping a single
+        unique sentence as a collision.
+        """
+        
+        hashes = [text_hash(text) for text in texts]
+        with self.catalog.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                stored = {row[0] for row in conn.execute(
+                    "SELECT hash FROM sentence_hashes WHERE hash IN (SELECT value FROM json_each(?))",
+                    (json.dumps(hashes),)
+                )}
+                claimed = []
+                for value in hashes:
+                    claimed.append(value not in stored)
+                    stored.add(value)
+                # In key order, so the inserts walk the b-tree instead of seeking all over it
+                conn.executemany("INSERT INTO sentence_hashes (hash, segment_id) VALUES (?, ?)",
+                                 [(value, segment.id) for value in sorted(
+                                     value for value, new in zip(hashes, claimed) if new
+                                 )])
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+        return claimed
+    
+    def release(self, segment: Segment, texts: Iterable[str]):
+        """Give up a segment's claim on texts (not inserted, or deleted)"""
+        
+        rows = [(text_hash(text), segment.id) for text in texts]
+        if not rows:
+            return
+        with self.catalog.connection() as conn:
+            conn.executemany("DELETE FROM sentence_hashes WHERE hash = ? AND segment_id = ?", rows)
+            conn.commit()
+    
+    def added(self, segment: Segment, sentences: int):
+        """Count sentences inserted into (or, negative, deleted from) a segment, sealing it once full"""
+        
+        if segment.id == 0 or not sentences:
+            return
+        with self.catalog.connection() as conn:
+            conn.execute('''
+                UPDATE segments SET sentences = sentences + ?1, sealed = sealed OR sentences + ?1 >= ?2
+                WHERE id = ?3
+            ''', (sentences, self.max_sentences, segment.id))
+            conn.commit()
+    
+    def insert(self, source: Optional[str], text: str, write: Callable[[sqlite3.Connection], int]) -> int:
+        """
+        Store one sentence: write(conn) inserts it into the segment's database and returns its row id
+        
+        Returns:
+            The sentence's global id
+        
+        Raises:
+            sqlite3.IntegrityError: The text is already stored
+        """
+        
+        segment = self.segment_for(source)
+        if not self.claim(segment, [text])[0]:
+            raise sqlite3.IntegrityError("UNIQUE constraint failed: somali_sentences.text")
+        try:
+            with self.pool(segment).connection() as conn:
+                local_id = write(conn)
+        except BaseException:
+            self.release(segment, [text])
+            raise
+        self.added(segment, 1)
+        return segment.global_id(local_id)
+    
+    def run(self, global_id: int, func: Callable, *args, **kwargs):
+        """func(local_id, *args, conn=<segment connection>, **kwargs) for a sentence's segment; None if there is none"""
+        
+        located = self.locate(global_id)
+        if located is None:
+            return None
+        segment, local_id = located
+        with self.pool(segment).connection() as conn:
+            return func(local_id, *args, conn=conn, **kwargs)
+    
+    def delete(self, global_id: int) -> bool:
+        """Delete a sentence and release its text; False if there is none"""
+        
+        located = self.locate(global_id)
+        if located is None:
+            return False
+        segment, local_id = located
+        with self.pool(segment).connection() as conn:
+            row = conn.execute("SELECT text FROM somali_sentences WHERE id = ?", (local_id,)).fetchone()
+            if row is None:
+                return False
+            conn.execute("DELETE FROM somali_sentences WHERE id = ?", (local_id,))
+            conn.commit()
+        self.release(segment, [row[0]])
+        self.added(segment, -1)
+        return True
+    
+    def _register(self, conn: sqlite3.Connection, segment: Segment, chunk_size: int = 50000) -> int:
+        """Add the hashes of a segment's texts in the catalog transaction of conn; returns the sentences read"""
+        
+        sentences, after_id = 0, 0
+        with self.pool(segment).connection() as segment_conn:
+            while True:
+                rows = segment_conn.execute(
+                    "SELECT id, text FROM somali_sentences WHERE id > ? ORDER BY id LIMIT ?", (after_id, chunk_size)
+                ).fetchall()
+                if not rows:
+                    return sentences
+                # First come, first kept: a text stored twice stays with the older segment
+                conn.executemany("INSERT OR IGNORE INTO sentence_hashes (hash, segment_id) VALUES (?, ?)",
+                                 sorted((text_hash(row[1]), segment.id) for row in rows))
+                sentences += len(rows)
+                after_id = rows[-1][0]
+    
+    def rebuild(self) -> Dict:
+        """
+        Recreate sentence_hashes and the segment counts from the segments
+        
+        For texts left claimed by a writer that was killed between claiming
+        and inserting them, or segment files changed by hand. Holds the
+        catalog write lock, so ingestion waits until it is done.
+        """
+        
+        segments = self.segments()
+        with self.catalog.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM sentence_hashes")
+                sentences = 0
+                for segment in segments:
+                    count = self._register(conn, segment)
+                    if segment.id:
+                        conn.execute("UPDATE segments SET sentences = ? WHERE id = ?", (count, segment.id))
+                    sentences += count
+                hashes = conn.execute("SELECT COUNT(*) FROM sentence_hashes").fetchone()[0]
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+        return {'segments': len(segments), 'sentences': sentences, 'hashes': hashes}
+    
+    def status(self) -> List[Dict]:
+        """Catalog entry and file size of every segment, the main database first"""
+        
+        with get_pool(self.db_path).connection() as conn:
+            main = {'id': 0, 'source': None, 'bucket': None, 'sentences': dataset_stats.totals(conn)['sentences'],
+                    'sealed': False, 'created_at': None}
+        with self.catalog.connection() as conn:
+            segments = [main] + [dict(row) for row in conn.execute(
+                "SELECT id, source, bucket, sentences, sealed, created_at FROM segments ORDER BY id"
+            )]
+        for segment in segments:
+            path = self.main.path if segment['id'] == 0 else self._segment(segment).path
+            segment['sealed'] = bool(segment['sealed'])
+            segment['bytes'] = os.path.getsize(path) if os.path.exists(path) else 0
+        return segments
+    
+    # Query router
+    
+    def _connection(self, segment: Segment, conn: Optional[sqlite3.Connection]):
+        # conn, as passed by AsyncDatabase.run, is a connection to the main database
+        return self.pool(segment).connection(conn if segment.id == 0 else None)
+    
+    def _page(self, segment: Segment, conn: Optional[sqlite3.Connection], filters: Dict, sort: str,
+              after: Optional[tuple], limit: int) -> List[Dict]:
+        with self._connection(segment, conn) as segment_conn:
+            rows = fetch_page(segment_conn, filters, sort, after, limit)
+        for row in rows:
+            row['id'] += segment.id_base
+        return rows
+    
+    @staticmethod
+    def _quality_after(after: Optional[tuple], segment: Segment) -> Optional[tuple]:
+        """A segment's local keyset position for a global sort='quality' cursor"""
+        
+        if after is None:
+            return None
+        quality, global_id = after
+        segment_id, local_id = split_id(global_id)
+        if segment.id == segment_id:
+            return quality, local_id
+        # Ties come newest (highest global id) first: a later segment's ties are
+        # all before the cursor, an earlier one's all after it
+        return quality, 0 if segment.id > segment_id else 1 << SEGMENT_SHIFT
+    
+    def list_sentences(self, filters: Dict, sort: str = 'quality', cursor: Optional[str] = None, limit: int = 10,
+                       conn: Optional[sqlite3.Connection] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        sentence_listing.list_sentences over every segment, with global ids and cursors
+        
+        sort='id' walks the segments in order; sort='quality' reads a page
+        from every segment and merges them, so a page costs one bounded index
+        read per segment.
+        """
+        
+        check_listing(filters, sort)
+        after = decode_cursor(cursor, sort) if cursor else None
+        segments = self.segments()
+        
+        if sort == 'id':
+            start_segment, start_id = split_id(after[0]) if after else (0, 0)
+            rows = []
+            for segment in segments:
+                if segment.id < start_segment:
+                    continue
+                position = (start_id if segment.id == start_segment else 0,)
+                rows += self._page(segment, conn, filters, sort, position, limit - len(rows))
+                if len(rows) == limit:
+                    break
+        else:
+            pages = [self._page(segment, conn, filters, sort, self._quality_after(after, segment), limit)
+                     for segment in segments]
+            rows = list(itertools.islice(heapq.merge(*pages, key=_quality_key), limit))
+        
+        next_cursor = encode_cursor(sort, rows[-1]) if len(rows) == limit else None
+        return rows, next_cursor
+    
+    def summary(self, conn: Optional[sqlite3.Connection] = None) -> Dict:
+        """dataset_stats.summary over every segment"""
+        
+        totals = dict.fromkeys(dataset_stats.TOTAL_COLUMNS, 0)
+        for segment in self.segments():
+            with self._connection(segment, conn) as segment_conn:
+                for column, value in dataset_stats.totals(segment_conn).items():
+                    totals[column] += value or 0
+        return dataset_stats.summarize(totals)
+    
+    def breakdown(self, dimension: str, conn: Optional[sqlite3.Connection] = None) -> Dict[Optional[str], int]:
+        """dataset_stats.breakdown over every segment"""
+        
+        counts = {}
+        for segment in self.segments():
+            with self._connection(segment, conn) as segment_conn:
+                for value, sentences in dataset_stats.breakdown(segment_conn, dimension).items():
+                    counts[value] = counts.get(value, 0) + sentences
+        return counts
+    
+    def recent_additions(self, hours: int = 24, conn: Optional[sqlite3.Connection] = None) -> int:
+        """dataset_stats.recent_additions over every segment"""
+        
+        total = 0
+        for segment in self.segments():
+            with self._connection(segment, conn) as segment_conn:
+                total += dataset_stats.recent_additions(segment_conn, hours)
+        return total
+    
+    def export_stream(self, filters: Dict, fmt: str = 'jsonl', compression: Optional[str] = None,
+                      chunk_size: int = dataset_export.DEFAULT_CHUNK_SIZE,
+                      conn: Optional[sqlite3.Connection] = None) -> Iterator[bytes]:
+        """
+        dataset_export.export_stream over every segment, in global id order
+        
+        Segments created after the export starts are not included.
+        """
+        
+        dataset_export.check_export(filters, fmt, compression, chunk_size)
+        chunks = itertools.chain.from_iterable(
+            dataset_export.export_chunks(filters, chunk_size, conn if segment.id == 0 else None,
+                                         segment.path, segment.id_base, self.pool(segment))
+            for segment in self.segments()
+        )
+        return dataset_export.encode_chunks(chunks, fmt, compression)
+    
+    @staticmethod
+    def _search_after(after: Optional[tuple], sort: str, segment: Segment) -> Optional[tuple]:
+        """A segment's local keyset position for a global search cursor; False if no match of it is left"""
+        
+        if after is None:
+            return None
+        segment_id, local_id = split_id(after[-1])
+        if sort == 'newest':
+            # Newest first: a later segment's matches all come before the cursor, an earlier one's after it
+            if segment.id == segment_id:
+                return (local_id,)
+            return None if segment.id < segment_id else False
+        bm25 = after[0]
+        if segment.id == segment_id:
+            return bm25, local_id
+        # Equal scores go to the lower global id: a later segment's ties are all after the cursor
+        return bm25, 0 if segment.id > segment_id else 1 << SEGMENT_SHIFT
+    
+    def search_sentences(self, query: str, filters: Dict, sort: str = 'rank', cursor: Optional[str] = None,
+                         limit: int = 10, rank_window: Optional[int] = None,
+                         conn: Optional[sqlite3.Connection] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        sentence_search.search_sentences over every segment, with global ids and cursors
+        
+        Reads a page of matches from every segment and merges them by BM25,
+        then global id (sort='rank'), or newest first; snippets are read for
+        the merged page only. Each segment scores with its own term
+        statistics, and a rank_window applies to each segment.
+        """
+        
+        sentence_search.check_search(query, filters, sort)
+        after = sentence_search.decode_cursor(cursor, sort) if cursor else None
+        
+        pages = []
+        for segment in self.segments():
+            position = self._search_after(after, sort, segment)
+            if position is False:
+                continue
+            with self._connection(segment, conn) as segment_conn:
+                matches = sentence_search.fetch_matches(segment_conn, query, filters, sort, position, limit,
+                                                        rank_window)
+            pages.append([(match['bm25'], segment.global_id(match['id']), segment, match) for match in matches])
+        
+        key = (lambda entry: entry[:2]) if sort == 'rank' else (lambda entry: -entry[1])
+        merged = list(itertools.islice(heapq.merge(*pages, key=key), limit))
+        
+        found = {}
+        for segment, entries in itertools.groupby(sorted(merged, key=lambda entry: entry[1]),
+                                                  key=lambda entry: entry[2]):
+            with self._connection(segment, conn) as segment_conn:
+                rows = sentence_search.fetch_results(segment_conn, query, [entry[3] for entry in entries])
+            for local_id, result in rows.items():
+                result['id'] = segment.global_id(local_id)
+                found[result['id']] = result
+        results = [found[global_id] for _, global_id, _, _ in merged if global_id in found]
+        
+        next_cursor = None
+        if len(merged) == limit:
+            next_cursor = sentence_search.encode_cursor(sort, merged[-1][0], merged[-1][1])
+        return results, next_cursor
+    
+    def rank_window_truncated(self, query: str, filters: Dict, rank_window: int,
+                              conn: Optional[sqlite3.Connection] = None) -> bool:
+        """sentence_search.rank_window_truncated for any segment"""
+        
+        for segment in self.segments():
+            with self._connection(segment, conn) as segment_conn:
+                if sentence_search.rank_window_truncated(segment_conn, query, filters, rank_window):
+                    return True
+        return False
+    
+    def near_duplicate_report(self, limit: int = 50, conn: Optional[sqlite3.Connection] = None) -> Optional[Dict]:
+        """
+        NearDuplicateIndex.clusters over every segment's index, with global ids; None when detection is off
+        
+        Near-duplicates are detected within a segment, so every cluster
+        belongs to one segment.
+        """
+        
+        report = {'threshold': None, 'near_duplicates': 0, 'clusters': 0, 'largest': []}
+        for segment in self.segments():
+            path = index_path(segment.path)
+            if segment.id and not os.path.exists(path):
+                continue    # Nothing went through near-duplicate detection in this segment
+            index = get_index(segment.path, pool=self._file_pool(path) if segment.id else None)
+            if index is None:
+                return None     # Off for every segment: the main database comes first
+            with self._connection(segment, conn) as segment_conn:
+                clusters = index.clusters(segment_conn, limit)
+            report['threshold'] = clusters['threshold']
+            report['near_duplicates'] += clusters['near_duplicates']
+            report['clusters'] += clusters['clusters']
+            for cluster in clusters['largest']:
+                cluster['sentence']['id'] = segment.global_id(cluster['sentence']['id'])
+                for example in cluster['examples']:
+                    if example['duplicate_id'] is not None:
+                        example['duplicate_id'] = segment.global_id(example['duplicate_id'])
+                report['largest'].append(cluster)
+        
+        report['largest'].sort(key=lambda cluster: (-cluster['near_duplicates'], cluster['sentence']['id']))
+        del report['largest'][limit:]
+        return report
+
+class SegmentedWriter:
+    """
+    SentenceWriter counterpart for a segment store: each chunk goes to the open segments of its rows' sources.
+    
+    A chunk first claims its texts, so those stored in any segment (or
+    repeated within the import) are counted in duplicates without touching
+    a segment; the new ones are written through a SentenceWriter on their
+    segment, and the claims of texts it drops as near-duplicates are
+    released. Every chunk costs the same however many segments there are.
+    """
+    
+    def __init__(self, store: SegmentStore, columns: Sequence[str], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 near_duplicate_threshold: Optional[float] = None):
+        """
+        Args:
+            store: Segment store to write to
+            columns: Column names, in the order of every added row; must include 'text'
+            chunk_size: Rows per chunk
+            near_duplicate_threshold: As for SentenceWriter, applied within each segment
+        """
+        self.store = store
+        self.columns = tuple(columns)
+        self.chunk_size = chunk_size
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self._text = self.columns.index('text')
+        self._source = self.columns.index('source') if 'source' in self.columns else None
+        
+        self._buffer: List[Sequence] = []
+        self.written = 0            # Rows sent to the segments or skipped as stored, in committed chunks
+        self.inserted = 0           # Of those, rows actually inserted
+        self.near_duplicates = 0    # Rows dropped as near-duplicates in committed chunks
+    
+    @property
+    def duplicates(self) -> int:
+        """Committed rows skipped as already stored"""
+        return self.written - self.inserted
+    
+    def add(self, row: Sequence):
+        """Queue one row, writing a chunk once chunk_size rows are buffered"""
+        
+        self._buffer.append(row)
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+    
+    def add_many(self, rows: Iterable[Sequence]):
+        """Queue several rows"""
+        
+        for row in rows:
+            self.add(row)
+    
+    def flush(self) -> int:
+        """
+        Write the buffered rows, one transaction per segment
+        
+        Returns:
+            Rows inserted by this chunk
+        """
+        
+        if not self._buffer:
+            return 0
+        rows, self._buffer = self._buffer, []
+        
+        by_source: Dict[Optional[str], List[Sequence]] = {}
+        for row in rows:
+            by_source.setdefault(row[self._source] if self._source is not None else None, []).append(row)
+        
+        inserted = 0
+        for source, source_rows in by_source.items():
+            segment = self.store.segment_for(source)
+            claimed = self.store.claim(segment, [row[self._text] for row in source_rows])
+            new_rows = [row for row, new in zip(source_rows, claimed) if new]
+            texts = [row[self._text] for row in new_rows]
+            
+            try:
+                with self.store.pool(segment).connection() as conn:
+                    writer = SentenceWriter(conn, self.columns, max(len(new_rows), 1), self.near_duplicate_threshold)
+                    writer.add_many(new_rows)
+                    writer.flush()
+                    dropped = []
+                    if writer.inserted < len(texts):
+                        stored = {row[0] for row in conn.execute(
+                            "SELECT text FROM somali_sentences WHERE text IN (SELECT value FROM json_each(?))",
+                            (json.dumps(texts),)
+                        )}
+                        dropped = [text for text in texts if text not in stored]
+            except BaseException:
+                self.store.release(segment, texts)
+                raise
+            
+            self.store.release(segment, dropped)
+            self.store.added(segment, writer.inserted)
+            self.written += len(source_rows) - writer.near_duplicates
+            self.inserted += writer.inserted
+            self.near_duplicates += writer.near_duplicates
+            inserted += writer.inserted
+        return inserted
+    
+    def __enter__(self) -> 'SegmentedWriter':
+        return self
+    
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.flush()
+        else:
+            self._buffer = []   # Abandon the unwritten rows; committed chunks are kept
+        return False
+
+_stores: Dict[str, Optional[SegmentStore]] = {}
+_stores_lock = threading.Lock()
+
+def get_segment_store(db_path: Optional[str] = DEFAULT_DB_PATH,
+                      create: Optional[bool] = None) -> Optional[SegmentStore]:
+    """
+    The segment store of a database file, or None in single-file mode
+    
+    A store is used once its catalog exists; create (default: the
+    SEGMENTED_STORAGE environment variable) makes one on first use. The
+    answer is cached per file, so a running server picks up a new store on
+    restart.
+    """
+    
+    if not db_path or db_path == ':memory:':
+        return None
+    path = os.path.abspath(db_path)
+    if path in _stores and (_stores[path] is not None or not create):
+        return _stores[path]
+    
+    with _stores_lock:
+        if _stores.get(path) is None:
+            if create is None:
+                create = os.environ.get('SEGMENTED_STORAGE', '').lower() in ('1', 'true', 'yes')
+            enabled = create or os.path.exists(os.path.join(segment_directory(path), 'catalog.db'))
+            _stores[path] = SegmentStore(path) if enabled else None
+        return _stores[path]
+
+def open_sentence_writer(conn: sqlite3.Connection, columns: Sequence[str], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                         near_duplicate_threshold: Optional[float] = None):
+    """
+    Writer for new sentences of conn's database: a SegmentedWriter if it has a segment store, else a SentenceWriter
+    
+    Either way a transaction conn already has open is committed (here, or
+    with the first chunk).
+    """
+    
+    store = get_segment_store(database_path(conn))
+    if store is None:
+        return SentenceWriter(conn, columns, chunk_size, near_duplicate_threshold)
+    if conn.in_transaction:
+        conn.commit()
+    return SegmentedWriter(store, columns, chunk_size, near_duplicate_threshold)
+
+def main():
+    """Command-line entry point"""
+    
+    parser = argparse.ArgumentParser(description="Manage the segment store of the Somali sentence dataset")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help="Main database")
+    parser.add_argument('--init', action='store_true', help="Create the segment store if there is none")
+    parser.add_argument('--rebuild', action='store_true', help="Recreate the dedupe hashes and segment counts")
+    args = parser.parse_args()
+    
+    store = get_segment_store(args.db, create=args.init)
+    if store is None:
+        parser.error(f"{args.db} has no segment store (create one with --init)")
+    
+    if args.rebuild:
+        print(f"🔁 Rebuilding the dedupe index of {store.directory}...")
+        result = store.rebuild()
+        print(f"   {result['sentences']:,} sentences in {result['segments']} segments, "
+              f"{result['hashes']:,} distinct hashes")
+    
+    segments = store.status()
+    print(f"🗂️  {len(segments)} segments in {store.directory}")
+    for segment in segments:
+        print(f"   {segment['id']:>6}  {segment['source'] or '(main)':<24} {segment['bucket'] or '-':<10} "
+              f"{segment['sentences']:>14,}  {segment['bytes'] / 1048576:9.1f} MB"
+              f"{'  sealed' if segment['sealed'] else ''}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Enterprise Sentence Listing
+Keyset-paginated, filterable reads of somali_sentences
+"""
+
+import sqlite3
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import pagination
+
+MAX_PAGE_SIZE = 1000
+
+LISTING_COLUMNS = ('id, text, translation, dialect, quality_score, source, category, word_count, '
+                   'validated, scholar_approved, created_at')
+
+# Filter name -> condition; equality filters lead a (column, quality_score) index
+SENTENCE_FILTERS = {
+    'dialect': 'dialect = ?',
+    'source': 'source = ?',
+    'category': 'category = ?',
+    'validated': 'validated = ?',
+    'scholar_approved': 'scholar_approved = ?',
+    'min_quality': 'quality_score >= ?',
+    'max_quality': 'quality_score <= ?',
+    'min_words': 'word_count >= ?',
+    'max_words': 'word_count <= ?',
+    'created_after': 'created_at >= ?',
+    'created_before': 'created_at < ?'
+}
+
+SORTS = ('quality', 'id')
+
+def encode_cursor(sort: str, row: Dict) -> str:
+    """Opaque cursor pointing just past row"""
+    
+    key = [sort, row['quality_score'], row['id']] if sort == 'quality' else [sort, row['id']]
+    return pagination.encode_cursor(key)
+
+def decode_cursor(cursor: str, sort: str) -> tuple:
+    """Keyset position of a cursor; ValueError if it is malformed or from another sort"""
+    
+    key = pagination.decode_cursor(cursor)
+    if key[0] != sort:
+        raise ValueError(f"Cursor does not belong to sort '{sort}'")
+    if sort == 'quality' and len(key) == 3 and isinstance(key[2], int) \
+            and (key[1] is None or isinstance(key[1], (int, float))):
+        return key[1], key[2]
+    if sort == 'id' and len(key) == 2 and isinstance(key[1], int):
+        return (key[1],)
+    raise ValueError("Invalid cursor")
+
+def parse_timestamp(value: str) -> str:
+    """ISO date or datetime as the UTC 'YYYY-MM-DD HH:MM:SS' text SQLite stores in created_at"""
+    
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"Invalid timestamp: {value}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+def page_query(filters: Dict, sort: str = 'quality', after: Optional[tuple] = None,
+               limit: int = 10, unscored: bool = False) -> Tuple[str, List]:
+    """
+    SQL and parameters for one page
+    
+    Args:
+        filters: SENTENCE_FILTERS name -> value
+        sort: 'quality' (best first, ties newest first) or 'id' (insertion order)
+        after: Keyset position from decode_cursor; None for the first page
+        limit: Page size
+        unscored: For sort='quality', list the rows without a quality score
+            (they come after every scored row, newest first)
+    """
+    
+    conditions = [SENTENCE_FILTERS[name] for name in filters]
+    params = list(filters.values())
+    
+    if sort == 'id':
+        # Row ids start at 1, so the first page is the same primary key range read
+        order = 'id'
+        conditions.append('id > ?')
+        params.append(after[0] if after is not None else 0)
+    elif unscored:
+        order = 'id DESC'
+        conditions.append('quality_score IS NULL')
+        if after is not None:
+            conditions.append('id < ?')
+            params.append(after[1])
+    else:
+        order = 'quality_score DESC, id DESC'
+        if after is None:
+            conditions.append('quality_score IS NOT NULL')
+        else:
+            conditions.append('(quality_score, id) < (?, ?)')
+            params.extend(after)
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    return f"SELECT {LISTING_COLUMNS} FROM somali_sentences {where} ORDER BY {order} LIMIT ?", params + [limit]
+
+def _row_to_dict(row: sqlite3.Row) -> Dict:
+    sentence = dict(row)
+    sentence['validated'] = bool(sentence['validated'])
+    sentence['scholar_approved'] = bool(sentence['scholar_approved'])
+    return sentence
+
+def check_listing(filters: Dict, sort: str):
+    """ValueError for an unknown sort or filter"""
+    
+    if sort not in SORTS:
+        raise ValueError(f"Unknown sort: {sort}. Use one of: {', '.join(SORTS)}")
+    unknown = sorted(set(filters) - set(SENTENCE_FILTERS))
+    if unknown:
+        raise ValueError(f"Unknown sentence filter: {', '.join(unknown)}")
+
+def fetch_page(conn: sqlite3.Connection, filters: Dict, sort: str, after: Optional[tuple], limit: int) -> List[Dict]:
+    """Up to limit rows after a keyset position; for sort='quality' the scored rows, then the unscored ones"""
+    
+    def fetch(position, count, unscored=False):
+        sql, params = page_query(filters, sort, position, count, unscored)
+        return [_row_to_dict(row) for row in conn.execute(sql, params)]
+    
+    if sort == 'quality' and after is not None and after[0] is None:
+        return fetch(after, limit, unscored=True)
+    
+    rows = fetch(after, limit)
+    if sort == 'quality' and len(rows) < limit:
+        rows += fetch(None, limit - len(rows), unscored=True)
+    return rows
+
+def list_sentences(conn: sqlite3.Connection, filters: Dict, sort: str = 'quality',
+                   cursor: Optional[str] = None, limit: int = 10) -> Tuple[List[Dict], Optional[str]]:
+    """
+    One page of sentences and the cursor of the next page (None on the last page)
+    
+    Every page is a bounded index range read, so page 10,000 costs what page 1 does.
+    """
+    
+    check_listing(filters, sort)
+    after = decode_cursor(cursor, sort) if cursor else None
+    rows = fetch_page(conn, filters, sort, after, limit)
+    
+    next_cursor = encode_cursor(sort, rows[-1]) if len(rows) == limit else None
+    return rows, next_cursor
@@ -0,0 +1,224 @@
+"""
+Enterprise Sentence Search
+Full-text search of somali_sentences through the sentences_fts index
+"""
+
+import html
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pagination
+from sentence_listing import LISTING_COLUMNS, SENTENCE_FILTERS
+
+MAX_QUERY_LENGTH = 500
+
+# 'rank': best BM25 match first; 'newest': most recently added first
+SEARCH_SORTS = ('rank', 'newest')
+
+# Marks around matched terms in snippets, which are HTML-escaped text
+HIGHLIGHT = ('<mark>', '</mark>')
+SNIPPET_TOKENS = 16
+# Stand-ins for the marks inside snippet(), swapped for HIGHLIGHT once the text is escaped
+_SENTINELS = ('\x02', '\x03')
+
+# OperationalError messages SQLite gives for a malformed MATCH expression
+_QUERY_ERRORS = ('fts5:', 'no such column', 'unterminated string', 'unknown special query')
+
+def optimize_index(conn: sqlite3.Connection):
+    """
+    Merge the full-text index into a single b-tree
+    
+    Every write transaction adds a small segment that FTS5 merges only
+    gradually, and each query seeks every segment; after a large import
+    this makes queries, and the per-result snippet lookups, several times
+    faster. It rewrites the whole index, so run it off-peak.
+    """
+    
+    conn.execute("INSERT INTO sentences_fts (sentences_fts) VALUES ('optimize')")
+    conn.commit()
+
+def check_search(query: str, filters: Dict, sort: str):
+    """ValueError for an empty or overlong query, an unknown sort or an unknown filter"""
+    
+    if sort not in SEARCH_SORTS:
+        raise ValueError(f"Unknown sort: {sort}. Use one of: {', '.join(SEARCH_SORTS)}")
+    unknown = sorted(set(filters) - set(SENTENCE_FILTERS))
+    if unknown:
+        raise ValueError(f"Unknown sentence filter: {', '.join(unknown)}")
+    if not query or not query.strip():
+        raise ValueError("Search query is empty")
+    if len(query) > MAX_QUERY_LENGTH:
+        raise ValueError(f"Search query is longer than {MAX_QUERY_LENGTH} characters")
+
+def encode_cursor(sort: str, bm25: Optional[float], sentence_id: int) -> str:
+    """Opaque cursor pointing just past a match"""
+    return pagination.encode_cursor(['rank', bm25, sentence_id] if sort == 'rank' else ['newest', sentence_id])
+
+def decode_cursor(cursor: str, sort: str) -> tuple:
+    """Keyset position of a cursor; ValueError if it is malformed or from another sort"""
+    
+    key = pagination.decode_cursor(cursor)
+    if key[0] != sort:
+        raise ValueError(f"Cursor does not belong to sort '{sort}'")
+    if sort == 'rank' and len(key) == 3 and isinstance(key[1], (int, float)) and isinstance(key[2], int):
+        return key[1], key[2]
+    if sort == 'newest' and len(key) == 2 and isinstance(key[1], int):
+        return (key[1],)
+    raise ValueError("Invalid cursor")
+
+def search_query(query: str, filters: Dict, sort: str = 'rank', after: Optional[tuple] = None,
+                 limit: int = 10, rank_window: Optional[int] = None) -> Tuple[str, List]:
+    """
+    SQL and parameters for the ids (and BM25 scores) of one page of matches
+    
+    Only the index is read unless there are filters, which join each match's
+    sentence by primary key. 'newest' reads matches in descending rowid order
+    and stops after one page. 'rank' scores every match with BM25, or only
+    the newest rank_window of them (scoring costs about a microsecond per
+    match, seconds for a word that matches millions of sentences).
+    """
+    
+    join = 'JOIN somali_sentences AS s ON s.id = sentences_fts.rowid' if filters else ''
+    conditions = ['sentences_fts MATCH ?'] + [f's.{SENTENCE_FILTERS[name]}' for name in filters]
+    params = [query] + list(filters.values())
+    
+    if sort == 'newest':
+        if after is not None:
+            conditions.append('sentences_fts.rowid < ?')
+            params.extend(after)
+        sql = f'''
+            SELECT sentences_fts.rowid AS id, NULL AS bm25
+            FROM sentences_fts {join}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY sentences_fts.rowid DESC LIMIT ?
+        '''
+        return sql, params + [limit]
+    
+    window = ''
+    if rank_window is not None:
+        window = 'ORDER BY sentences_fts.rowid DESC LIMIT ?'
+        params.append(rank_window)
+    
+    # BM25 is negative, best match lowest; ties go to the older sentence
+    page = ''
+    if after is not None:
+        page = 'WHERE (bm25, id) > (?, ?)'
+        params.extend(after)
+    
+    sql = f'''
+        SELECT id, bm25 FROM (
+            SELECT sentences_fts.rowid AS id, bm25(sentences_fts) AS bm25
+            FROM sentences_fts {join}
+            WHERE {' AND '.join(conditions)}
+            {window}
+        ) {page}
+        ORDER BY bm25, id LIMIT ?
+    '''
+    return sql, params + [limit]
+
+def rank_window_truncated(conn: sqlite3.Connection, query: str, filters: Dict, rank_window: int) -> bool:
+    """Whether a query has more matches than rank_window, so sort='rank' leaves some unranked"""
+    
+    join = 'JOIN somali_sentences AS s ON s.id = sentences_fts.rowid' if filters else ''
+    conditions = ['sentences_fts MATCH ?'] + [f's.{SENTENCE_FILTERS[name]}' for name in filters]
+    row = conn.execute(f'''
+        SELECT 1 FROM sentences_fts {join} WHERE {' AND '.join(conditions)}
+        ORDER BY sentences_fts.rowid DESC LIMIT 1 OFFSET ?
+    ''', [query] + list(filters.values()) + [rank_window]).fetchone()
+    return row is not None
+
+def _highlight(snippet: Optional[str]) -> Optional[str]:
+    """HTML-escape a snippet, then turn its sentinel marks into HIGHLIGHT"""
+    
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace(_SENTINELS[0], HIGHLIGHT[0]).replace(_SENTINELS[1], HIGHLIGHT[1])
+
+@contextmanager
+def _query_errors() -> Iterator[None]:
+    """Raise a malformed MATCH expression as ValueError"""
+    
+    try:
+        yield
+    except sqlite3.OperationalError as e:
+        if str(e).startswith(_QUERY_ERRORS):
+            raise ValueError(f"Invalid search query: {e}")
+        raise
+
+def fetch_matches(conn: sqlite3.Connection, query: str, filters: Dict, sort: str, after: Optional[tuple],
+                  limit: int, rank_window: Optional[int] = None) -> List[sqlite3.Row]:
+    """Ids and BM25 scores of one page of matches, from a position of decode_cursor"""
+    
+    sql, params = search_query(query, filters, sort, after, limit, rank_window)
+    with _query_errors():
+        return conn.execute(sql, params).fetchall()
+
+def fetch_results(conn: sqlite3.Connection, query: str, matches: List[sqlite3.Row]) -> Dict[int, Dict]:
+    """
+    Results of a page of matches, by id; matches deleted since they were read are left out
+    
+    Each is a listing row plus 'score' (negated BM25, higher is better;
+    None for sort='newest') and its HTML-escaped 'snippet'.
+    """
+    
+    if not matches:
+        return {}
+    ids = [match['id'] for match in matches]
+    columns = ', '.join(f's.{column.strip()}' for column in LISTING_COLUMNS.split(','))
+    # Stored text may contain markup: the marks go in as sentinels and the text is escaped afterwards
+    snippet = f"snippet(sentences_fts, -1, char(2), char(3), '…', {SNIPPET_TOKENS})"
+    # Snippets only for the page: each is a rowid seek instead of one per match
+    with _query_errors():
+        rows = conn.execute(f'''
+            SELECT {columns}, {snippet} AS snippet
+            FROM sentences_fts JOIN somali_sentences AS s ON s.id = sentences_fts.rowid
+            WHERE sentences_fts MATCH ? AND sentences_fts.rowid IN ({', '.join('?' * len(ids))})
+        ''', [query] + ids).fetchall()
+    
+    scores = {match['id']: match['bm25'] for match in matches}
+    results = {}
+    for row in rows:
+        result = dict(row)
+        result['validated'] = bool(result['validated'])
+        result['scholar_approved'] = bool(result['scholar_approved'])
+        result['score'] = -scores[row['id']] if scores[row['id']] is not None else None
+        result['snippet'] = _highlight(result['snippet'])
+        results[row['id']] = result
+    return results
+
+def search_sentences(conn: sqlite3.Connection, query: str, filters: Dict, sort: str = 'rank',
+                     cursor: Optional[str] = None, limit: int = 10,
+                     rank_window: Optional[int] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    One page of sentences matching an FTS5 query, and the cursor of the next page
+    
+    The query uses FTS5 syntax: words match anywhere ('nabad'), double quotes
+    match a phrase ('"waa run"'), a trailing * matches a prefix ('fursad*'),
+    and AND, OR, NOT, NEAR() and parentheses combine them. 'text:' or
+    'translation:' restricts a term to one column. Terms containing
+    punctuation, such as Qur'aan, must be quoted.
+    
+    sort='rank' returns every match, best first. A rank_window ranks only
+    the newest rank_window matches instead, trading completeness for
+    latency on broad queries (rank_window_truncated tells whether any were
+    left out). sort='newest' pages through all matches.
+    
+    Each result is a listing row plus 'score' (negated BM25, higher is
+    better; None for sort='newest') and 'snippet', the best matching
+    fragment of the text or translation, HTML-escaped, with the matched
+    terms wrapped in HIGHLIGHT.
+    
+    Raises:
+        ValueError: For an empty or malformed query, an unknown sort or
+            filter, or an invalid cursor
+    """
+    
+    check_search(query, filters, sort)
+    after = decode_cursor(cursor, sort) if cursor else None
+    matches = fetch_matches(conn, query, filters, sort, after, limit, rank_window)
+    rows = fetch_results(conn, query, matches)
+    results = [rows[match['id']] for match in matches if match['id'] in rows]
+    
+    next_cursor = encode_cursor(sort, matches[-1]['bm25'], matches[-1]['id']) if len(matches) == limit else None
+    return results, next_cursor
@@ -62,7 +62,7 @@ def test_nlp_engine():
                 "professionalism": professionalism,
                 "cultural": cultural
             })
-            
+        
         except Exception as e:
             print(f"   ❌ Error: {e}")
             results.append({
@@ -89,6 +89,1302 @@ def test_nlp_engine():
         print("❌ No valid results")
         return False
 
+def test_batch_analysis():
+    """Test that batch analysis matches per-text analysis"""
+    print("\n🧪 Testing Batch Analysis...")
+    
+    texts = [
+        "Waxbarashadu waa iftiin, jaahilnimaduna waa mugdi",
+        "Dowladda iyo xukuumadda waxay ka wada hadlayaan dhaqaalaha. Guud ahaan (2020) waa run!",
+        "Assalamu calaykum walaal, fadlan raalli noqo",
+        "...",
+        "Dadka Soomaaliyeed waa dad cafimaad qaba oo jecel tahriibka"
+    ]
+    
+    batch = nlp_engine.analyze_batch(texts, return_exceptions=True)
+    
+    for text, batch_analysis in zip(texts, batch):
+        try:
+            single_analysis = nlp_engine.analyze_text_enterprise(text)
+        except Exception as e:
+            assert type(batch_analysis) is type(e), f"Expected {type(e).__name__} for '{text}'"
+            print(f"   ✅ '{text}': {type(e).__name__} in both paths")
+            continue
+        
+        batch_analysis = dict(batch_analysis, timestamp=None)
+        single_analysis = dict(single_analysis, timestamp=None)
+        assert json.dumps(batch_analysis) == json.dumps(single_analysis), f"Batch result differs for '{text}'"
+        print(f"   ✅ '{text[:40]}': {batch_analysis['enterprise_metrics']['overall_enterprise_score']}%")
+    
+    return True
+
+def test_analysis_cache():
+    """Test the enterprise analysis cache"""
+    print("\n🧪 Testing Analysis Cache...")
+    
+    from enterprise_nlp import SomaliNLPEngine
+    from analysis_cache import AnalysisCache
+    
+    engine = SomaliNLPEngine(cache=AnalysisCache(max_entries=2))
+    texts = [
+        "Waxbarashadu waa iftiin, jaahilnimaduna waa mugdi",
+        "Dhaqanka Soomaaliyeed waa mid taariikh dheer leh",
+        "Qofka wax barata waa qofka guulaysta noloshiisa"
+    ]
+    
+    first = engine.analyze_text_enterprise(texts[0])
+    second = engine.analyze_text_enterprise(texts[0])
+    assert dict(first, timestamp=None) == dict(second, timestamp=None), "Cached result differs"
+    assert list(first) == list(second), "Cached result changed key order"
+    
+    for text in texts[1:]:
+        engine.analyze_text_enterprise(text)
+    
+    stats = engine.cache.stats()
+    print(f"   Hits: {stats['hits']}, Misses: {stats['misses']}, Evictions: {stats['evictions']}")
+    assert stats['hits'] == 1 and stats['misses'] == 3 and stats['evictions'] == 1
+    assert stats['entries'] == 2
+    
+    return True
+
+def test_analysis_components():
+    """Test selecting enterprise analysis components and fields"""
+    print("\n🧪 Testing Analysis Component Selection...")
+    
+    text = "Dowladda Soomaaliya waxay ku dhawaaqday qorshe cusub oo waxbarasho. Waa run."
+    full = nlp_engine.analyze_text_enterprise(text)
+    
+    dialect_only = nlp_engine.analyze_text_enterprise(text, components=['dialect_analysis'])
+    print(f"   Components: {list(dialect_only)}")
+    assert list(dialect_only) == ['timestamp', 'text_length', 'word_count', 'dialect_analysis']
+    assert dialect_only['dialect_analysis'] == full['dialect_analysis']
+    
+    fields = ['enterprise_metrics.overall_enterprise_score', 'dialect_analysis.primary_dialect']
+    selected = nlp_engine.analyze_batch([text], fields=fields)[0]
+    assert selected['enterprise_metrics'] == {
+        'overall_enterprise_score': full['enterprise_metrics']['overall_enterprise_score']
+    }
+    assert selected['dialect_analysis'] == {'primary_dialect': full['dialect_analysis']['primary_dialect']}
+    
+    try:
+        nlp_engine.analyze_text_enterprise(text, components=['unknown_component'])
+        return False
+    except ValueError:
+        pass
+    
+    return True
+
+def test_metrics():
+    """Test analyzer timing and Prometheus export"""
+    print("\n🧪 Testing Metrics...")
+    
+    from metrics import metrics
+    
+    was_enabled = metrics.enabled
+    metrics.enabled = True
+    try:
+        nlp_engine.analyze_batch(["Waxbarashadu waa iftiin, jaahilnimaduna waa mugdi", "Waa run."])
+        exposition = metrics.render()
+    finally:
+        metrics.enabled = was_enabled
+    
+    print(f"   Exported lines: {len(exposition.splitlines())}")
+    assert '# TYPE somali_nlp_analyzer_seconds histogram' in exposition
+    assert 'somali_nlp_analyzer_seconds_count{analyzer="grammar_analysis",mode="document"}' in exposition
+    assert 'somali_nlp_analyzer_seconds_bucket{analyzer="enterprise_metrics",mode="batch",le="+Inf"}' in exposition
+    assert 'somali_nlp_cache_hits_total' in exposition
+    
+    return True
+
+def test_benchmark_suite():
+    """Test the reproducible benchmark corpora and a tiny benchmark run"""
+    print("\n🧪 Testing Benchmark Suite...")
+    
+    import benchmark_nlp
+    
+    pool = benchmark_nlp.load_sentence_pool()
+    first = list(benchmark_nlp.generate_corpus(pool, 50, 'paragraph'))
+    second = list(benchmark_nlp.generate_corpus(benchmark_nlp.load_sentence_pool(), 50, 'paragraph'))
+    assert first == second, "Benchmark corpus is not deterministic"
+    
+    report = benchmark_nlp.run_suite([20], ['short'], ['analyze_batch', 'detect_dialect'], warmup=0)
+    for run in report['results']:
+        print(f"   {run['target']}: {run['texts_per_sec']:.0f} texts/sec")
+        assert run['texts'] == 20 and run['errors'] == 0
+    
+    assert not benchmark_nlp.compare_with_baseline(report['results'], report, tolerance=0.0)
+    
+    return True
+
+def test_analysis_pool():
+    """Test bulk analysis on the worker process pool"""
+    print("\n🧪 Testing Analysis Pool...")
+    
+    import asyncio
+    import re
+    import signal
+    import time
+    import analysis_pool
+    from enterprise_nlp import nlp_engine
+    from analysis_pool import DEFAULT_MAX_WORKERS, AnalysisPool
+    from metrics import metrics, ANALYZER_SECONDS
+    
+    # Sized by the CPUs the process may use, and capped however many the host has
+    assert 1 <= AnalysisPool().max_workers <= min(len(os.sched_getaffinity(0)), DEFAULT_MAX_WORKERS)
+    
+    texts = [
+        "Waxbarashadu waa iftiin, jaahilnimaduna waa mugdi",
+        "Dhaqanka Soomaaliyeed waa mid taariikh dheer leh",
+        "",
+        "Qofka wax barata waa qofka guulaysta noloshiisa"
+    ] * 5
+    
+    pool = AnalysisPool(max_workers=2, chunk_size=3, inline_threshold=0)
+    try:
+        pooled = pool.analyze_batch(texts, return_exceptions=True)
+        
+        # Workers report their analyzer timings and cache counters to this process's /metrics
+        was_enabled, shared_pool = metrics.enabled, analysis_pool.analysis_pool
+        metrics.enabled, analysis_pool.analysis_pool = True, pool
+        try:
+            ANALYZER_SECONDS.drain()
+            pool.analyze_batch([f"Jumlad cusub {i} waa run" for i in range(12)])
+            timed = ANALYZER_SECONDS.drain()
+            cache_misses = re.search(r'^somali_nlp_cache_misses_total (\S+)$', metrics.render(), re.M).group(1)
+        finally:
+            metrics.enabled, analysis_pool.analysis_pool = was_enabled, shared_pool
+        assert timed[('grammar_analysis', 'document')][-1] == 12, "Worker analyzer timings not recorded"
+        assert pool.worker_cache_stats()['misses'] >= 12 and float(cache_misses) >= 12
+        
+        # A worker killed between batches breaks the executor; the next batch rebuilds it
+        def kill_worker():
+            executor = pool.start()
+            os.kill(next(iter(executor._processes)), signal.SIGKILL)
+            for _ in range(100):
+                if executor._broken:
+                    break
+                time.sleep(0.05)
+            return executor
+        
+        broken = kill_worker()
+        assert len(pool.analyze_batch(texts, return_exceptions=True)) == len(texts), "Batch lost to a dead worker"
+        assert pool.start() is not broken, "Broken executor kept"
+        kill_worker()
+        assert len(asyncio.run(pool.analyze_batch_async(texts, return_exceptions=True))) == len(texts)
+    finally:
+        pool.shutdown()
+    
+    inline = nlp_engine.analyze_batch(texts, return_exceptions=True)
+    print(f"   Pooled results: {len(pooled)}")
+    assert len(pooled) == len(texts)
+    for pooled_result, inline_result in zip(pooled, inline):
+        if isinstance(inline_result, Exception):
+            assert isinstance(pooled_result, type(inline_result)), "Pool lost a per-text error"
+        else:
+            assert dict(pooled_result, timestamp=None) == dict(inline_result, timestamp=None), "Pool result differs"
+    
+    return True
+
+def test_api_key_cache():
+    """Test that cached API keys skip the database and account changes invalidate them"""
+    print("\n🧪 Testing API Key Cache...")
+    
+    import tempfile
+    import time
+    from contextlib import closing
+    from fastapi import HTTPException
+    import schema
+    from accounts import change_plan, rotate_api_key, set_active
+    from api_key_cache import ApiKeyCache, KeyInvalidations, api_key_cache
+    from database import connect
+    from main import authorize_user, load_api_key_user
+    
+    def verify_api_key(api_key, conn):
+        # What get_current_user does before rate limiting
+        hit, user = api_key_cache.get(api_key)
+        return authorize_user(user if hit else load_api_key_user(api_key, conn))
+    
+    cache = ApiKeyCache(max_entries=2, ttl_seconds=0.2, negative_ttl_seconds=0.2)
+    user = {'user_id': 1, 'plan': 'free', 'requests_used': 5, 'requests_limit': 100}
+    assert cache.get('sk_live_a') == (False, None)
+    cache.put('sk_live_a', user)
+    cache.get('sk_live_a')[1]['plan'] = 'changed'
+    cache.add_usage(1, 3)
+    hit, cached = cache.get('sk_live_a')
+    assert hit and cached['plan'] == 'free' and cached['requests_used'] == 8, "Cached record not isolated or counted"
+    
+    cache.put('sk_live_bad', None)
+    assert cache.get('sk_live_bad') == (True, None), "Invalid key not cached"
+    
+    # A record loaded before an invalidation is not cached
+    generation = cache.generation
+    cache.invalidate_user(1)
+    cache.put('sk_live_a', user, generation)
+    assert cache.get('sk_live_a') == (False, None)
+    
+    for user_id in range(2, 5):
+        cache.put(f'sk_live_{user_id}', dict(user, user_id=user_id))
+    assert cache.stats()['entries'] == 2 and cache.stats()['evictions'] == 1
+    time.sleep(0.25)
+    assert cache.get('sk_live_4') == (False, None) and cache.get('sk_live_bad') == (False, None), "Entries outlived TTL"
+    
+    def rejected(api_key, conn):
+        try:
+            verify_api_key(api_key, conn)
+            return False
+        except HTTPException as e:
+            return e.status_code == 401
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'accounts.db')
+        schema.init_database(db_path)
+        with closing(connect(db_path)) as conn:
+            user_id = conn.execute(
+                "INSERT INTO users (email, password, api_key, plan, requests_limit) VALUES (?, ?, ?, ?, ?)",
+                ('cache@example.com', 'hash', 'sk_live_cached', 'free', 100)
+            ).lastrowid
+            conn.commit()
+            
+            assert verify_api_key('sk_live_cached', conn)['plan'] == 'free'
+            lookups = api_key_cache.stats()['misses']
+            verify_api_key('sk_live_cached', conn)
+            assert api_key_cache.stats()['misses'] == lookups, "Cached key read the database"
+            
+            change_plan(user_id, 'premium', conn)
+            assert verify_api_key('sk_live_cached', conn)['requests_limit'] == 10000, "Plan change not seen"
+            
+            set_active(user_id, False, conn)
+            assert rejected('sk_live_cached', conn), "Deactivated user accepted"
+            set_active(user_id, True, conn)
+            assert verify_api_key('sk_live_cached', conn)['user_id'] == user_id, "Reactivated user rejected"
+            
+            new_key = rotate_api_key(user_id, conn)
+            assert rejected('sk_live_cached', conn) and verify_api_key(new_key, conn)['user_id'] == user_id
+            
+            # Another server process learns of the change from the invalidation rows, not its TTL
+            other_cache = ApiKeyCache(ttl_seconds=30)
+            invalidations = KeyInvalidations(other_cache, db_path, interval=0)
+            invalidations.start()
+            other_cache.put(new_key, verify_api_key(new_key, conn))
+            conn.execute("UPDATE users SET requests_used = requests_used + 1 WHERE id = ?", (user_id,))
+            conn.commit()
+            assert invalidations.poll() == 0, "Usage counted as a user change"
+            set_active(user_id, False, conn)
+            assert invalidations.poll() == 1 and other_cache.get(new_key) == (False, None), "Revocation not shared"
+    
+    stats = api_key_cache.stats()
+    print(f"   {stats['hits']} hits, {stats['misses']} misses, {stats['invalidations']} invalidations")
+    
+    return True
+
+def test_usage_ledger():
+    """Test that batched usage flushes reconcile exactly and journals survive a crash"""
+    print("\n🧪 Testing Usage Ledger...")
+    
+    import tempfile
+    import time
+    from contextlib import closing
+    import schema
+    import usage_ledger
+    from database import PoolTimeout, connect, get_pool
+    from usage_ledger import UsageLedger, apply_usage
+    
+    def totals(conn):
+        used = dict(conn.execute("SELECT id, requests_used FROM users"))
+        billed = dict(conn.execute("SELECT user_id, SUM(requests) FROM api_usage GROUP BY user_id"))
+        return used, billed
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'usage.db')
+        schema.init_database(db_path)
+        with closing(connect(db_path)) as conn:
+            conn.executemany("INSERT INTO users (email, password, api_key) VALUES (?, 'hash', ?)",
+                             [(f'user{i}@example.com', f'sk_live_{i}') for i in (1, 2)])
+            conn.commit()
+            
+            ledger = UsageLedger(db_path, flush_interval=60)
+            for _ in range(500):
+                ledger.record(1, '/analyze')
+            ledger.record(2, '/analyze/bulk', requests=1000)
+            assert ledger.pending(1) == 500 and totals(conn)[0] == {1: 0, 2: 0}, "Usage written before the flush"
+            assert ledger.flush() == 1500
+            rows = conn.execute("SELECT COUNT(*) FROM api_usage").fetchone()[0]
+            assert rows <= 4, f"{rows} api_usage rows for two endpoints"
+            assert totals(conn) == ({1: 500, 2: 1000}, {1: 500, 2: 1000}) and ledger.pending(1) == 0
+            
+            # A process dies with usage journaled but not flushed; the next one replays it once
+            for _ in range(7):
+                ledger.record(2, '/export')
+            os.close(ledger._journal)
+            survivor = UsageLedger(db_path)
+            assert survivor.recover() == 7 and survivor.recover() == 0, "Journal not replayed exactly once"
+            assert totals(conn) == ({1: 500, 2: 1007}, {1: 500, 2: 1007})
+            
+            # Applied in the database but not yet deleted: recovery only deletes it
+            journal = os.path.join(survivor.directory, 'crashed-000001.journal')
+            with open(journal, 'w') as f:
+                f.write("1\t/analyze\t2024-01-01 00:00:00\t3\n")
+            apply_usage(conn, {(1, '/analyze', '2024-01-01 00:00:00'): 3}, [journal])
+            assert survivor.recover() == 0 and not os.path.exists(journal)
+            
+            used, billed = totals(conn)
+            assert used == billed == {1: 503, 2: 1007}, "Billing does not reconcile"
+            assert not os.listdir(survivor.directory), "Journals left behind"
+            
+            # No free connection: the usage stays pending and its journal is applied by the next flush
+            class ExhaustedPool:
+                def connection(self, conn=None):
+                    raise PoolTimeout("No free connection")
+            
+            for _ in range(4):
+                survivor.record(2, '/analyze')
+            usage_ledger.get_pool = lambda db_path: ExhaustedPool()
+            try:
+                survivor.flush()
+                assert False, "Flush without a connection succeeded"
+            except PoolTimeout:
+                pass
+            finally:
+                usage_ledger.get_pool = get_pool
+            assert survivor.pending(2) == 4 and survivor.flush() == 4, "Usage lost to a pool timeout"
+            assert totals(conn)[0][2] == 1011
+            
+            # Requests being applied stay in pending() until their transaction commits
+            applying = []
+            
+            def observed_apply(conn, usage, journals=()):
+                applying.append((survivor.pending(2), survivor.generation))
+                apply_usage(conn, usage, journals)
+            
+            generation = survivor.generation
+            survivor.record(2, '/analyze', requests=2)
+            usage_ledger.apply_usage = observed_apply
+            try:
+                survivor.flush()
+            finally:
+                usage_ledger.apply_usage = apply_usage
+            assert applying == [(2, generation)], "Requests left pending() before their flush committed"
+            assert survivor.pending(2) == 0 and survivor.generation == generation + 1
+            assert totals(conn)[0][2] == 1013
+            
+            # The background thread flushes once flush_events requests are pending
+            eager = UsageLedger(db_path, flush_interval=60, flush_events=10)
+            eager.start()
+            for _ in range(10):
+                eager.record(1, '/analyze')
+            for _ in range(100):
+                if not eager.pending(1):
+                    break
+                time.sleep(0.05)
+            eager.close()
+            assert totals(conn)[0][1] == 513 and eager.stats()['flushes'] == 1
+    
+    print("   1,526 requests flushed and replayed; requests_used matches api_usage")
+    
+    return True
+
+def test_rate_limiter():
+    """Test that token buckets hold every worker to the plan's burst and quota consumption is atomic"""
+    print("\n🧪 Testing Rate Limiter...")
+    
+    import sqlite3
+    import tempfile
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from contextlib import closing
+    from api_key_cache import ApiKeyCache
+    from rate_limiter import PLAN_RATES, RateLimiter, rate_limit_headers
+    
+    rate, burst = PLAN_RATES['basic']
+    
+    memory = RateLimiter()
+    decisions = [memory.acquire(1, 'basic') for _ in range(burst + 1)]
+    assert all(d['allowed'] for d in decisions[:burst]) and not decisions[-1]['allowed'], "Burst not enforced"
+    assert decisions[0]['remaining'] == burst - 1 and decisions[burst - 1]['remaining'] == 0
+    headers = rate_limit_headers(decisions[-1])
+    assert headers['X-RateLimit-Limit'] == str(burst) and int(headers['Retry-After']) >= 1
+    time.sleep(1.5 / rate)
+    assert memory.acquire(1, 'basic')['allowed'], "Bucket did not refill"
+    assert memory.acquire(2, 'basic')['allowed'], "Buckets shared between users"
+    
+    # Two workers on one bucket file admit one burst between them, and lease instead of writing per request
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'ratelimit.db')
+        workers = [RateLimiter(path), RateLimiter(path)]
+        admitted = sum(workers[i % 2].acquire(1, 'basic')['allowed'] for i in range(3 * burst))
+        assert burst - 2 * int(burst * 0.1) <= admitted <= burst, f"{admitted} requests admitted for a burst of {burst}"
+        assert workers[0].acquire(1, 'basic', local_only=True)['allowed'] is False, "Refusal not remembered"
+        assert RateLimiter(path).acquire(2, 'basic', local_only=True) is None
+        
+        # A renewal stuck behind a writer on the bucket file holds up neither lease spending nor other users
+        worker = RateLimiter(path)
+        worker.acquire(3, 'basic')
+        renewed, renewing = [], threading.Event()
+        take = worker._take
+        
+        def counted_take(user_id, *args):
+            renewed.append(user_id)
+            renewing.set()
+            return take(user_id, *args)
+        
+        worker._take = counted_take
+        with closing(sqlite3.connect(path)) as blocker:
+            blocker.execute("BEGIN IMMEDIATE")
+            renewal = threading.Thread(target=worker.acquire, args=(4, 'basic'))
+            renewal.start()
+            assert renewing.wait(5), "Renewal never reached the bucket file"
+            assert worker.acquire(3, 'basic', local_only=True)['allowed']
+            assert worker.acquire(5, 'basic', local_only=True) is None
+            assert renewed == [4] and renewal.is_alive(), "Lease spending waited for or made a renewal"
+            blocker.rollback()
+        renewal.join()
+    
+    # Quota: check and count in one step, so concurrent requests cannot overdraw it
+    cache = ApiKeyCache()
+    cache.put('sk_live_quota', {'user_id': 7, 'plan': 'free', 'requests_used': 0, 'requests_limit': 100})
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        counted = list(pool.map(lambda _: cache.consume(7, 3, 100), range(50)))
+    assert counted.count(True) == 33 and cache.get('sk_live_quota')[1]['requests_used'] == 99
+    assert cache.consume(8, 1, 100) is None
+    
+    print(f"   {admitted} of {3 * burst} burst requests admitted across two workers")
+    
+    return True
+
+def test_usage_rollups():
+    """Test that usage reports come from the rollups and survive pruning of raw rows"""
+    print("\n🧪 Testing Usage Rollups...")
+    
+    import tempfile
+    from contextlib import closing
+    from datetime import datetime, timedelta, timezone
+    import schema
+    from database import connect
+    from usage_ledger import UsageLedger, apply_usage
+    from usage_rollups import prune_usage, usage_report
+    
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    old = (now - timedelta(days=60)).strftime('%Y-%m-%d %H:%M:%S')
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'rollups.db')
+        schema.init_database(db_path)
+        with closing(connect(db_path)) as conn:
+            conn.execute("INSERT INTO users (email, password, api_key) VALUES ('usage@example.com', 'hash', 'sk_u')")
+            conn.commit()
+            
+            ledger = UsageLedger(db_path)
+            for _ in range(5):
+                ledger.record(1, '/analyze')
+            ledger.record(1, '/analyze/bulk', requests=40)
+            ledger.flush()
+            apply_usage(conn, {(1, '/export', old): 2})
+            
+            daily = usage_report(1, conn=conn)
+            assert daily['total'] == 45 and len(daily['series']) == 30, "Default daily window wrong"
+            assert sum(point['requests'] for point in daily['series'][-2:]) == 45, "Today's usage missing"
+            assert daily['endpoints'] == {'/analyze/bulk': 40, '/analyze': 5}
+            hourly = usage_report(1, 'hour', endpoint='/analyze', conn=conn)
+            assert hourly['total'] == 5 and len(hourly['series']) == 48
+            
+            # Raw rows past retention go; the rollups keep their requests
+            assert prune_usage(30, conn=conn) == 1
+            assert conn.execute("SELECT SUM(requests) FROM api_usage").fetchone()[0] == 45
+            history = usage_report(1, start=old[:10], conn=conn)
+            assert history['total'] == 47 and history['series'][0]['requests'] == 2
+            used = conn.execute("SELECT requests_used FROM users WHERE id = 1").fetchone()[0]
+            rolled_up = conn.execute("SELECT SUM(requests) FROM usage_daily WHERE user_id = 1").fetchone()[0]
+            assert used == rolled_up == 47, "Rollups do not reconcile with requests_used"
+            
+            invalid = ({'granularity': 'week'}, {'start': 'yesterday'}, {'granularity': 'hour', 'start': '2000-01-01'})
+            for bad in invalid:
+                try:
+                    usage_report(1, conn=conn, **bad)
+                    assert False, f"Accepted {bad}"
+                except ValueError:
+                    pass
+    
+    print(f"   {history['total']} requests reported across {len(history['series'])} days after pruning")
+    
+    return True
+
+def test_user_listing():
+    """Test keyset pages and filters of the admin user listing, its NDJSON stream and the per-plan summary"""
+    print("\n🧪 Testing User Listing...")
+    
+    import json
+    import tempfile
+    from contextlib import closing
+    import schema
+    from database import connect
+    from user_listing import count_users, list_users, plan_summary, stream_users
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'users.db')
+        schema.init_database(db_path)
+        with closing(connect(db_path)) as conn:
+            users = [
+                (f'user{i}@example.com', 'hash', f'sk_{i}', ('free', 'premium')[i % 2], i * 10, 100, i % 5 != 0,
+                 f'2024-01-{1 + i // 10:02d} 00:00:00')
+                for i in range(25)
+            ]
+            conn.executemany('''
+                INSERT INTO users (email, password, api_key, plan, requests_used, requests_limit, is_active, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', users)
+            conn.commit()
+            
+            # Pages follow each other without gaps or repeats, newest first, ties broken by id
+            seen, cursor = [], None
+            while True:
+                page, cursor = list_users(conn, {}, cursor, limit=7)
+                seen.extend(page)
+                if cursor is None:
+                    break
+            assert [user['id'] for user in seen] == list(range(25, 0, -1)), "Pages skip or repeat users"
+            
+            premium, _ = list_users(conn, {'plan': 'premium', 'is_active': True}, limit=100)
+            assert len(premium) == 10 and all(u['plan'] == 'premium' and u['is_active'] for u in premium)
+            heavy, _ = list_users(conn, {'min_usage': 0.9}, limit=100)
+            assert sorted(u['requests_used'] for u in heavy) == list(range(90, 250, 10)), "Usage filter wrong"
+            assert count_users(conn, {}) == 25 and count_users(conn, {'is_active': False}) == 5
+            assert count_users(conn, {'plan': 'premium', 'is_active': True}) == len(premium)
+            assert count_users(conn, {'min_usage': 0.9}) == len(heavy), "Count ignores the filters"
+            
+            streamed = b''.join(stream_users({'plan': 'free'}, chunk_size=4, conn=conn)).decode().splitlines()
+            assert [json.loads(line)['id'] for line in streamed] == list(range(25, 0, -2)), "Stream incomplete"
+            
+            for bad in (({'password': 'x'}, None), ({}, 'not-a-cursor')):
+                try:
+                    list_users(conn, *bad)
+                    assert False, f"Accepted {bad}"
+                except ValueError:
+                    pass
+            
+            # The summary follows inserts, plan changes, usage and deletes through triggers
+            summary = plan_summary(conn)
+            assert summary['total_users'] == 25 and summary['active_users'] == 20
+            assert summary['plans']['free']['users'] == 13 and summary['plans']['premium']['users'] == 12
+            assert summary['plans']['free']['exhausted_users'] == 8
+            conn.execute("UPDATE users SET plan = 'enterprise', requests_used = 0 WHERE id = 25")
+            conn.execute("UPDATE users SET requests_used = requests_used + 5 WHERE id = 1")
+            conn.execute("DELETE FROM users WHERE id = 2")
+            conn.commit()
+            summary = plan_summary(conn)
+            actual = conn.execute('''
+                SELECT plan, COUNT(*), SUM(is_active), SUM(requests_used >= requests_limit), SUM(requests_used)
+                FROM users GROUP BY plan
+            ''').fetchall()
+            assert {plan: (counts['users'], counts['active_users'], counts['exhausted_users'], counts['requests_used'])
+                    for plan, counts in summary['plans'].items()} == {row[0]: tuple(row[1:]) for row in actual}, \
+                "Summary drifted from users"
+    
+    print(f"   {len(seen)} users over 4 pages, {len(streamed)} streamed; plans: {sorted(summary['plans'])}")
+    
+    return True
+
+def test_connection_pool():
+    """Test pooled connections: reuse, exclusive borrowing and rollback on return"""
+    print("\n🧪 Testing Connection Pool...")
+    
+    import tempfile
+    import threading
+    from database import ConnectionPool
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        pool = ConnectionPool(os.path.join(workdir, 'pool.db'), max_connections=2, timeout=5)
+        
+        with pool.connection() as conn:
+            conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+            conn.commit()
+            first = conn
+        
+        # Uncommitted writes are rolled back when the connection is returned
+        with pool.connection() as conn:
+            assert conn is first, "Idle connection not reused"
+            conn.execute("INSERT INTO items (name) VALUES ('lost')")
+        
+        # Concurrent borrowers never share a connection
+        borrowed = []
+        shared = []
+        lock = threading.Lock()
+        
+        def worker(index):
+            with pool.connection() as conn:
+                with lock:
+                    if conn in borrowed:
+                        shared.append(index)
+                    borrowed.append(conn)
+                conn.execute("INSERT INTO items (name) VALUES (?)", (f"item {index}",))
+                conn.commit()
+                with lock:
+                    borrowed.remove(conn)
+        
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        with pool.connection() as conn:
+            row = conn.execute("SELECT COUNT(*) AS total, SUM(name = 'lost') AS lost FROM items").fetchone()
+        pool.close_all()
+    
+    print(f"   Rows: {row['total']}, rolled back: {not row['lost']}")
+    assert not shared, "Connection borrowed twice"
+    assert row['total'] == 20
+    assert not row['lost']
+    
+    return True
+
+def test_async_database():
+    """Test that awaited queries run off the event loop, bounded by the pool size"""
+    print("\n🧪 Testing Async Database...")
+    
+    import asyncio
+    import tempfile
+    import threading
+    import time
+    from database import AsyncDatabase, ConnectionPool
+    
+    def slow_count(delay, conn=None):
+        time.sleep(delay)     # A query waiting on a lock
+        running.append(threading.current_thread().name)
+        return conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+    
+    async def scenario(db):
+        await db.run(lambda conn: (conn.execute("CREATE TABLE items (id INTEGER)"),
+                                   conn.executemany("INSERT INTO items VALUES (?)", [(i,) for i in range(5)]),
+                                   conn.commit()))
+        
+        ticks = 0
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+        
+        task = asyncio.create_task(ticker())
+        start = time.perf_counter()
+        counts = await asyncio.gather(*[db.run(slow_count, 0.1) for _ in range(4)])
+        elapsed = time.perf_counter() - start
+        task.cancel()
+        
+        row = await db.fetchone("SELECT MAX(id) AS top FROM items")
+        try:
+            await db.fetchall("SELECT * FROM missing_table")
+            assert False, "Error not raised to the caller"
+        except sqlite3.OperationalError:
+            pass
+        return counts, elapsed, ticks, row['top']
+    
+    running = []
+    with tempfile.TemporaryDirectory() as workdir:
+        db = AsyncDatabase(ConnectionPool(os.path.join(workdir, 'async.db'), max_connections=2))
+        try:
+            counts, elapsed, ticks, top = asyncio.run(scenario(db))
+        finally:
+            db.close()
+            db.pool.close_all()
+    
+    print(f"   4 slow queries on 2 connections: {elapsed:.2f}s, event loop ticked {ticks} times meanwhile")
+    assert counts == [5, 5, 5, 5] and top == 4
+    assert all(name.startswith('sqlite') for name in running), "Query ran outside the database threads"
+    assert 0.2 <= elapsed < 0.35, "Concurrency not bounded by the pool size"
+    assert ticks >= 10, "Event loop blocked while queries ran"
+    
+    return True
+
+def test_schema_migrations():
+    """Test that legacy databases are migrated to the unified, WAL-mode schema"""
+    print("\n🧪 Testing Schema Migrations...")
+    
+    import tempfile
+    from contextlib import closing
+    import schema
+    from database import connect
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'legacy.db')
+        
+        # A database first created by the old API: somali_sentences without category
+        with closing(sqlite3.connect(db_path)) as conn:
+            conn.execute('''
+                CREATE TABLE somali_sentences (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    text TEXT UNIQUE NOT NULL,
+                    translation TEXT,
+                    dialect TEXT,
+                    quality_score REAL,
+                    source TEXT,
+                    validated BOOLEAN DEFAULT FALSE,
+                    scholar_approved BOOLEAN DEFAULT FALSE,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    metadata TEXT
+                )
+            ''')
+            conn.execute("INSERT INTO somali_sentences (text, quality_score, metadata) VALUES (?, ?, ?)",
+                         ("Waa run", 80.0, json.dumps({"category": "religious"})))
+            conn.commit()
+        
+        version = schema.init_database(db_path)
+        assert schema.init_database(db_path) == version, "Migrations not idempotent"
+        
+        with closing(connect(db_path)) as conn:
+            journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+            row = conn.execute("SELECT text, category, quality_score FROM somali_sentences").fetchone()
+            # The religious scripts insert category; this failed on the old API schema
+            conn.execute("INSERT INTO somali_sentences (text, source, category) VALUES ('Alhamdulillah', 'pdf', 'religious')")
+            tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    
+    print(f"   Version: {version}, journal: {journal_mode}, migrated row: {dict(row)}")
+    assert version == schema.LATEST_VERSION
+    assert journal_mode == 'wal'
+    assert (row['text'], row['category'], row['quality_score']) == ("Waa run", "religious", 80.0)
+    assert {'users', 'api_usage', 'raw_data', 'religious_sources', 'web_sources'} <= tables
+    
+    return True
+
+def test_dataset_stats():
+    """Test that trigger-maintained statistics match full aggregates after every kind of write"""
+    print("\n🧪 Testing Dataset Statistics...")
+    
+    import tempfile
+    from contextlib import closing
+    import schema
+    import dataset_stats
+    from database import connect
+    
+    def direct(conn):
+        return {
+            'total': conn.execute("SELECT COUNT(*) FROM somali_sentences").fetchone()[0],
+            'validated': conn.execute("SELECT COUNT(*) FROM somali_sentences WHERE validated = 1").fetchone()[0],
+            'high_quality': conn.execute("SELECT COUNT(*) FROM somali_sentences WHERE quality_score >= 80").fetchone()[0],
+            'average': round(conn.execute("SELECT AVG(quality_score) FROM somali_sentences").fetchone()[0] or 0, 6),
+            'dialects': dict(conn.execute("SELECT dialect, COUNT(*) FROM somali_sentences GROUP BY dialect").fetchall()),
+            'recent': conn.execute("SELECT COUNT(*) FROM somali_sentences WHERE created_at > datetime('now', '-1 day')").fetchone()[0]
+        }
+    
+    def maintained(conn):
+        stats = dataset_stats.summary(conn)
+        return {
+            'total': stats['total_sentences'],
+            'validated': stats['validated'],
+            'high_quality': stats['high_quality'],
+            'average': round(stats['average_quality'], 6),
+            'dialects': dataset_stats.breakdown(conn, 'dialect'),
+            'recent': dataset_stats.recent_additions(conn, hours=24)
+        }
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'stats.db')
+        
+        with closing(connect(db_path)) as conn:
+            # Rows written before the statistics existed are backfilled by the migration
+            schema.MIGRATIONS, all_migrations = schema.MIGRATIONS[:3], schema.MIGRATIONS
+            try:
+                schema.migrate(conn)
+            finally:
+                schema.MIGRATIONS = all_migrations
+            conn.executemany(
+                "INSERT INTO somali_sentences (text, dialect, quality_score, validated, created_at) VALUES (?, ?, ?, ?, ?)",
+                [("Waa run", "Northern Somali", 85.0, True, "2020-01-01 00:00:00"),
+                 ("Waa nabad", None, 72.5, False, datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")),
+                 ("Taariikh la'aan", "Maay", 64.0, False, None)]
+            )
+            conn.commit()
+            schema.migrate(conn)
+            checks = [(direct(conn), maintained(conn))]
+            
+            conn.execute("INSERT INTO somali_sentences (text, dialect, quality_score) VALUES ('Iska warran', 'Maay', 91.0)")
+            conn.execute("UPDATE somali_sentences SET validated = 1, dialect = 'Maay' WHERE text = 'Waa nabad'")
+            conn.execute("UPDATE somali_sentences SET quality_score = 60 WHERE text = 'Waa run'")
+            conn.execute("DELETE FROM somali_sentences WHERE text = 'Iska warran'")
+            conn.commit()
+            checks.append((direct(conn), maintained(conn)))
+            
+            # A created_at that is NULL or not a timestamp has no hour; it is counted in UNKNOWN_HOUR
+            conn.execute("INSERT INTO somali_sentences (text, created_at) VALUES ('Goor aan la garanayn', NULL)")
+            conn.execute("INSERT INTO somali_sentences (text, created_at) VALUES ('Shalay', '16/10/2026')")
+            conn.execute("UPDATE somali_sentences SET created_at = NULL WHERE text = 'Waa run'")
+            conn.execute("DELETE FROM somali_sentences WHERE text = 'Taariikh la''aan'")
+            conn.commit()
+            checks.append((direct(conn), maintained(conn)))
+            unknown = conn.execute("SELECT sentences FROM sentence_hourly WHERE hour = ?", (schema.UNKNOWN_HOUR,))
+            assert unknown.fetchone()[0] == 3, "Sentences without an hour not counted"
+    
+    for expected, actual in checks:
+        print(f"   Direct: {expected}")
+        assert actual == expected, f"Maintained statistics drifted: {actual}"
+    
+    return True
+
+def test_bulk_writer():
+    """Test chunked bulk inserts: duplicate counts, rollback of a failed chunk and per-chunk statistics"""
+    print("\n🧪 Testing Bulk Writer...")
+    
+    import tempfile
+    from contextlib import closing
+    import schema
+    import dataset_stats
+    from bulk_writer import BulkWriter, SentenceWriter
+    from database import connect
+    
+    columns = ('text', 'dialect', 'quality_score', 'validated')
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'bulk.db')
+        schema.init_database(db_path)
+        
+        with closing(connect(db_path)) as conn:
+            conn.execute("INSERT INTO somali_sentences (text, dialect, quality_score) VALUES ('Jumlad 3', 'Maay', 90)")
+            conn.commit()
+            
+            # 25 rows in chunks of 10: one repeats within the import, one is already stored
+            # ("Jumlad 3" and "Jumlad 4" are near-duplicates, so detection is off)
+            rows = [(f"Jumlad {i}", ['Maay', 'Northern Somali', None][i % 3], 50 + i, i % 2 == 0) for i in range(24)]
+            rows.append(rows[5])
+            with SentenceWriter(conn, columns, chunk_size=10, near_duplicate_threshold=0) as writer:
+                writer.add_many(rows)
+            print(f"   Inserted {writer.inserted}, skipped {writer.duplicates} duplicates")
+            assert (writer.written, writer.inserted, writer.duplicates) == (25, 23, 2)
+            
+            stats = dataset_stats.summary(conn)
+            assert stats['total_sentences'] == 24
+            assert stats['validated'] == conn.execute("SELECT COUNT(*) FROM somali_sentences WHERE validated = 1").fetchone()[0]
+            assert stats['high_quality'] == conn.execute("SELECT COUNT(*) FROM somali_sentences WHERE quality_score >= 80").fetchone()[0]
+            assert dataset_stats.breakdown(conn, 'dialect') == dict(conn.execute(
+                "SELECT dialect, COUNT(*) FROM somali_sentences GROUP BY dialect").fetchall())
+            assert conn.execute("SELECT COUNT(*) FROM stats_deferred").fetchone()[0] == 0
+            
+            # Single inserts are still counted by the trigger
+            conn.execute("INSERT INTO somali_sentences (text) VALUES ('Jumlad keli ah')")
+            conn.commit()
+            assert dataset_stats.summary(conn)['total_sentences'] == 25
+            
+            # A failing chunk is rolled back; the chunk before it stays committed
+            try:
+                with BulkWriter(conn, 'somali_sentences', ('text',), chunk_size=2, on_conflict=None) as writer:
+                    writer.add_many([("Cusub 1",), ("Cusub 2",), ("Cusub 3",), ("Jumlad 0",)])
+                assert False, "Duplicate text should fail a plain INSERT"
+            except sqlite3.IntegrityError:
+                pass
+            assert (writer.written, writer.inserted) == (2, 2)
+            assert not conn.in_transaction
+            assert conn.execute("SELECT COUNT(*) FROM somali_sentences WHERE text LIKE 'Cusub %'").fetchone()[0] == 2
+    
+    print("✅ Bulk writer test passed")
+    return True
+
+def test_sentence_listing():
+    """Test that walking keyset cursors returns every matching sentence once, in order"""
+    print("\n🧪 Testing Sentence Listing...")
+    
+    import tempfile
+    from contextlib import closing
+    import schema
+    from database import connect
+    from sentence_listing import list_sentences
+    
+    def walk(conn, filters, sort, limit):
+        seen, cursor = [], None
+        while True:
+            rows, cursor = list_sentences(conn, filters, sort=sort, cursor=cursor, limit=limit)
+            seen.extend(row['id'] for row in rows)
+            if cursor is None:
+                return seen
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'listing.db')
+        schema.init_database(db_path)
+        
+        with closing(connect(db_path)) as conn:
+            # Tied and missing quality scores, so pages must break ties by id and cross into unscored rows
+            conn.executemany(
+                "INSERT INTO somali_sentences (text, dialect, quality_score, validated) VALUES (?, ?, ?, ?)",
+                [(f"Jumlad {i} " + "erey " * (i % 5), "Maay" if i % 3 == 0 else "Standard Somali",
+                  None if i % 7 == 0 else float(i % 4 * 10 + 60), i % 2 == 0) for i in range(1, 50)]
+            )
+            conn.commit()
+            
+            expected_by_quality = [row[0] for row in conn.execute(
+                "SELECT id FROM somali_sentences ORDER BY quality_score IS NULL, quality_score DESC, id DESC")]
+            expected_maay = [row[0] for row in conn.execute(
+                "SELECT id FROM somali_sentences WHERE dialect = 'Maay' AND validated = 1 "
+                "ORDER BY quality_score IS NULL, quality_score DESC, id DESC")]
+            expected_by_id = [row[0] for row in conn.execute(
+                "SELECT id FROM somali_sentences WHERE word_count >= 3 ORDER BY id")]
+            
+            for limit in (1, 4, 7, 100):
+                assert walk(conn, {}, 'quality', limit) == expected_by_quality, f"quality walk wrong at limit {limit}"
+                assert walk(conn, {'dialect': 'Maay', 'validated': True}, 'quality', limit) == expected_maay
+                assert walk(conn, {'min_words': 3}, 'id', limit) == expected_by_id
+            
+            rows, _ = list_sentences(conn, {'max_words': 2}, sort='id', limit=100)
+            assert rows and all(row['word_count'] == len(row['text'].split()) <= 2 for row in rows)
+            
+            for bad_cursor in ('not-a-cursor', 'WyJpZCIsMV0'):     # the second is a valid sort=id cursor
+                try:
+                    list_sentences(conn, {}, sort='quality', cursor=bad_cursor)
+                    assert False, f"Accepted bad cursor {bad_cursor}"
+                except ValueError:
+                    pass
+    
+    print(f"   Walked {len(expected_by_quality)} sentences at page sizes 1, 4, 7 and 100")
+    
+    return True
+
+def test_sentence_search():
+    """Test full-text search: query syntax, ranking, filters, paging and index sync"""
+    print("\n🧪 Testing Sentence Search...")
+    
+    import tempfile
+    from contextlib import closing
+    import schema
+    from database import connect
+    from sentence_search import rank_window_truncated, search_sentences
+    
+    def ids(conn, query, filters=None, sort='rank', limit=100, rank_window=None):
+        found, cursor = [], None
+        while True:
+            rows, cursor = search_sentences(conn, query, filters or {}, sort=sort, cursor=cursor, limit=limit,
+                                            rank_window=rank_window)
+            found.extend(row['id'] for row in rows)
+            if cursor is None:
+                return found
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'search.db')
+        
+        with closing(connect(db_path)) as conn:
+            # Sentences stored before the index existed are indexed by the migration
+            schema.MIGRATIONS, all_migrations = schema.MIGRATIONS[:7], schema.MIGRATIONS
+            try:
+                schema.migrate(conn)
+            finally:
+                schema.MIGRATIONS = all_migrations
+            conn.execute("INSERT INTO somali_sentences (text, translation, dialect) VALUES "
+                         "('Nabad iyo caano', 'Peace and milk', 'Maay')")
+            conn.commit()
+            schema.migrate(conn)
+            
+            conn.executemany(
+                "INSERT INTO somali_sentences (text, dialect, quality_score) VALUES (?, ?, ?)",
+                [(f"Jumlad {i}: waa run " + "nabad " * (i % 3) + ("fursad wanaagsan" if i % 4 == 0 else "shaqo"),
+                  "Maay" if i % 2 else "Standard Somali", float(60 + i)) for i in range(1, 41)]
+            )
+            conn.commit()
+            
+            def expected(where):
+                return {row[0] for row in conn.execute(f"SELECT id FROM somali_sentences WHERE {where}")}
+            
+            assert set(ids(conn, 'nabad')) == expected("text LIKE '%nabad%'")
+            assert set(ids(conn, '"waa run" AND fursad*')) == expected("text LIKE '%fursad%'")
+            assert set(ids(conn, 'nabad NOT shaqo')) == expected("text LIKE '%nabad%' AND text NOT LIKE '%shaqo%'")
+            assert set(ids(conn, 'translation:milk')) == expected("translation = 'Peace and milk'")
+            assert set(ids(conn, 'nabad', {'dialect': 'Maay', 'min_quality': 80})) == \
+                expected("text LIKE '%nabad%' AND dialect = 'Maay' AND quality_score >= 80")
+            
+            # Every page size walks the same results, best first (more repetitions rank higher)
+            ranked = ids(conn, 'nabad')
+            for limit in (1, 3, 7):
+                assert ids(conn, 'nabad', limit=limit) == ranked, f"rank walk wrong at limit {limit}"
+                assert ids(conn, 'nabad', sort='newest', limit=limit) == sorted(ranked, reverse=True)
+            # A broad query ranks only its newest matches
+            newest = sorted(ranked, reverse=True)[:5]
+            assert ids(conn, 'nabad', limit=2, rank_window=5) == [i for i in ranked if i in newest]
+            assert rank_window_truncated(conn, 'nabad', {}, 5)
+            assert ids(conn, 'nabad', rank_window=len(ranked)) == ranked
+            assert not rank_window_truncated(conn, 'nabad', {}, len(ranked))
+            
+            rows, _ = search_sentences(conn, 'nabad', {}, limit=len(ranked))
+            scores = [row['score'] for row in rows]
+            assert scores == sorted(scores, reverse=True) and rows[0]['text'].count('nabad') == 2
+            assert '<mark>nabad</mark>' in rows[0]['snippet']
+            
+            # Snippets are escaped text: stored markup cannot reach a client as HTML
+            conn.execute("INSERT INTO somali_sentences (text) VALUES (?)", ('<img src=x onerror=alert(1)> dhaqan & nabadgelyo',))
+            conn.commit()
+            rows, _ = search_sentences(conn, 'dhaqan', {})
+            assert rows[0]['snippet'] == '&lt;img src=x onerror=alert(1)&gt; <mark>dhaqan</mark> &amp; nabadgelyo', \
+                rows[0]['snippet']
+            
+            # Edits and deletes reach the index through the triggers
+            conn.execute("UPDATE somali_sentences SET text = 'Jumlad cusub: barashada' WHERE text = 'Nabad iyo caano'")
+            conn.execute("DELETE FROM somali_sentences WHERE text LIKE 'Jumlad 1:%'")
+            conn.commit()
+            assert ids(conn, 'caano') == [] and len(ids(conn, 'barashada')) == 1
+            assert ids(conn, '"Jumlad 1"') == []
+            
+            for bad_query in ('', 'nabad AND', '"waa run', 'colour:red', "Qur'aan"):
+                try:
+                    search_sentences(conn, bad_query, {})
+                    assert False, f"Accepted bad query {bad_query!r}"
+                except ValueError:
+                    pass
+    
+    print(f"   Ranked {len(ranked)} matches for 'nabad', paged at sizes 1, 3, 7 and 100")
+    
+    return True
+
+def test_near_duplicates():
+    """Test that prefix and suffix variants are rejected at ingestion and reported in clusters"""
+    print("\n🧪 Testing Near-Duplicate Detection...")
+    
+    import tempfile
+    from contextlib import closing
+    import schema
+    import near_duplicates
+    from bulk_writer import SentenceWriter
+    from database import connect
+    
+    sentences = [
+        "Waxbarashada waa muhiim u caruurta oo dhan",
+        "Dhaqaalaha Soomaaliya wuxuu ku tiirsan yahay xoolaha",
+        "Magaalada Hargeysa waxaa ku nool shan kun oo qof",
+        "Diinta Islaamka waxay baraysaa naxariista iyo dulqaadka"
+    ]
+    variants = [f"Si kastaba, {sentences[0].lower()}", f"{sentences[1]}. Waa run.",
+                f"Si kastaba, {sentences[2].lower()}. Waa run.", f"{sentences[0]}!"]
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'dedupe.db')
+        schema.init_database(db_path)
+        
+        with closing(connect(db_path)) as conn:
+            # Within one import: variants of earlier texts, and one verbatim repeat
+            rows = [(text, 'generated') for text in sentences[:2] + variants[:2] + [sentences[0]]]
+            with SentenceWriter(conn, ('text', 'source'), near_duplicate_threshold=0.6) as writer:
+                writer.add_many(rows)
+            assert (writer.inserted, writer.duplicates, writer.near_duplicates) == (2, 1, 2)
+            
+            # Across imports, against the stored sentences
+            with SentenceWriter(conn, ('text', 'source'), near_duplicate_threshold=0.6) as writer:
+                writer.add_many((text, 'scraped') for text in sentences[2:] + variants[2:])
+            assert (writer.inserted, writer.near_duplicates) == (2, 2)
+            stored = [row[0] for row in conn.execute("SELECT text FROM somali_sentences ORDER BY id")]
+            assert stored == sentences
+            
+            # The index persists next to the database; a stricter threshold lets variants through
+            assert os.path.exists(os.path.join(workdir, 'dedupe.minhash.db'))
+            match = near_duplicates.get_index(db_path, 0.6).match(conn, [variants[1]])[1][0]
+            assert match['sentence_id'] == 2 and 0.6 <= match['similarity'] < 1
+            assert near_duplicates.get_index(db_path, 0.95).match(conn, [variants[1]])[1] == [None]
+            assert near_duplicates.get_index(db_path, 0) is None
+            try:
+                near_duplicates.get_index(db_path, 0.3)
+                assert False, "Accepted a threshold the bands cannot support"
+            except ValueError:
+                pass
+            
+            report = near_duplicates.get_index(db_path, 0.6).clusters(conn)
+            assert (report['near_duplicates'], report['clusters']) == (4, 3)
+            largest = report['largest'][0]
+            assert largest['sentence']['text'] == sentences[0] and largest['near_duplicates'] == 2
+            assert {example['text'] for example in largest['examples']} == {variants[0], variants[3]}
+            
+            # A rebuild finds near-duplicates stored without the writer, and deletes nothing
+            stored_variant = conn.execute("INSERT INTO somali_sentences (text) VALUES (?)", (variants[1],)).lastrowid
+            conn.commit()
+            result = near_duplicates.get_index(db_path, 0.6).rebuild(conn, chunk_size=2)
+            assert result == {'indexed': 4, 'near_duplicates': 1}
+            # It was logged when rejected; now it is logged with its id
+            report = near_duplicates.get_index(db_path, 0.6).clusters(conn)
+            assert report['near_duplicates'] == 4
+            logged = [example for cluster in report['largest'] for example in cluster['examples']
+                      if example['text'] == variants[1]]
+            assert [example['duplicate_id'] for example in logged] == [stored_variant]
+            assert conn.execute("SELECT COUNT(*) FROM somali_sentences").fetchone()[0] == 5
+    
+    print(f"   Rejected {len(variants)} variants of {len(sentences)} sentences, "
+          f"{report['clusters']} clusters reported")
+    
+    return True
+
+def test_dataset_export():
+    """Test that chunked exports contain every matching row once, with its latest metrics"""
+    print("\n🧪 Testing Dataset Export...")
+    
+    import csv
+    import gzip
+    import io
+    import tempfile
+    from contextlib import closing
+    import schema
+    from database import connect
+    from dataset_export import export_stream, EXPORT_COLUMNS, PYARROW_AVAILABLE
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'export.db')
+        schema.init_database(db_path)
+        
+        with closing(connect(db_path)) as conn:
+            conn.executemany(
+                "INSERT INTO somali_sentences (text, dialect, quality_score, validated) VALUES (?, ?, ?, ?)",
+                [(f"Jumlad {i}", "Maay" if i % 3 == 0 else "Standard Somali", 60.0 + i % 40, i % 2 == 0)
+                 for i in range(1, 101)]
+            )
+            # Re-scored sentences: only the latest metrics row is exported
+            conn.executemany("INSERT INTO quality_metrics (sentence_id, overall_score) VALUES (?, ?)",
+                             [(i, 10.0) for i in range(1, 101)] + [(i, 99.0) for i in range(1, 101, 2)])
+            conn.commit()
+            
+            records = [json.loads(line) for chunk in export_stream({}, 'jsonl', chunk_size=7, conn=conn)
+                       for line in chunk.decode('utf-8').splitlines()]
+            assert [record['id'] for record in records] == list(range(1, 101)), "Rows lost or repeated across chunks"
+            assert all(record['overall_score'] == (99.0 if record['id'] % 2 else 10.0) for record in records)
+            assert records[1]['validated'] is True and list(records[0]) == list(EXPORT_COLUMNS)
+            
+            exported = gzip.decompress(b''.join(export_stream(
+                {'dialect': 'Maay', 'validated': True}, 'csv', 'gzip', chunk_size=4, conn=conn
+            ))).decode('utf-8')
+            rows = list(csv.DictReader(io.StringIO(exported)))
+            expected = [row[0] for row in conn.execute(
+                "SELECT id FROM somali_sentences WHERE dialect = 'Maay' AND validated = 1 ORDER BY id")]
+            assert [int(row['id']) for row in rows] == expected, "Filtered CSV export wrong"
+            
+            if PYARROW_AVAILABLE:
+                import pyarrow.parquet as pq
+                table = pq.read_table(io.BytesIO(b''.join(export_stream({}, 'parquet', 'zstd', chunk_size=30, conn=conn))))
+                assert table.num_rows == 100 and table.column('id').to_pylist() == list(range(1, 101))
+            
+            for fmt, compression in (('xml', None), ('jsonl', 'brotli'), ('arrow', 'gzip')):
+                try:
+                    export_stream({}, fmt, compression, conn=conn)
+                    assert False, f"Accepted {fmt}/{compression}"
+                except ValueError:
+                    pass
+    
+    print(f"   Exported {len(records)} rows as JSONL and {len(rows)} filtered rows as gzipped CSV")
+    
+    return True
+
+def test_segment_store():
+    """Test that segmented storage dedupes across segments and its router pages, sums and exports like one database"""
+    print("\n🧪 Testing Segment Store...")
+    
+    import random
+    import tempfile
+    from contextlib import closing
+    import schema
+    from database import connect
+    from segment_store import SEGMENT_SHIFT, get_segment_store, open_sentence_writer
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'segmented.db')
+        schema.init_database(db_path)
+        with closing(connect(db_path)) as conn:
+            conn.executemany("INSERT INTO somali_sentences (text, quality_score, source) VALUES (?, ?, ?)",
+                             [(f"Jumlad hore {i}", [None, 55.0, 70.0][i % 3], 'legacy') for i in range(1, 11)])
+            conn.commit()
+        
+        store = get_segment_store(db_path, create=True)
+        store.max_sentences = 8     # Several segments per source
+        store.max_pools = 3         # Fewer than the segments: every fan-out read closes and reopens pools
+        rng = random.Random(20)
+        with closing(connect(db_path)) as conn:
+            with open_sentence_writer(conn, ('text', 'quality_score', 'source'), chunk_size=6,
+                                      near_duplicate_threshold=0) as writer:
+                for i in range(60):
+                    writer.add((f"Jumlad cusub {i % 45}", rng.choice([None, 55.0, 70.0, 85.0]),
+                                rng.choice(['pdf', 'web'])))
+                writer.add(("Jumlad hore 4", 90.0, 'pdf'))     # Stored in the main database
+        
+        assert writer.inserted == 45 and writer.duplicates == 16, "Duplicates across segments not skipped"
+        segments = store.status()
+        assert len(segments) > 5 and all(segment['sentences'] <= 8 + 6 for segment in segments[1:])
+        
+        # Expected orders, from every segment's rows with their global ids
+        stored = []
+        for segment in store.segments():
+            with closing(connect(segment.path)) as conn:
+                stored += [(segment.global_id(row[0]), row[1])
+                           for row in conn.execute("SELECT id, quality_score FROM somali_sentences")]
+        by_quality = [sentence_id for sentence_id, quality in sorted(
+            stored, key=lambda row: (row[1] is None, -(row[1] or 0), -row[0])
+        )]
+        by_id = sorted(sentence_id for sentence_id, _ in stored)
+        assert by_id[10] >> SEGMENT_SHIFT == 1 and by_id[9] == 10, "Main database ids changed"
+        
+        for sort, expected in (('quality', by_quality), ('id', by_id)):
+            for limit in (1, 7, 100):
+                listed, cursor = [], None
+                while True:
+                    rows, cursor = store.list_sentences({}, sort, cursor, limit)
+                    listed += [row['id'] for row in rows]
+                    if cursor is None:
+                        break
+                assert listed == expected, f"sort={sort} limit={limit}: pages do not merge the segments"
+        
+        rows, _ = store.list_sentences({'source': 'web', 'min_quality': 70.0}, 'quality', limit=100)
+        assert rows and all(row['source'] == 'web' and row['quality_score'] >= 70 for row in rows)
+        
+        stats = store.summary()
+        assert stats['total_sentences'] == 55 and sum(store.breakdown('source').values()) == 55
+        assert store.breakdown('source')['legacy'] == 10
+        
+        exported = [json.loads(line)['id'] for chunk in store.export_stream({}, 'jsonl', chunk_size=4)
+                    for line in chunk.decode('utf-8').splitlines()]
+        assert exported == by_id, "Export lost or reordered rows across segments"
+        
+        # Segment pools stay few and small however many segments a read touches
+        pools = list(store._pools.values())
+        assert len(pools) == 3 and all(pool.max_connections == 2 for pool in pools), "Segment pools not bounded"
+        reopened = store.pool(store.segments()[1])
+        assert reopened not in pools and pools[0].closed, "Least recently used pool left open"
+        with reopened.connection() as conn:
+            assert conn.execute("PRAGMA cache_size").fetchone()[0] == -8192
+        
+        # Search merges every segment's matches by BM25, then global id (or newest first)
+        matches = []
+        for segment in store.segments():
+            with closing(connect(segment.path)) as conn:
+                matches += [(row[1], segment.global_id(row[0])) for row in conn.execute(
+                    "SELECT rowid, bm25(sentences_fts) FROM sentences_fts WHERE sentences_fts MATCH 'jumlad'"
+                )]
+        for sort, expected in (('rank', [sentence_id for _, sentence_id in sorted(matches)]),
+                               ('newest', sorted(by_id, reverse=True))):
+            for limit in (1, 7, 100):
+                found, cursor = [], None
+                while True:
+                    rows, cursor = store.search_sentences('jumlad', {}, sort, cursor, limit)
+                    found += [row['id'] for row in rows]
+                    if cursor is None:
+                        break
+                assert found == expected, f"sort={sort} limit={limit}: search does not merge the segments"
+        rows, _ = store.search_sentences('cusub', {'source': 'web'}, limit=100)
+        assert rows and all(row['source'] == 'web' and '<mark>cusub</mark>' in row['snippet'] for row in rows)
+        assert store.rank_window_truncated('jumlad', {}, 5) and not store.rank_window_truncated('jumlad', {}, 20)
+        
+        # The near-duplicate report merges the clusters of every segment, with global ids
+        original = "Waxbarashadu waa iftiinka nolosha iyo hormarka bulshada Soomaaliyeed oo dhan"
+        with closing(connect(db_path)) as conn:
+            for text in (original, original + " maanta"):
+                with open_sentence_writer(conn, ('text', 'source'), near_duplicate_threshold=0.6) as writer:
+                    writer.add((text, 'web'))
+        assert writer.near_duplicates == 1
+        report = store.near_duplicate_report()
+        assert report['near_duplicates'] == 1 and len(report['largest']) == 1
+        cluster = report['largest'][0]['sentence']
+        assert cluster['text'] == original and cluster['id'] >> SEGMENT_SHIFT > 0, "Cluster not in its segment"
+        
+        # A deleted text can be added again
+        last = by_id[-1]
+        segment, local_id = store.locate(last)
+        with closing(connect(segment.path)) as conn:
+            text = conn.execute("SELECT text FROM somali_sentences WHERE id = ?", (local_id,)).fetchone()[0]
+        assert store.delete(last) and not store.delete(last)
+        with closing(connect(db_path)) as conn:
+            with open_sentence_writer(conn, ('text', 'source')) as writer:
+                writer.add((text, 'pdf'))
+        assert writer.inserted == 1
+        assert store.rebuild()['hashes'] == 56
+    
+    print(f"   {len(segments)} segments; {len(by_id)} sentences paged, summed and exported in global order")
+    
+    return True
+
 def test_data_collection():
     """Test data collection system"""
     print("\n🧪 Testing Data Collection System...")
@@ -112,7 +1408,7 @@ def test_data_collection():
         print(f"   Average quality: {result['average_quality']:.1f}%")
         
         return result['total_collected'] > 0
-        
+    
     except Exception as e:
         print(f"❌ Collection error: {e}")
         return False
@@ -155,7 +1451,7 @@ def test_database_integration():
         print(f"   High quality (≥90%): {high_quality}")
         
         return total >= 1000  # Pass if we have at least 1000 sentences
-        
+    
     except Exception as e:
         print(f"❌ Database error: {e}")
         return False
@@ -202,7 +1498,7 @@ def test_enterprise_api_simulation():
             
             if passed:
                 success_count += 1
-                
+        
         except Exception as e:
             print(f"❌ ERROR {request['customer']}: {e}")
     
@@ -218,6 +1514,27 @@ def run_full_test_suite():
     
     tests = [
         ("NLP Engine", test_nlp_engine),
+        ("Batch Analysis", test_batch_analysis),
+        ("Analysis Cache", test_analysis_cache),
+        ("Analysis Components", test_analysis_components),
+        ("Metrics", test_metrics),
+        ("Benchmark Suite", test_benchmark_suite),
+        ("Analysis Pool", test_analysis_pool),
+        ("API Key Cache", test_api_key_cache),
+        ("Usage Ledger", test_usage_ledger),
+        ("Usage Rollups", test_usage_rollups),
+        ("User Listing", test_user_listing),
+        ("Rate Limiter", test_rate_limiter),
+        ("Connection Pool", test_connection_pool),
+        ("Async Database", test_async_database),
+        ("Schema Migrations", test_schema_migrations),
+        ("Dataset Statistics", test_dataset_stats),
+        ("Bulk Writer", test_bulk_writer),
+        ("Sentence Listing", test_sentence_listing),
+        ("Sentence Search", test_sentence_search),
+        ("Near-Duplicate Detection", test_near_duplicates),
+        ("Dataset Export", test_dataset_export),
+        ("Segment Store", test_segment_store),
         ("Data Collection", test_data_collection),
         ("Database Integration", test_database_integration),
         ("Enterprise API Simulation", test_enterprise_api_simulation)
@@ -235,7 +1552,7 @@ def run_full_test_suite():
             
             status = "✅ PASSED" if result else "❌ FAILED"
             print(f"\n{status}: {test_name}")
-            
+        
         except Exception as e:
             print(f"\n❌ ERROR in {test_name}: {e}")
             results.append((test_name, False))
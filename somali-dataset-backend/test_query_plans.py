@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Test Query Plans
+Every hot query must be served by an index, even on a multi-million-row corpus
+"""
+
+import os
+import re
+import sys
+import tempfile
+from contextlib import closing
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import schema
+from database import connect
+from queries import HOT_QUERIES
+from sentence_listing import SENTENCE_FILTERS, page_query
+from dataset_export import chunk_query
+from sentence_search import search_query
+from user_listing import USER_FILTERS, page_query as user_page_query
+
+# Planner statistics of a large corpus: (table or index, "rows [rows per distinct key prefix...]")
+CORPUS_ROWS = 5000000
+CORPUS_STATS = [
+    ('somali_sentences', None, f'{CORPUS_ROWS}'),
+    ('somali_sentences', 'idx_sentences_quality', f'{CORPUS_ROWS} 50'),
+    ('somali_sentences', 'idx_sentences_validated_quality', f'{CORPUS_ROWS} 2500000 50'),
+    ('somali_sentences', 'idx_sentences_created_at', f'{CORPUS_ROWS} 5'),
+    ('somali_sentences', 'idx_sentences_word_count', f'{CORPUS_ROWS} 100000'),
+    ('somali_sentences', 'idx_sentences_dialect_quality', f'{CORPUS_ROWS} 500000 50'),
+    ('somali_sentences', 'idx_sentences_source_quality', f'{CORPUS_ROWS} 250000 50'),
+    ('somali_sentences', 'idx_sentences_category_quality', f'{CORPUS_ROWS} 500000 50'),
+    ('somali_sentences', 'idx_sentences_scholar_quality', f'{CORPUS_ROWS} 2500000 50'),
+    ('quality_metrics', None, f'{CORPUS_ROWS}'),
+    ('quality_metrics', 'idx_quality_metrics_sentence', f'{CORPUS_ROWS} 1'),
+    ('users', None, '100000'),
+    ('users', 'idx_users_created_at', '100000 2'),
+    ('users', 'idx_users_plan_created_at', '100000 20000 2'),
+    ('users', 'idx_users_active_created_at', '100000 50000 2'),
+    ('usage_hourly', 'usage_hourly', '20000000 2000 2 1'),
+    ('usage_hourly', 'idx_usage_hourly_endpoint', '20000000 2000 1000 1 1'),
+    ('usage_daily', 'usage_daily', '1000000 100 2 1'),
+    ('usage_daily', 'idx_usage_daily_endpoint', '1000000 100 50 1 1')
+]
+
+# A plan step reading the whole table row by row, or sorting/grouping in a temp b-tree
+FULL_SCAN = re.compile(r'^SCAN \w+$')
+TEMP_BTREE = re.compile(r'USE TEMP B-TREE')
+
+# Sample values for the listing filters
+FILTER_VALUES = {
+    'dialect': 'Northern Somali', 'source': 'generated', 'category': 'religious',
+    'validated': True, 'scholar_approved': True, 'min_quality': 80.0, 'max_quality': 95.0,
+    'min_words': 5, 'max_words': 20, 'created_after': '2024-01-01 00:00:00',
+    'created_before': '2024-02-01 00:00:00'
+}
+EQUALITY_FILTERS = ('dialect', 'source', 'category', 'validated', 'scholar_approved')
+USER_FILTER_VALUES = {
+    'plan': 'premium', 'is_active': True, 'min_usage': 0.9, 'max_usage': 0.1,
+    'created_after': '2024-01-01 00:00:00', 'created_before': '2024-02-01 00:00:00'
+}
+
+def listing_queries() -> dict:
+    """First and deep pages of every sort, unfiltered and with each filter"""
+    
+    listings = {}
+    for name in [None] + list(SENTENCE_FILTERS):
+        filters = {name: FILTER_VALUES[name]} if name else {}
+        for sort, deep in (('quality', (87.5, 123456)), ('id', (123456,))):
+            listings[f'listing[{name}, {sort}, first]'] = page_query(filters, sort, None, 100)
+            listings[f'listing[{name}, {sort}, deep]'] = page_query(filters, sort, deep, 100)
+        listings[f'listing[{name}, unscored]'] = page_query(filters, 'quality', (None, 123456), 100, unscored=True)
+        listings[f'export[{name}]'] = chunk_query(filters, 123456, 5000)
+    return listings
+
+def user_listing_queries() -> dict:
+    """First and deep admin pages of users, unfiltered and with each filter"""
+    
+    listings = {}
+    for name in [None] + list(USER_FILTERS):
+        filters = {name: USER_FILTER_VALUES[name]} if name else {}
+        listings[f'users[{name}, first]'] = user_page_query(filters, None, 100)
+        listings[f'users[{name}, deep]'] = user_page_query(filters, ('2024-01-15 12:00:00', 12345), 100)
+    return listings
+
+def search_queries() -> dict:
+    """First and deep pages of both search sorts, unfiltered and with each filter"""
+    
+    searches = {}
+    for name in [None] + list(SENTENCE_FILTERS):
+        filters = {name: FILTER_VALUES[name]} if name else {}
+        for sort, deep in (('rank', (-7.25, 123456)), ('newest', (123456,))):
+            for page, after in (('first', None), ('deep', deep)):
+                searches[f'search[{name}, {sort}, {page}]'] = search_query('"waa run" OR nabad*', filters, sort,
+                                                                           after, 100)
+                if sort == 'rank':
+                    searches[f'search[{name}, windowed, {page}]'] = search_query(
+                        '"waa run" OR nabad*', filters, sort, after, 100, rank_window=1000
+                    )
+    return searches
+
+def query_plans(queries: dict = None) -> dict:
+    """EXPLAIN QUERY PLAN details of every hot query against a large-corpus schema"""
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'plans.db')
+        schema.init_database(db_path)
+        
+        with closing(connect(db_path)) as conn:
+            conn.execute("ANALYZE")
+            conn.execute("DELETE FROM sqlite_stat1")
+            conn.executemany("INSERT INTO sqlite_stat1 (tbl, idx, stat) VALUES (?, ?, ?)", CORPUS_STATS)
+            conn.commit()
+        
+        # A fresh connection loads the statistics
+        with closing(connect(db_path)) as conn:
+            return {
+                name: [row['detail'] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+                for name, (sql, params) in (queries or {**HOT_QUERIES, **listing_queries(), **user_listing_queries()}).items()
+            }
+
+def test_hot_queries_use_indexes():
+    """Test that no hot query scans a table or sorts in a temp b-tree"""
+    print("\n🧪 Testing Hot Query Plans...")
+    
+    failures = []
+    for name, plan in query_plans().items():
+        print(f"   {name}: {' | '.join(plan)}")
+        if any(FULL_SCAN.match(step) or TEMP_BTREE.search(step) for step in plan):
+            failures.append(f"{name}: {plan}")
+    
+    assert not failures, "Queries without a usable index:\n" + "\n".join(failures)
+    
+    return True
+
+def test_filtered_pages_need_no_sort():
+    """Test that quality-ordered pages under an equality filter walk an index in order"""
+    print("\n🧪 Testing Keyset Listing Plans...")
+    
+    plans = query_plans()
+    for name in EQUALITY_FILTERS:
+        for page in ('first', 'deep'):
+            plan = plans[f'listing[{name}, quality, {page}]']
+            assert not any(TEMP_BTREE.search(step) for step in plan), f"{name} {page} page sorts: {plan}"
+    
+    # Admin user pages filtered by plan or activity walk that column's (column, created_at) index
+    for name in ('plan', 'is_active'):
+        for page in ('first', 'deep'):
+            plan = plans[f'users[{name}, {page}]']
+            assert any(f'idx_users_{name.split("_")[-1]}_created_at' in step for step in plan), \
+                f"users {name} {page} page leaves its index: {plan}"
+    
+    return True
+
+def test_export_walks_primary_key():
+    """Test that export chunks read sentences in id order and find their metrics by index"""
+    print("\n🧪 Testing Export Plans...")
+    
+    for name, plan in query_plans().items():
+        if name.startswith('export['):
+            assert 'SEARCH s USING INTEGER PRIMARY KEY (rowid>?)' in plan, f"{name} leaves the primary key: {plan}"
+            assert any('idx_quality_metrics_sentence' in step for step in plan), f"{name} scans metrics: {plan}"
+    
+    return True
+
+def test_search_drives_from_fts_index():
+    """Test that searches read matches from the full-text index and filter them by primary key lookups"""
+    print("\n🧪 Testing Search Plans...")
+    
+    for name, plan in query_plans(search_queries()).items():
+        print(f"   {name}: {' | '.join(plan)}")
+        index_steps = [i for i, step in enumerate(plan) if step.startswith('SCAN sentences_fts VIRTUAL TABLE')]
+        assert index_steps, f"{name} does not read the index: {plan}"
+        if not name.startswith('search[None,'):
+            assert plan[index_steps[0] + 1] == 'SEARCH s USING INTEGER PRIMARY KEY (rowid=?)', \
+                f"{name} scans sentences: {plan}"
+        # Newest-first reads matches in rowid order; a windowed ranking sorts only the window it scored
+        if ', newest,' in name:
+            assert not any(TEMP_BTREE.search(step) for step in plan), f"{name} sorts: {plan}"
+        elif ', windowed,' in name:
+            assert plan[0] == 'CO-ROUTINE (subquery-1)', f"{name} ranks every match: {plan}"
+    
+    return True
+
+def test_stats_queries_skip_sentences():
+    """Test that statistics come from the maintained buckets, not from somali_sentences"""
+    print("\n🧪 Testing Statistics Plans...")
+    
+    plans = query_plans()
+    for name in ('stats_summary', 'stats_category', 'stats_breakdown'):
+        assert not any('somali_sentences' in step for step in plans[name]), f"{name} reads sentences: {plans[name]}"
+    
+    # Only the partial oldest hour is counted from sentences, through the created_at index
+    sentence_steps = [step for step in plans['recent_additions'] if 'somali_sentences' in step]
+    assert sentence_steps and all(step.startswith('SEARCH') and 'COVERING INDEX' in step for step in sentence_steps), \
+        f"recent_additions scans sentences: {plans['recent_additions']}"
+    
+    return True
+
+if __name__ == "__main__":
+    success = (test_hot_queries_use_indexes() and test_filtered_pages_need_no_sort()
+               and test_export_walks_primary_key() and test_search_drives_from_fts_index()
+               and test_stats_queries_skip_sentences())
+    print("\n✅ All hot queries indexed" if success else "\n❌ Unindexed hot queries")
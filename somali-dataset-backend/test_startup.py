@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Test API Startup Budget
+Cold import of the API must stay cheap: no engines, no SQLite, no heavy modules
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Seconds allowed for a cold `import main`; override on slow CI machines
+STARTUP_BUDGET_SECONDS = float(os.environ.get('STARTUP_BUDGET_SECONDS', 1.5))
+
+PROBE = f"""
+import json, os, sys, time
+sys.path.insert(0, {BACKEND_DIR!r})
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'seconds': elapsed,
+    'heavy_modules': [name for name in ('numpy', 'aiohttp') if name in sys.modules],
+    'engine_built': sys.modules['enterprise_nlp']._nlp_engine is not None,
+    'collector_built': sys.modules['data_collection_system']._data_collector is not None,
+    'files_created': os.listdir('.')
+}}))
+"""
+
+def probe_cold_import() -> dict:
+    """Import main in a fresh interpreter and an empty working directory"""
+    
+    with tempfile.TemporaryDirectory() as workdir:
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE], cwd=workdir, capture_output=True, text=True, check=True
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def test_cold_import_is_lazy():
+    """Test that importing the API does no initialization work"""
+    print("\n🧪 Testing Lazy API Import...")
+    
+    result = probe_cold_import()
+    print(f"   Heavy modules: {result['heavy_modules']}, files: {result['files_created']}")
+    
+    assert result['heavy_modules'] == [], "Heavy modules imported at startup"
+    assert not result['engine_built'], "NLP engine built at import"
+    assert not result['collector_built'], "Data collector built at import"
+    assert result['files_created'] == [], "Database touched at import"
+    
+    return True
+
+def test_startup_budget():
+    """Test that a cold import of the API fits the startup budget"""
+    print("\n🧪 Testing Startup Budget...")
+    
+    # Best of three, so a busy machine does not fail the budget on one slow run
+    seconds = min(probe_cold_import()['seconds'] for _ in range(3))
+    print(f"   Cold import: {seconds:.3f}s (budget {STARTUP_BUDGET_SECONDS:.1f}s)")
+    
+    assert seconds <= STARTUP_BUDGET_SECONDS, f"Cold import took {seconds:.3f}s"
+    
+    return True
+
+if __name__ == "__main__":
+    success = test_cold_import_is_lazy() and test_startup_budget()
+    print("\n✅ Startup within budget" if success else "\n❌ Startup over budget")
@@ -0,0 +1,382 @@
+"""
+Enterprise Usage Ledger
+Write-behind API usage accounting: requests are counted in memory and journaled, then flushed in batches
+"""
+
+import fcntl
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from database import DEFAULT_DB_PATH, get_pool
+from metrics import metrics, DB_CALL_SECONDS
+from usage_rollups import DEFAULT_RETENTION_DAYS, add_usage_rollups, prune_usage
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SUFFIX = '.journal'
+PRUNE_INTERVAL = 3600     # Seconds between prunes of raw usage rows
+
+def journal_directory(db_path: str) -> str:
+    """Directory of the usage journals kept next to a database file"""
+    return os.path.splitext(db_path)[0] + '.usage'
+
+def _timestamp() -> str:
+    """Current UTC time in the format of CURRENT_TIMESTAMP"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def _parse_line(line: bytes) -> Optional[Tuple[int, str, str, int]]:
+    """(user_id, endpoint, timestamp, requests) of a journal line; None for a line torn by a crash"""
+    
+    try:
+        user_id, endpoint, timestamp, requests = line.decode('utf-8').split('\t')
+        return int(user_id), endpoint, timestamp, int(requests)
+    except ValueError:
+        return None
+
+def apply_usage(conn: sqlite3.Connection, usage: Dict[Tuple[int, str, str], int], journals: Iterable[str] = ()):
+    """
+    Add aggregated usage to api_usage, its rollups and users.requests_used in one transaction
+    
+    Args:
+        conn: Connection to write with
+        usage: (user_id, endpoint, timestamp) -> requests
+        journals: Journal files these requests came from, marked applied in
+            the same transaction so a replay after a crash skips them
+    """
+    
+    per_user = defaultdict(int)
+    for (user_id, _, _), requests in usage.items():
+        per_user[user_id] += requests
+    
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "INSERT INTO api_usage (user_id, endpoint, timestamp, requests) VALUES (?, ?, ?, ?)",
+            [(user_id, endpoint, timestamp, requests) for (user_id, endpoint, timestamp), requests in usage.items()]
+        )
+        add_usage_rollups(conn, usage)
+        conn.executemany("UPDATE users SET requests_used = requests_used + ? WHERE id = ?",
+                         [(requests, user_id) for user_id, requests in per_user.items()])
+        conn.executemany("INSERT OR IGNORE INTO usage_journals_applied (name) VALUES (?)",
+                         [(os.path.basename(path),) for path in journals])
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+def _forget_journals(conn: sqlite3.Connection, paths: List[str]):
+    """Delete applied journal files, then their applied markers"""
+    
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+    conn.executemany("DELETE FROM usage_journals_applied WHERE name = ?", [(os.path.basename(path),) for path in paths])
+    conn.commit()
+
+class UsageLedger:
+    """
+    Counts API usage per user and endpoint in memory and writes it to the database in batches.
+    
+    record() appends the request to this process's journal file and adds it
+    to an in-memory tally; a background thread flushes the tally every
+    flush_interval seconds, or sooner once flush_events requests are pending,
+    with one transaction that inserts an api_usage row per (user, endpoint,
+    second), adds them to the hourly and daily rollups and bumps
+    users.requests_used, so all of them always agree (until raw rows past
+    retention_days are pruned; the rollups keep their requests).
+    
+    Every flush seals the current journal file and starts a new one; the
+    flush transaction marks the sealed files applied and they are deleted
+    afterwards. A process that dies between two flushes leaves its journals
+    behind, and the next ledger to start on the database replays them
+    (recover), skipping files already marked applied. Each live process
+    holds an exclusive flock on its journals, so only orphaned files are
+    replayed. Requests journaled but not yet flushed are lost only if the
+    machine itself crashes, unless fsync is set.
+    """
+    
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, flush_interval: float = 1.0,
+                 flush_events: int = 1000, fsync: bool = False, retention_days: int = DEFAULT_RETENTION_DAYS):
+        """
+        Args:
+            db_path: SQLite database file
+            flush_interval: Seconds between flushes of the pending usage
+            flush_events: Pending requests that trigger an early flush
+            fsync: Sync the journal to disk on every record
+            retention_days: Age at which the background thread prunes raw
+                api_usage rows (hourly); 0 keeps them
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.flush_events = flush_events
+        self.fsync = fsync
+        self.retention_days = retention_days
+        self._pruned_at = 0.0
+        self.directory = journal_directory(db_path)
+        self._token = f"{os.getpid()}-{secrets.token_hex(4)}"
+        self._sequence = 0
+        
+        self._pending: Dict[Tuple[int, str, str], int] = defaultdict(int)
+        self._pending_users: Dict[int, int] = defaultdict(int)
+        self._pending_events = 0
+        self._generation = 0    # Flushes whose requests have moved from pending() to requests_used
+        self._journal: Optional[int] = None     # File descriptor of the open journal
+        self._journal_path: Optional[str] = None
+        self._sealed: List[Tuple[str, int]] = []    # (path, fd) of journals awaiting a flush
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        
+        self.flushes = 0
+        self.flushed_requests = 0
+        self.flush_errors = 0
+    
+    @classmethod
+    def from_env(cls, db_path: str = DEFAULT_DB_PATH) -> 'UsageLedger':
+        """Build a ledger configured by USAGE_FLUSH_INTERVAL_MS, _FLUSH_EVENTS, _JOURNAL_FSYNC and _RETENTION_DAYS"""
+        return cls(
+            db_path=db_path,
+            flush_interval=float(os.environ.get('USAGE_FLUSH_INTERVAL_MS', 1000)) / 1000,
+            flush_events=int(os.environ.get('USAGE_FLUSH_EVENTS', 1000)),
+            fsync=os.environ.get('USAGE_JOURNAL_FSYNC', '').lower() in ('1', 'true', 'yes'),
+            retention_days=int(os.environ.get('USAGE_RETENTION_DAYS', DEFAULT_RETENTION_DAYS))
+        )
+    
+    def _open_journal(self):
+        """Start a new journal file, locked for as long as this process owns it"""
+        
+        os.makedirs(self.directory, exist_ok=True)
+        self._sequence += 1
+        path = os.path.join(self.directory, f"{self._token}-{self._sequence:06d}{JOURNAL_SUFFIX}")
+        # Locked before it gets the name recover() looks for
+        fd = os.open(path + '.new', os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        os.rename(path + '.new', path)
+        self._journal, self._journal_path = fd, path
+    
+    def record(self, user_id: int, endpoint: str, requests: int = 1):
+        """
+        Count requests of a user to an endpoint; written to the database by the next flush
+        
+        With fsync this waits for the disk: call it off the event loop.
+        """
+        
+        timestamp = _timestamp()
+        line = f"{user_id}\t{endpoint}\t{timestamp}\t{requests}\n".encode('utf-8')
+        with self._lock:
+            if self._journal is None:
+                self._open_journal()
+            # One write of an O_APPEND file: a process crash never leaves half a line
+            os.write(self._journal, line)
+            if self.fsync:
+                os.fsync(self._journal)
+            self._pending[(user_id, endpoint, timestamp)] += requests
+            self._pending_users[user_id] += requests
+            self._pending_events += 1
+            if self._pending_events >= self.flush_events:
+                self._wake.set()
+    
+    def pending(self, user_id: int) -> int:
+        """Requests of a user not yet flushed to users.requests_used"""
+        
+        with self._lock:
+            return self._pending_users.get(user_id, 0)
+    
+    @property
+    def generation(self) -> int:
+        """
+        Changes each time a flush moves requests from pending() to users.requests_used
+        
+        A caller adding pending() to a requests_used it read from the database
+        reads generation before both: if it is unchanged afterwards the sum
+        counts every request at least once.
+        """
+        return self._generation
+    
+    @metrics.timed(DB_CALL_SECONDS, 'usage_flush')
+    def flush(self) -> int:
+        """
+        Write the pending usage in one transaction
+        
+        Returns:
+            Requests written
+        
+        Raises:
+            sqlite3.Error, PoolTimeout: The usage stays pending (and journaled) for the next flush
+        """
+        
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                usage, self._pending = self._pending, defaultdict(int)
+                # The users' pending counts stay until the apply commits, so a user loaded
+                # meanwhile sees these requests in pending() or in requests_used, never neither
+                self._pending_events = 0
+                self._wake.clear()
+                if self._journal is not None:
+                    self._sealed.append((self._journal_path, self._journal))
+                    self._journal = self._journal_path = None
+                sealed = list(self._sealed)
+            
+            paths = [path for path, _ in sealed]
+            try:
+                # Checking out the connection is part of the apply: a PoolTimeout must not drop the usage
+                with get_pool(self.db_path).connection() as conn:
+                    apply_usage(conn, usage, paths)
+            except BaseException:
+                with self._lock:
+                    for key, requests in usage.items():
+                        self._pending[key] += requests
+                self.flush_errors += 1
+                raise
+            
+            for path, fd in sealed:
+                os.close(fd)
+            with self._lock:
+                self._sealed = self._sealed[len(sealed):]
+                for (user_id, _, _), requests in usage.items():
+                    self._pending_users[user_id] -= requests
+                    if not self._pending_users[user_id]:
+                        del self._pending_users[user_id]
+                self._generation += 1
+            try:
+                with get_pool(self.db_path).connection() as conn:
+                    _forget_journals(conn, paths)
+            except Exception as e:
+                # Applied, so a leftover file or marker is skipped by recover() and retried there
+                logger.warning(f"Could not remove applied usage journals: {e}")
+            
+            requests = sum(usage.values())
+            self.flushes += 1
+            self.flushed_requests += requests
+            return requests
+    
+    def recover(self) -> int:
+        """
+        Replay the journals left by processes that stopped before flushing them
+        
+        Returns:
+            Requests replayed
+        """
+        
+        if not os.path.isdir(self.directory):
+            return 0
+        
+        replayed = 0
+        with get_pool(self.db_path).connection() as conn:
+            for name in sorted(os.listdir(self.directory)):
+                path = os.path.join(self.directory, name)
+                if not name.endswith(JOURNAL_SUFFIX) or name.startswith(self._token + '-'):
+                    continue
+                try:
+                    fd = os.open(path, os.O_RDONLY)
+                except FileNotFoundError:
+                    continue    # Replayed and removed by another process starting alongside this one
+                try:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue    # Owned by a live process
+                    try:
+                        if os.stat(path).st_ino != os.fstat(fd).st_ino:
+                            continue
+                    except FileNotFoundError:
+                        continue    # Replayed and removed between our open and our lock
+                    
+                    usage = defaultdict(int)
+                    with os.fdopen(os.dup(fd), 'rb') as f:
+                        for line in f:
+                            entry = _parse_line(line.rstrip(b'\n'))
+                            if entry is not None:
+                                user_id, endpoint, timestamp, requests = entry
+                                usage[(user_id, endpoint, timestamp)] += requests
+                    
+                    # The applied check and the apply share one write transaction, so two
+                    # processes recovering at once cannot both replay a journal
+                    conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        applied = conn.execute("SELECT 1 FROM usage_journals_applied WHERE name = ?",
+                                               (name,)).fetchone()
+                    except sqlite3.Error:
+                        conn.rollback()
+                        raise
+                    if applied is None:
+                        apply_usage(conn, usage, [path])
+                        replayed += sum(usage.values())
+                    else:
+                        conn.rollback()
+                    _forget_journals(conn, [path])
+                finally:
+                    os.close(fd)
+        return replayed
+    
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            try:
+                self.flush()
+                if self.retention_days and time.monotonic() - self._pruned_at >= PRUNE_INTERVAL:
+                    self._pruned_at = time.monotonic()
+                    with get_pool(self.db_path).connection() as conn:
+                        prune_usage(self.retention_days, conn=conn)
+            except Exception:
+                # Pending usage was restored by flush(); keep the thread alive and back off
+                logger.exception("Usage flush failed, retrying")
+                self._stop.wait(self.flush_interval)
+    
+    def start(self):
+        """Replay orphaned journals and start flushing in the background"""
+        
+        self.recover()
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='usage-ledger', daemon=True)
+            self._thread.start()
+    
+    def close(self):
+        """Stop the background thread and flush what is pending"""
+        
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+    
+    def stats(self) -> Dict:
+        """Pending and flushed request counts"""
+        
+        with self._lock:
+            return {
+                'pending_requests': sum(self._pending.values()),
+                'pending_events': self._pending_events,
+                'flushes': self.flushes,
+                'flushed_requests': self.flushed_requests,
+                'flush_errors': self.flush_errors
+            }
+
+_ledgers: Dict[str, UsageLedger] = {}
+_ledgers_lock = threading.Lock()
+
+def get_usage_ledger(db_path: str = DEFAULT_DB_PATH) -> UsageLedger:
+    """Shared ledger of a database file, configured from the environment"""
+    
+    key = os.path.abspath(db_path)
+    with _ledgers_lock:
+        ledger = _ledgers.get(key)
+        if ledger is None:
+            ledger = _ledgers[key] = UsageLedger.from_env(db_path)
+        return ledger
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Enterprise Usage Rollups
+Hourly and daily API usage per user and endpoint, retention of raw usage rows, and usage reports
+"""
+
+import argparse
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+import queries
+from database import DEFAULT_DB_PATH, get_pool
+from sentence_listing import parse_timestamp
+
+# granularity -> (rollup table, bucket format, bucket length, default report window)
+GRANULARITIES = {
+    'hour': ('usage_hourly', '%Y-%m-%d %H:00:00', timedelta(hours=1), timedelta(hours=48)),
+    'day': ('usage_daily', '%Y-%m-%d', timedelta(days=1), timedelta(days=30))
+}
+MAX_BUCKETS = 2000
+DEFAULT_RETENTION_DAYS = 30
+PRUNE_BATCH_SIZE = 10000
+
+def add_usage_rollups(conn: sqlite3.Connection, usage: Dict[Tuple[int, str, str], int]):
+    """Add (user_id, endpoint, timestamp) -> requests to the hourly and daily rollups, in the caller's transaction"""
+    
+    rows = [(user_id, endpoint, timestamp, requests) for (user_id, endpoint, timestamp), requests in usage.items()]
+    for table, bucket in (('usage_hourly', "strftime('%Y-%m-%d %H:00:00', ?)"), ('usage_daily', 'date(?)')):
+        conn.executemany(f'''
+            INSERT INTO {table} (user_id, endpoint, bucket, requests) VALUES (?, ?, {bucket}, ?)
+            ON CONFLICT (user_id, bucket, endpoint) DO UPDATE SET requests = requests + excluded.requests
+        ''', rows)
+
+def prune_usage(retention_days: int = DEFAULT_RETENTION_DAYS, batch_size: int = PRUNE_BATCH_SIZE,
+                conn: Optional[sqlite3.Connection] = None) -> int:
+    """
+    Delete raw api_usage rows older than retention_days; their requests stay in the rollups
+    
+    Rows go batch_size per transaction, so API writes interleave with a large prune.
+    
+    Returns:
+        Rows deleted
+    """
+    
+    deleted = 0
+    with get_pool().connection(conn) as conn:
+        while True:
+            cursor = conn.execute('''
+                DELETE FROM api_usage WHERE id IN (
+                    SELECT id FROM api_usage WHERE timestamp < datetime('now', ?) LIMIT ?
+                )
+            ''', (f'-{retention_days} days', batch_size))
+            conn.commit()
+            deleted += cursor.rowcount
+            if cursor.rowcount < batch_size:
+                return deleted
+
+def _bucket_range(granularity: str, start: Optional[str], end: Optional[str]) -> Tuple[datetime, datetime]:
+    """First bucket and the end (exclusive) of a report; the default window ends with the current bucket"""
+    
+    _, fmt, step, window = GRANULARITIES[granularity]
+    
+    def floor(value: datetime) -> datetime:
+        return datetime.strptime(value.strftime(fmt), fmt)
+    
+    if end is not None:
+        end_at = datetime.strptime(parse_timestamp(end), '%Y-%m-%d %H:%M:%S')
+        # A bucket is included once any of it is within the range
+        end_at = floor(end_at) + step if floor(end_at) != end_at else end_at
+    else:
+        end_at = floor(datetime.now(timezone.utc).replace(tzinfo=None)) + step
+    if start is not None:
+        start_at = floor(datetime.strptime(parse_timestamp(start), '%Y-%m-%d %H:%M:%S'))
+    else:
+        start_at = end_at - window
+    return start_at, end_at
+
+def usage_report(user_id: int, granularity: str = 'day', start: Optional[str] = None, end: Optional[str] = None,
+                 endpoint: Optional[str] = None, conn: Optional[sqlite3.Connection] = None) -> Dict:
+    """
+    A user's requests per UTC hour or day (zero-filled) and per endpoint, from the rollups
+    
+    Args:
+        user_id: User to report on
+        granularity: 'hour' or 'day'
+        start: ISO date or datetime of the first bucket (default: 48 hours or 30 days before end)
+        end: ISO date or datetime ending the report, exclusive (default: the current bucket included)
+        endpoint: Only this endpoint's requests
+    
+    Raises:
+        ValueError: For an unknown granularity, an invalid timestamp or more than MAX_BUCKETS buckets
+    """
+    
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Invalid granularity: {granularity}. Use one of: {', '.join(GRANULARITIES)}")
+    table, fmt, step, _ = GRANULARITIES[granularity]
+    start_at, end_at = _bucket_range(granularity, start, end)
+    if end_at <= start_at:
+        raise ValueError("end must be after start")
+    if (end_at - start_at) / step > MAX_BUCKETS:
+        raise ValueError(f"At most {MAX_BUCKETS} {granularity}s per report")
+    
+    bounds = (start_at.strftime(fmt), end_at.strftime(fmt))
+    with get_pool().connection(conn) as conn:
+        if endpoint is None:
+            sql, params = queries.USAGE_ROWS, (user_id, *bounds)
+        else:
+            sql, params = queries.USAGE_ENDPOINT_ROWS, (user_id, endpoint, *bounds)
+        rows = conn.execute(sql.format(table=table), params).fetchall()
+    
+    series, endpoints = {}, {}
+    for bucket, name, requests in rows:
+        series[bucket] = series.get(bucket, 0) + requests
+        endpoints[name] = endpoints.get(name, 0) + requests
+    
+    buckets = []
+    at = start_at
+    while at < end_at:
+        bucket = at.strftime(fmt)
+        buckets.append({'bucket': bucket, 'requests': series.get(bucket, 0)})
+        at += step
+    
+    return {
+        'granularity': granularity,
+        'start': bounds[0],
+        'end': bounds[1],
+        'endpoint': endpoint,
+        'total': sum(endpoints.values()),
+        'series': buckets,
+        'endpoints': dict(sorted(endpoints.items(), key=lambda item: -item[1]))
+    }
+
+def main():
+    """Command-line entry point"""
+    
+    parser = argparse.ArgumentParser(description="Report a user's API usage, or prune raw usage rows")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH)
+    parser.add_argument('--email', help="User to report on")
+    parser.add_argument('--granularity', choices=list(GRANULARITIES), default='day')
+    parser.add_argument('--start')
+    parser.add_argument('--end')
+    parser.add_argument('--prune', action='store_true', help="Delete raw rows older than --retention-days")
+    parser.add_argument('--retention-days', type=int, default=DEFAULT_RETENTION_DAYS)
+    args = parser.parse_args()
+    
+    with get_pool(args.db).connection() as conn:
+        if args.prune:
+            print(f"🧹 Pruned {prune_usage(args.retention_days, conn=conn):,} api_usage rows "
+                  f"older than {args.retention_days} days")
+        if args.email:
+            row = conn.execute("SELECT id FROM users WHERE email = ?", (args.email,)).fetchone()
+            if row is None:
+                parser.error(f"No user with email {args.email}")
+            report = usage_report(row[0], args.granularity, args.start, args.end, conn=conn)
+            print(f"📊 {report['total']:,} requests by {args.email}, {report['start']} to {report['end']}")
+            for point in report['series']:
+                if point['requests']:
+                    print(f"   {point['bucket']}: {point['requests']:,}")
+            for name, requests in report['endpoints'].items():
+                print(f"   {name}: {requests:,}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Enterprise User Listing
+Keyset-paginated, filterable reads of users for the admin API, and the per-plan summary
+"""
+
+import json
+import sqlite3
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pagination
+import queries
+from database import DEFAULT_DB_PATH, get_pool
+
+USER_COLUMNS = 'id, email, plan, requests_used, requests_limit, created_at, is_active'
+
+# Filter name -> condition; plan and is_active lead a (column, created_at) index,
+# the usage ratio (requests_used / requests_limit) is checked on the rows read
+USER_FILTERS = {
+    'plan': 'plan = ?',
+    'is_active': 'is_active = ?',
+    'min_usage': 'requests_used >= ? * requests_limit',
+    'max_usage': 'requests_used <= ? * requests_limit',
+    'created_after': 'created_at >= ?',
+    'created_before': 'created_at < ?'
+}
+
+DEFAULT_CHUNK_SIZE = 1000
+
+def encode_cursor(row: Dict) -> str:
+    """Opaque cursor pointing just past row"""
+    return pagination.encode_cursor([row['created_at'], row['id']])
+
+def decode_cursor(cursor: str) -> tuple:
+    """Keyset position of a cursor; ValueError if it is malformed"""
+    
+    key = pagination.decode_cursor(cursor)
+    if len(key) == 2 and isinstance(key[0], str) and isinstance(key[1], int):
+        return key[0], key[1]
+    raise ValueError("Invalid cursor")
+
+def page_query(filters: Dict, after: Optional[tuple] = None, limit: int = 100) -> Tuple[str, List]:
+    """
+    SQL and parameters for one page of users, newest first
+    
+    Args:
+        filters: USER_FILTERS name -> value
+        after: Keyset position from decode_cursor; None for the first page
+        limit: Page size
+    """
+    
+    conditions = [USER_FILTERS[name] for name in filters]
+    params = list(filters.values())
+    if after is not None:
+        conditions.append('(created_at, id) < (?, ?)')
+        params.extend(after)
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    return (f"SELECT {USER_COLUMNS} FROM users {where} ORDER BY created_at DESC, id DESC LIMIT ?",
+            params + [limit])
+
+def check_filters(filters: Dict):
+    """ValueError for an unknown filter"""
+    
+    unknown = sorted(set(filters) - set(USER_FILTERS))
+    if unknown:
+        raise ValueError(f"Unknown user filter: {', '.join(unknown)}")
+
+def _row_to_dict(row: sqlite3.Row) -> Dict:
+    user = dict(row)
+    user['is_active'] = bool(user['is_active'])
+    return user
+
+def list_users(conn: sqlite3.Connection, filters: Dict, cursor: Optional[str] = None,
+               limit: int = 100) -> Tuple[List[Dict], Optional[str]]:
+    """
+    One page of users and the cursor of the next page (None on the last page)
+    
+    Every page is a bounded index range read, so page 1,000 costs what page 1 does.
+    """
+    
+    check_filters(filters)
+    after = decode_cursor(cursor) if cursor else None
+    sql, params = page_query(filters, after, limit)
+    rows = [_row_to_dict(row) for row in conn.execute(sql, params)]
+    
+    next_cursor = encode_cursor(rows[-1]) if len(rows) == limit else None
+    return rows, next_cursor
+
+def stream_users(filters: Dict, chunk_size: int = DEFAULT_CHUNK_SIZE, conn: Optional[sqlite3.Connection] = None,
+                 db_path: str = DEFAULT_DB_PATH) -> Iterator[bytes]:
+    """
+    Every matching user as NDJSON, newest first, chunk_size users per keyset query and output chunk
+    
+    Raises:
+        ValueError: For an unknown filter (raised here, before any output is produced)
+    """
+    
+    check_filters(filters)
+    
+    def chunks() -> Iterator[bytes]:
+        after = None
+        while True:
+            sql, params = page_query(filters, after, chunk_size)
+            with get_pool(db_path).connection(conn) as chunk_conn:
+                rows = [_row_to_dict(row) for row in chunk_conn.execute(sql, params)]
+            if rows:
+                yield ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows).encode('utf-8')
+            if len(rows) < chunk_size:
+                return
+            after = (rows[-1]['created_at'], rows[-1]['id'])
+    
+    return chunks()
+
+def count_users(conn: sqlite3.Connection, filters: Dict) -> int:
+    """
+    Users matching filters
+    
+    Filters on plan and activity only are answered from user_plan_stats;
+    usage and creation filters count the users table.
+    """
+    
+    check_filters(filters)
+    if set(filters) <= {'plan', 'is_active'}:
+        users, active = conn.execute(queries.PLAN_USER_COUNTS, (filters.get('plan'),)).fetchone()
+        if 'is_active' not in filters:
+            return users
+        return active if filters['is_active'] else users - active
+    
+    where = ' AND '.join(USER_FILTERS[name] for name in filters)
+    return conn.execute(f"SELECT COUNT(*) FROM users WHERE {where}", list(filters.values())).fetchone()[0]
+
+def plan_summary(conn: sqlite3.Connection) -> Dict:
+    """User and request counts overall and per plan, from the trigger-maintained user_plan_stats"""
+    
+    plans = {}
+    for plan, users, active, exhausted, requests_used, requests_limit in conn.execute(queries.PLAN_SUMMARY):
+        if users:
+            plans[plan] = {
+                'users': users,
+                'active_users': active,
+                'exhausted_users': exhausted,
+                'requests_used': requests_used,
+                'requests_limit': requests_limit
+            }
+    
+    return {
+        'total_users': sum(plan['users'] for plan in plans.values()),
+        'active_users': sum(plan['active_users'] for plan in plans.values()),
+        'plans': plans
+    }
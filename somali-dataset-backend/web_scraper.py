@@ -6,12 +6,49 @@ Extract religious content from SomaliTalk and similar sites
 
 import requests
 from bs4 import BeautifulSoup
-import sqlite3
 import json
 import re
 from datetime import datetime
 from typing import List, Dict
 import time
+from lexicon_matcher import lexicon_matcher, WORD
+from database import connect
+from segment_store import open_sentence_writer
+import schema
+
+# Somali language indicators (matched as whole words)
+SOMALI_INDICATORS = [
+    'waa', 'baa', 'ayaa', 'oo', 'iyo', 'ka', 'ku', 'la', 'ah', 'si',
+    'waxa', 'waxaa', 'waxay', 'wuxuu', 'inuu', 'inay', 'ugu', 'soo'
+]
+
+# Religious stems marking religious content (matched inside inflected words)
+RELIGIOUS_INDICATORS = [
+    'allah', 'allaah', 'islaam', 'diinta', 'nabiga', 'quraanka', 'salaad',
+    'muslim', 'muslimiinta', 'ducada', 'masjid', 'diin', 'kitaab',
+    'bismillah', 'alhamdulillah', 'subhanallah', 'inshallah', 'mashaallah'
+]
+
+RELIGIOUS_TERMS = [
+    'allah', 'allaah', 'islaam', 'diinta', 'nabiga', 'quraanka', 'salaad',
+    'ramadan', 'hajj', 'xaj', 'saum', 'zakah', 'shahaadah', 'imaan',
+    'muslim', 'muslimiinta', 'ducada', 'masjid', 'diin', 'kitaab',
+    'ayah', 'surah', 'hadith', 'sunnah', 'rasul', 'rasuul',
+    'bismillah', 'alhamdulillah', 'subhanallah', 'astaghfirullah',
+    'inshallah', 'mashaallah', 'barakallahu', 'jannah', 'naar',
+    'akhirah', 'dunya', 'taqwa', 'sabr', 'shukr', 'halal', 'haram',
+    'qiyaam', 'qiyaama', "malaa'iig", 'jin', 'shaydan', 'iblees'
+]
+
+SOMALI_PATTERNS = ['waa', 'baa', 'ayaa', 'waxa', 'waxaa', 'waxay']
+
+ISLAMIC_PHRASES = ['bismillah', 'alhamdulillah', 'subhanallah', 'inshallah', 'mashaallah']
+
+lexicon_matcher.add_lexicon('web.somali_indicators', SOMALI_INDICATORS)
+lexicon_matcher.add_lexicon('web.religious_indicators', RELIGIOUS_INDICATORS)
+lexicon_matcher.add_lexicon('web.religious_terms', RELIGIOUS_TERMS)
+lexicon_matcher.add_lexicon('web.somali_patterns', SOMALI_PATTERNS)
+lexicon_matcher.add_lexicon('web.islamic_phrases', ISLAMIC_PHRASES)
 
 class SomaliWebScraper:
     """Scrape authentic Somali religious content from websites"""
@@ -22,39 +59,7 @@ class SomaliWebScraper:
     
     def init_database(self):
         """Initialize database for web scraped content"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS somali_sentences (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                text TEXT UNIQUE NOT NULL,
-                translation TEXT,
-                dialect TEXT DEFAULT 'Standard Somali',
-                quality_score REAL DEFAULT 95.0,
-                source TEXT,
-                category TEXT DEFAULT 'religious',
-                validated BOOLEAN DEFAULT TRUE,
-                scholar_approved BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                metadata TEXT
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS web_sources (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                url TEXT UNIQUE NOT NULL,
-                title TEXT,
-                content_type TEXT,
-                sentences_extracted INTEGER DEFAULT 0,
-                scraping_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                status TEXT DEFAULT 'success'
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        schema.init_database(self.db_path)
         print("✅ Database initialized for web scraping")
     
     def scrape_somalitalk_page(self, url: str) -> Dict:
@@ -181,24 +186,11 @@ class SomaliWebScraper:
     def is_likely_somali_religious(self, text: str) -> bool:
         """Check if text is likely Somali religious content"""
         
-        # Somali language indicators
-        somali_indicators = [
-            'waa', 'baa', 'ayaa', 'oo', 'iyo', 'ka', 'ku', 'la', 'ah', 'si',
-            'waxa', 'waxaa', 'waxay', 'wuxuu', 'inuu', 'inay', 'ugu', 'soo'
-        ]
-        
-        # Religious terms
-        religious_terms = [
-            'allah', 'allaah', 'islaam', 'diinta', 'nabiga', 'quraanka', 'salaad',
-            'muslim', 'muslimiinta', 'ducada', 'masjid', 'diin', 'kitaab',
-            'bismillah', 'alhamdulillah', 'subhanallah', 'inshallah', 'mashaallah'
-        ]
-        
         text_lower = text.lower()
         
         # Count indicators
-        somali_count = sum(1 for indicator in somali_indicators if indicator in text_lower)
-        religious_count = sum(1 for term in religious_terms if term in text_lower)
+        somali_count = lexicon_matcher.count('web.somali_indicators', text_lower, WORD)
+        religious_count = lexicon_matcher.count('web.religious_indicators', text_lower)
         
         # Must have Somali indicators AND religious content
         return somali_count >= 2 and religious_count >= 1
@@ -226,42 +218,25 @@ class SomaliWebScraper:
             score += 10
         
         # Somali language patterns
-        somali_patterns = ['waa', 'baa', 'ayaa', 'waxa', 'waxaa', 'waxay']
-        pattern_count = sum(1 for pattern in somali_patterns if pattern in text.lower())
+        pattern_count = lexicon_matcher.count('web.somali_patterns', text.lower())
         score += min(pattern_count * 3, 15)
         
         # Bonus for Islamic phrases
-        islamic_phrases = ['bismillah', 'alhamdulillah', 'subhanallah', 'inshallah', 'mashaallah']
-        if any(phrase in text.lower() for phrase in islamic_phrases):
+        if lexicon_matcher.count('web.islamic_phrases', text.lower()) > 0:
             score += 10
         
         return min(score, 100)
     
     def count_religious_terms(self, text: str) -> int:
         """Count Islamic/religious terms"""
-        religious_terms = [
-            'allah', 'allaah', 'islaam', 'diinta', 'nabiga', 'quraanka', 'salaad',
-            'ramadan', 'hajj', 'xaj', 'saum', 'zakah', 'shahaadah', 'imaan',
-            'muslim', 'muslimiinta', 'ducada', 'masjid', 'diin', 'kitaab',
-            'ayah', 'surah', 'hadith', 'sunnah', 'rasul', 'rasuul',
-            'bismillah', 'alhamdulillah', 'subhanallah', 'astaghfirullah',
-            'inshallah', 'mashaallah', 'barakallahu', 'jannah', 'naar',
-            'akhirah', 'dunya', 'taqwa', 'sabr', 'shukr', 'halal', 'haram',
-            'qiyaam', 'qiyaama', 'malaa'iig', 'jin', 'shaydan', 'iblees'
-        ]
-        
-        text_lower = text.lower()
-        return sum(1 for term in religious_terms if term in text_lower)
+        return lexicon_matcher.count('web.religious_terms', text.lower())
     
     def save_scraped_content(self, scraped_data: Dict, sentences: List[Dict]) -> int:
         """Save scraped content to database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        success_count = 0
+        conn = connect(self.db_path)
         
         # Save source info
-        cursor.execute('''
+        conn.execute('''
             INSERT OR REPLACE INTO web_sources 
             (url, title, content_type, sentences_extracted, status)
             VALUES (?, ?, ?, ?, ?)
@@ -273,34 +248,27 @@ class SomaliWebScraper:
             scraped_data['status']
         ))
         
-        # Save sentences
-        for sentence_data in sentences:
-            try:
-                cursor.execute('''
-                    INSERT OR IGNORE INTO somali_sentences 
-                    (text, quality_score, source, category, validated, scholar_approved, metadata)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    sentence_data['text'],
-                    sentence_data['quality_score'],
-                    sentence_data['source'],
-                    sentence_data['category'],
-                    True,
-                    sentence_data['scholar_approved'],
-                    json.dumps(sentence_data['metadata'])
-                ))
-                
-                if cursor.rowcount > 0:
-                    success_count += 1
-                    
-            except Exception as e:
-                print(f"⚠️ Error saving sentence: {e}")
-                continue
-        
-        conn.commit()
+        # Save sentences; the source row commits with the first chunk
+        columns = ('text', 'quality_score', 'source', 'category', 'validated', 'scholar_approved', 'metadata')
+        with open_sentence_writer(conn, columns) as writer:
+            for sentence_data in sentences:
+                try:
+                    writer.add((
+                        sentence_data['text'],
+                        sentence_data['quality_score'],
+                        sentence_data['source'],
+                        sentence_data['category'],
+                        True,
+                        sentence_data['scholar_approved'],
+                        json.dumps(sentence_data['metadata'])
+                    ))
+                except (KeyError, TypeError) as e:
+                    print(f"⚠️ Error saving sentence: {e}")
+        
+        conn.commit()     # Source row when there were no sentences
         conn.close()
         
-        return success_count
+        return writer.inserted
     
     def scrape_somalitalk_series(self, base_url: str, start_page: int = 1, end_page: int = 100) -> Dict:
         """Scrape multiple pages from SomaliTalk"""